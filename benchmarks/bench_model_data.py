@@ -0,0 +1,90 @@
+"""测量PandasModel.data()每秒可处理的调用次数（逐单元格iloc+str 与 列缓存+分块格式化 对比）
+
+用法: python benchmarks/bench_model_data.py [--rows 100000] [--cols 30]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtWidgets import QApplication
+
+from db_manager import PandasModel
+
+
+class LegacyPandasModel(QAbstractTableModel):
+    """原实现：每次调用都通过iloc取值并转换为字符串"""
+    def __init__(self, data):
+        super().__init__()
+        self._data = data
+
+    def rowCount(self, parent=QModelIndex()):
+        return len(self._data)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self._data.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return str(self._data.iloc[index.row(), index.column()])
+        return None
+
+
+def make_frame(rows, cols):
+    rng = np.random.default_rng(0)
+    data = {}
+    for c in range(cols):
+        kind = c % 3
+        if kind == 0:
+            data[f"int_{c}"] = rng.integers(0, 1_000_000, rows)
+        elif kind == 1:
+            data[f"float_{c}"] = rng.random(rows)
+        else:
+            data[f"text_{c}"] = [f"value-{i}" for i in rng.integers(0, 1_000_000, rows)]
+    return pd.DataFrame(data)
+
+
+def scroll(model, rows, cols, viewport_rows, step, max_seconds):
+    """模拟视图向下滚动：每一步重绘一屏的所有单元格，返回每秒data()调用次数"""
+    calls = 0
+    start = time.perf_counter()
+    top = 0
+    while top + viewport_rows <= rows:
+        for r in range(top, top + viewport_rows):
+            for c in range(cols):
+                model.data(model.index(r, c), Qt.DisplayRole)
+                calls += 1
+        top += step
+        if time.perf_counter() - start > max_seconds:
+            break
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--cols", type=int, default=30)
+    parser.add_argument("--viewport", type=int, default=40, help="每屏行数")
+    parser.add_argument("--step", type=int, default=3, help="每次滚动的行数")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每个模型的最长测量时间")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    df = make_frame(args.rows, args.cols)
+
+    for name, model_class in (("iloc+str", LegacyPandasModel), ("列缓存", PandasModel)):
+        model = model_class(df)
+        rate = scroll(model, args.rows, args.cols, args.viewport, args.step, args.seconds)
+        print(f"{name:>10}: {rate:,.0f} 次data()调用/秒")
+
+
+if __name__ == "__main__":
+    main()
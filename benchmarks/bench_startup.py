@@ -0,0 +1,88 @@
+"""测量冷启动耗时：从启动解释器到主窗口显示（首个窗口），以及到连接数据库完成
+
+每次测量都在新的子进程中进行，取多次运行的中位数。
+
+用法: python benchmarks/bench_startup.py [--runs 5] [--db path/to/database.db]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中运行：记录各阶段的时间点（time.time()），以JSON输出
+CHILD = r"""
+import json, os, sys, time
+marks = {"interpreter": time.time()}
+sys.path.insert(0, sys.argv[1])
+import db_manager
+from PyQt5.QtWidgets import QApplication, QMessageBox
+marks["imported"] = time.time()
+# 连接成功后的提示框是模态的，测量时跳过
+QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+app = QApplication(sys.argv[:1])
+window = db_manager.DatabaseManager()
+window.show()
+app.processEvents()
+marks["first_window"] = time.time()
+window.db_path_edit.setText(sys.argv[2])
+window.connect_database()
+app.processEvents()
+marks["connected"] = time.time()
+print(json.dumps(marks))
+window.close()
+"""
+
+
+def create_sample_database(path, tables=20, rows=1000):
+    """生成带若干表的示例数据库"""
+    conn = sqlite3.connect(path)
+    for i in range(tables):
+        conn.execute(f"CREATE TABLE t{i} (id INTEGER PRIMARY KEY, name TEXT, value REAL)")
+        conn.executemany(f"INSERT INTO t{i} (name, value) VALUES (?, ?)",
+                         ((f"name{j}", j * 0.5) for j in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def measure_once(db_path):
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    start = time.time()
+    output = subprocess.run([sys.executable, "-c", CHILD, ROOT, db_path], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    marks = json.loads(output.strip().splitlines()[-1])
+    return {
+        "import": marks["imported"] - start,
+        "first_window": marks["first_window"] - start,
+        "connected": marks["connected"] - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db", help="要连接的数据库，默认生成一个包含20张表的临时数据库")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db
+        if db_path is None:
+            db_path = os.path.join(tmp, "sample.db")
+            create_sample_database(db_path)
+
+        results = [measure_once(db_path) for _ in range(args.runs)]
+
+    print(f"运行 {args.runs} 次的中位数（从启动进程开始计时）:")
+    for name, label in (("import", "导入模块"), ("first_window", "首个窗口"), ("connected", "连接完成")):
+        print(f"  {label:<8} {statistics.median(r[name] for r in results) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""在合成数据库上无界面地测量核心操作的耗时，结果以JSON输出，便于在不同提交之间比较
+
+测量的操作：打开表、滚动浏览整张表、执行查询、导出CSV/XLSX、导入CSV/Excel、批量删除。
+使用Qt的offscreen平台，通过主窗口和标签页执行，与界面中的代码路径一致。
+
+用法:
+    python benchmarks/run_benchmarks.py [--rows 100000] [--output result.json]
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QMessageBox
+
+import db_manager
+from db_engine import delete_by_keys, quote_ident, RowPager
+from db_transfer import import_csv, import_excel
+from synthetic_db import create_database
+
+BROWSE_TABLES = ("narrow", "wide", "blobs", "no_pk", "without_rowid")
+QUERIES = {
+    "group_by": "SELECT category, COUNT(*), AVG(value) FROM narrow GROUP BY category",
+    "order_by_limit": "SELECT * FROM wide ORDER BY c1 DESC LIMIT 1000",
+    "join": "SELECT n.id, w.c2 FROM narrow n JOIN wide w ON w.id = n.id WHERE n.category < 10",
+    "full_scan": "SELECT * FROM narrow WHERE name LIKE '%-99%'",
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Bench:
+    """收集测量结果，每项重复repeat次取中位数"""
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def measure(self, name, target, func, rows=None, repeat=None):
+        """func()返回处理的行数（或None）；返回最后一次的返回值"""
+        times = []
+        result = None
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+        seconds = statistics.median(times)
+        rows = result if rows is None else rows
+        entry = {"name": name, "target": target, "seconds": round(seconds, 6), "runs": len(times)}
+        if isinstance(rows, int):
+            entry["rows"] = rows
+            entry["rows_per_second"] = round(rows / seconds) if seconds > 0 else None
+        self.results.append(entry)
+        rate = f"，{entry['rows_per_second']:,} 行/秒" if entry.get("rows_per_second") else ""
+        print(f"  {name:<14} {target:<16} {seconds * 1000:10.1f} ms{rate}", file=sys.stderr)
+        return result
+
+
+def wait_for(app, condition):
+    while not condition():
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def open_table(app, window, table_name):
+    """关闭已打开的同名标签页后重新打开，返回新的TableViewTab"""
+    for i in range(window.tab_widget.count() - 1, -1, -1):
+        if window.tab_widget.tabText(i) == table_name:
+            window.tab_widget.removeTab(i)
+    window.table_combo.blockSignals(True)
+    window.table_combo.setCurrentIndex(-1)
+    window.table_combo.blockSignals(False)
+    window.table_combo.setCurrentIndex(window.table_combo.findText(table_name))
+    app.processEvents()
+    return window.tab_widget.currentWidget()
+
+
+def scroll_model(model, viewport_rows=40):
+    """模拟一屏一屏地向下滚动到底：按需fetchMore并读取每屏所有单元格的显示文本"""
+    top = 0
+    columns = model.columnCount()
+    while True:
+        while top + viewport_rows > model.rowCount() and model.canFetchMore():
+            model.fetchMore()
+        bottom = min(top + viewport_rows, model.rowCount())
+        if top >= bottom:
+            break
+        for row in range(top, bottom):
+            for col in range(columns):
+                model.data(model.index(row, col), Qt.DisplayRole)
+        top = bottom
+    return model.rowCount()
+
+
+def run_query(app, sql_tab, sql):
+    sql_tab.query_edit.setPlainText(sql)
+    sql_tab.execute_query()
+    wait_for(app, lambda: sql_tab._worker is None)
+    model = sql_tab.result_table.model()
+    return model.rowCount() if model is not None else 0
+
+
+def copy_empty_table(db_path, source, target):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {quote_ident(target)}")
+        create_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (source,)).fetchone()[0]
+        conn.execute(create_sql.replace(source, quote_ident(target), 1))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run(args):
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    # 操作完成后的提示框是模态的，测量时跳过
+    for name in ("information", "warning", "critical"):
+        setattr(QMessageBox, name, staticmethod(lambda *a, **k: QMessageBox.Ok))
+
+    bench = Bench(args.repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        print("生成数据库...", file=sys.stderr)
+        counts = bench.measure("generate", "database",
+                               lambda: create_database(db_path, args.rows, many_tables=args.many_tables),
+                               rows=args.rows, repeat=1)
+
+        window = db_manager.DatabaseManager()
+        window.db_path_edit.setText(db_path)
+        bench.measure("connect", f"{args.many_tables + 5} tables", window.connect_database, repeat=1)
+
+        for table_name in BROWSE_TABLES:
+            tab = bench.measure("open_table", table_name, lambda: open_table(app, window, table_name))
+            bench.measure("scroll", table_name, lambda: scroll_model(tab.table_view.model()), repeat=1)
+
+        for name, sql in QUERIES.items():
+            bench.measure("query", name, lambda: run_query(app, window.sql_tab, sql))
+
+        cancel = threading.Event()
+        exports = {}
+        for table_name in ("narrow", "wide", "blobs"):
+            tab = open_table(app, window, table_name)
+            csv_path = os.path.join(tmp, f"{table_name}.csv")
+            bench.measure("export_csv", table_name,
+                          lambda: tab._export_csv(csv_path, lambda text: None, cancel).rows)
+            exports[table_name] = csv_path
+        xlsx_path = os.path.join(tmp, "narrow.xlsx")
+        xlsx_tab = open_table(app, window, "narrow")
+        bench.measure("export_xlsx", "narrow",
+                      lambda: xlsx_tab._export_xlsx(xlsx_path, lambda text: None, cancel).rows, repeat=1)
+
+        for table_name, csv_path in exports.items():
+            copy_empty_table(db_path, table_name, f"{table_name}_import")
+            conn = sqlite3.connect(db_path)
+            try:
+                bench.measure("import_csv", table_name,
+                              lambda: import_csv(conn, f"{table_name}_import", csv_path).rows, repeat=1)
+            finally:
+                conn.close()
+        copy_empty_table(db_path, "narrow", "narrow_xlsx_import")
+        conn = sqlite3.connect(db_path)
+        try:
+            bench.measure("import_excel", "narrow",
+                          lambda: import_excel(conn, "narrow_xlsx_import", xlsx_path).rows, repeat=1)
+        finally:
+            conn.close()
+
+        # 批量删除：按分页模型中的键删除前一半的行（与界面中删除选中行相同的路径）
+        conn = sqlite3.connect(db_path)
+        try:
+            for table_name in ("narrow_import", "without_rowid", "no_pk"):
+                pager = RowPager(conn, table_name, page_size=4096, max_pages=1024)
+                while not pager.exhausted and pager.loaded_rows < args.rows // 2:
+                    pager.fetch_more()
+                keys = pager.keys_for_range(0, min(pager.loaded_rows, args.rows // 2) - 1)
+                bench.measure("batch_delete", table_name,
+                              lambda: delete_by_keys(conn, table_name, pager.key_columns, keys), repeat=1)
+        finally:
+            conn.close()
+
+        window.close()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "rows": args.rows,
+            "tables": counts,
+            "repeat": args.repeat,
+        },
+        "results": bench.results,
+    }
+
+
+def compare(old_path, new_path):
+    """按(操作, 对象)对比两次结果的耗时"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    old_results = {(r["name"], r["target"]): r for r in old["results"]}
+    print(f"{'操作':<14} {'对象':<16} {'旧(ms)':>10} {'新(ms)':>10} {'变化':>8}")
+    for result in new["results"]:
+        key = (result["name"], result["target"])
+        before = old_results.get(key)
+        if before is None:
+            continue
+        ratio = before["seconds"] / result["seconds"] if result["seconds"] > 0 else float("inf")
+        print(f"{key[0]:<14} {key[1]:<16} {before['seconds'] * 1000:10.1f} {result['seconds'] * 1000:10.1f}"
+              f" {ratio:7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--many-tables", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="非破坏性操作的重复次数，取中位数")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="对比两个结果文件")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""生成用于基准测试的合成SQLite数据库，相同参数和种子总是生成相同的数据
+
+包含的表：
+    narrow        窄表，INTEGER PRIMARY KEY + 3列
+    wide          宽表，INTEGER PRIMARY KEY + 40列（整数、浮点数、文本交替）
+    blobs         每行带一个BLOB（默认4 KB）
+    no_pk         没有声明主键的rowid表，带一个普通索引
+    without_rowid WITHOUT ROWID表，复合主键
+    many_0000...  大量小表（模拟表很多的数据库）
+
+用法: python benchmarks/synthetic_db.py out.db [--rows 100000] [--many-tables 200]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+WIDE_COLUMNS = 40
+
+
+def _text(rng, length=12):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(length))
+
+
+def _narrow_rows(rng, rows):
+    for _ in range(rows):
+        yield (f"name-{rng.randrange(rows)}", rng.random() * 1000, rng.randrange(100))
+
+
+def _wide_rows(rng, rows):
+    for _ in range(rows):
+        row = []
+        for c in range(WIDE_COLUMNS):
+            kind = c % 3
+            if kind == 0:
+                row.append(rng.randrange(1_000_000))
+            elif kind == 1:
+                row.append(rng.random())
+            else:
+                row.append(f"value-{rng.randrange(1_000_000)}")
+        yield row
+
+
+def _wide_column_defs():
+    types = ("INTEGER", "REAL", "TEXT")
+    return ", ".join(f"c{c} {types[c % 3]}" for c in range(WIDE_COLUMNS))
+
+
+def create_database(path, rows=100_000, blob_rows=None, blob_size=4096, many_tables=200,
+                    many_table_rows=10, seed=0):
+    """在path生成合成数据库（已存在的文件会被覆盖），返回各表的行数"""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    blob_rows = rows // 10 if blob_rows is None else blob_rows
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("BEGIN")
+        conn.execute("CREATE TABLE narrow (id INTEGER PRIMARY KEY, name TEXT, value REAL, category INTEGER)")
+        conn.executemany("INSERT INTO narrow (name, value, category) VALUES (?, ?, ?)", _narrow_rows(rng, rows))
+
+        conn.execute(f"CREATE TABLE wide (id INTEGER PRIMARY KEY, {_wide_column_defs()})")
+        placeholders = ", ".join("?" for _ in range(WIDE_COLUMNS))
+        columns = ", ".join(f"c{c}" for c in range(WIDE_COLUMNS))
+        conn.executemany(f"INSERT INTO wide ({columns}) VALUES ({placeholders})", _wide_rows(rng, rows))
+
+        conn.execute("CREATE TABLE blobs (id INTEGER PRIMARY KEY, name TEXT, data BLOB)")
+        conn.executemany("INSERT INTO blobs (name, data) VALUES (?, ?)",
+                         ((f"file-{i}.bin", rng.randbytes(blob_size)) for i in range(blob_rows)))
+
+        conn.execute("CREATE TABLE no_pk (a INTEGER, b TEXT, c REAL)")
+        conn.executemany("INSERT INTO no_pk VALUES (?, ?, ?)",
+                         ((rng.randrange(rows), _text(rng), rng.random()) for _ in range(rows)))
+        conn.execute("CREATE INDEX idx_no_pk_a ON no_pk (a)")
+
+        conn.execute("CREATE TABLE without_rowid (k1 INTEGER, k2 TEXT, v REAL, PRIMARY KEY (k1, k2)) WITHOUT ROWID")
+        conn.executemany("INSERT INTO without_rowid VALUES (?, ?, ?)",
+                         ((i // 10, f"k{i % 10}", rng.random()) for i in range(rows)))
+
+        for t in range(many_tables):
+            name = f"many_{t:04d}"
+            conn.execute(f"CREATE TABLE {name} (id INTEGER PRIMARY KEY, label TEXT, amount REAL)")
+            conn.executemany(f"INSERT INTO {name} (label, amount) VALUES (?, ?)",
+                             ((_text(rng, 8), rng.random()) for _ in range(many_table_rows)))
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return {"narrow": rows, "wide": rows, "blobs": blob_rows, "no_pk": rows, "without_rowid": rows,
+            "many_tables": many_tables}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--blob-rows", type=int, help="blobs表的行数，默认为rows的十分之一")
+    parser.add_argument("--blob-size", type=int, default=4096)
+    parser.add_argument("--many-tables", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = create_database(args.path, args.rows, args.blob_rows, args.blob_size, args.many_tables, seed=args.seed)
+    size_mb = os.path.getsize(args.path) / 1048576
+    print(f"已生成 {args.path}（{size_mb:.1f} MB，用时 {time.perf_counter() - start:.1f} 秒）: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""命令行模式：不启动图形界面，直接查询、导入、导出和检查数据库
+
+    python db_manager.py query DB "SELECT ..." [-o FILE] [--format csv|tsv|jsonl]
+    python db_manager.py export DB TABLE [-o FILE]
+    python db_manager.py import DB TABLE FILE [--fast] [--defer-indexes]
+    python db_manager.py check DB [--quick]
+    python db_manager.py dump DB -o DIR [--table T] [--format csv|xlsx] [-j N]
+    python db_manager.py diff OLD NEW [--table T] [--summary] [--format text|jsonl] [-j N]
+
+本模块不导入PyQt5和pandas（导入旧版xls文件时除外），可在没有图形环境的服务器上运行。
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from db_engine import open_connection, quote_ident
+from db_transfer import TransferStats, export_csv, export_database, export_xlsx, import_csv, import_excel
+
+COMMANDS = ("query", "export", "import", "check", "dump", "diff")
+
+
+def _connect(db_path, mode):
+    """打开数据库，mode为ro或rw，连接参数与图形界面相同"""
+    if not os.path.isfile(db_path):
+        raise FileNotFoundError(f"数据库文件不存在: {db_path}")
+    return open_connection(db_path, read_only=mode == "ro")
+
+
+def _json_value(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def write_rows(cursor, out, fmt="csv", header=True, batch_size=5000):
+    """把游标的结果逐批写到文本流out，返回写出的行数"""
+    columns = [desc[0] for desc in cursor.description]
+    rows_written = 0
+    if fmt == "jsonl":
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            out.writelines(json.dumps(dict(zip(columns, map(_json_value, row))), ensure_ascii=False) + "\n"
+                           for row in rows)
+            rows_written += len(rows)
+        return rows_written
+
+    writer = csv.writer(out, delimiter="\t" if fmt == "tsv" else ",")
+    if header:
+        writer.writerow(columns)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        writer.writerows(rows)
+        rows_written += len(rows)
+    return rows_written
+
+
+def _open_output(path):
+    if path in (None, "-"):
+        return sys.stdout, False
+    return open(path, "w", newline="", encoding="utf-8", buffering=1 << 20), True
+
+
+def _report(args, text):
+    if not args.quiet:
+        print(text, file=sys.stderr)
+
+
+def cmd_query(args):
+    sql = sys.stdin.read() if args.sql == "-" else args.sql
+    conn = _connect(args.db, "rw" if args.write else "ro")
+    try:
+        start = time.perf_counter()
+        cursor = conn.execute(sql, args.param or [])
+        if cursor.description is None:
+            # 没有结果集的语句（INSERT/UPDATE/DDL等）
+            conn.commit()
+            _report(args, f"影响 {max(cursor.rowcount, 0)} 条记录，用时 {time.perf_counter() - start:.2f} 秒")
+            return 0
+        out, close = _open_output(args.output)
+        try:
+            rows = write_rows(cursor, out, args.format, header=not args.no_header)
+        finally:
+            if close:
+                out.close()
+            else:
+                out.flush()
+        _report(args, TransferStats(rows, 0, time.perf_counter() - start).describe())
+        return 0
+    finally:
+        conn.close()
+
+
+def cmd_export(args):
+    conn = _connect(args.db, "ro")
+    try:
+        fmt = args.format
+        if fmt is None:
+            fmt = "xlsx" if args.output and args.output.lower().endswith(".xlsx") else "csv"
+        if fmt == "xlsx":
+            if args.output in (None, "-"):
+                raise ValueError("导出xlsx必须用 -o 指定输出文件")
+            stats = export_xlsx(conn, args.table, args.output)
+        elif args.output in (None, "-"):
+            start = time.perf_counter()
+            cursor = conn.execute(f"SELECT * FROM {quote_ident(args.table)}")
+            rows = write_rows(cursor, sys.stdout)
+            sys.stdout.flush()
+            stats = TransferStats(rows, 0, time.perf_counter() - start)
+        else:
+            stats = export_csv(conn, args.table, args.output)
+        _report(args, f"导出 {args.table}：{stats.describe()}")
+        return 0
+    finally:
+        conn.close()
+
+
+def cmd_dump(args):
+    if not os.path.isfile(args.db):
+        raise FileNotFoundError(f"数据库文件不存在: {args.db}")
+    progress = None
+    if not args.quiet and sys.stderr.isatty():
+        # 终端中在同一行刷新汇总进度
+        progress = lambda text: print(f"\r{text}\033[K", end="", file=sys.stderr, flush=True)
+    total, exported = export_database(args.db, args.output, args.table, args.format, args.jobs, progress=progress)
+    if progress is not None:
+        print(file=sys.stderr)
+    for table, path, stats in exported:
+        _report(args, f"{table} -> {path}：{stats.describe()}")
+    _report(args, f"导出 {len(exported)} 张表：{total.describe()}")
+    return 0
+
+
+def cmd_import(args):
+    conn = _connect(args.db, "rw")
+    try:
+        options = dict(fast=args.fast, defer_indexes=args.defer_indexes, batch_size=args.batch_size)
+        if args.file.lower().endswith((".xlsx", ".xlsm", ".xls")):
+            stats = import_excel(conn, args.table, args.file, args.sheet, args.start_row, **options)
+        else:
+            stats = import_csv(conn, args.table, args.file, **options)
+        _report(args, f"导入 {args.table}：{stats.describe()}")
+        return 0
+    finally:
+        conn.close()
+
+
+def cmd_check(args):
+    conn = _connect(args.db, "ro")
+    try:
+        pragma = "quick_check" if args.quick else "integrity_check"
+        problems = [row[0] for row in conn.execute(f"PRAGMA {pragma}") if row[0] != "ok"]
+        for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check"):
+            problems.append(f"外键约束失败: {table} rowid={rowid} 引用 {parent}")
+        for problem in problems:
+            print(problem)
+        _report(args, "检查通过" if not problems else f"发现 {len(problems)} 个问题")
+        return 1 if problems else 0
+    finally:
+        conn.close()
+
+
+def cmd_diff(args):
+    from db_diff import diff_databases
+
+    result = diff_databases(args.old, args.new, tables=args.table, workers=args.jobs)
+    out, close = _open_output(args.output)
+    try:
+        for diff in result.tables:
+            if args.format == "jsonl":
+                if args.summary:
+                    out.write(json.dumps({"table": diff.table, "status": diff.status, "rows_old": diff.rows_a,
+                                          "rows_new": diff.rows_b, "inserted": len(diff.inserted),
+                                          "updated": len(diff.updated), "deleted": len(diff.deleted),
+                                          "note": diff.note}, ensure_ascii=False) + "\n")
+                    continue
+                changes = ([("insert", key, None, row) for key, row in diff.inserted] +
+                           [("update", key, old, new) for key, old, new in diff.updated] +
+                           [("delete", key, row, None) for key, row in diff.deleted])
+                for kind, key, old, new in changes:
+                    record = {"table": diff.table, "op": kind,
+                              "key": dict(zip(diff.key_columns, map(_json_value, key)))}
+                    if old is not None:
+                        record["old"] = dict(zip(diff.columns, map(_json_value, old)))
+                    if new is not None:
+                        record["new"] = dict(zip(diff.columns, map(_json_value, new)))
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                continue
+            if diff.status == "same":
+                continue
+            out.write(f"{diff.table}: {diff.describe()}\n")
+            if args.summary:
+                continue
+            def pairs(names, values):
+                return ", ".join(f"{name}={value!r}" for name, value in zip(names, values))
+
+            for key, row in diff.inserted:
+                out.write(f"+ {pairs(diff.key_columns, key)}: {pairs(diff.columns, row)}\n")
+            for key, old, new in diff.updated:
+                changed = ", ".join(f"{col}: {a!r} -> {b!r}" for col, a, b in zip(diff.columns, old, new)
+                                    if repr(a) != repr(b))
+                out.write(f"~ {pairs(diff.key_columns, key)}: {changed}\n")
+            for key, row in diff.deleted:
+                out.write(f"- {pairs(diff.key_columns, key)}: {pairs(diff.columns, row)}\n")
+        out.flush()
+    finally:
+        if close:
+            out.close()
+    _report(args, result.describe())
+    return 1 if result.changed_tables else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="db_manager.py", description="SQLite数据库管理器命令行模式")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-q", "--quiet", action="store_true", help="不在标准错误输出统计信息")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    query = subparsers.add_parser("query", parents=[common], help="执行SQL并把结果流式输出")
+    query.add_argument("db", help="数据库文件")
+    query.add_argument("sql", help="SQL语句，- 表示从标准输入读取")
+    query.add_argument("-o", "--output", help="输出文件，默认输出到标准输出")
+    query.add_argument("-f", "--format", choices=("csv", "tsv", "jsonl"), default="csv", help="输出格式")
+    query.add_argument("-p", "--param", action="append", help="绑定参数，可重复指定")
+    query.add_argument("--no-header", action="store_true", help="CSV/TSV不输出表头")
+    query.add_argument("--write", action="store_true", help="以读写方式打开，允许执行修改数据的语句")
+    query.set_defaults(handler=cmd_query)
+
+    export = subparsers.add_parser("export", parents=[common], help="导出整张表")
+    export.add_argument("db", help="数据库文件")
+    export.add_argument("table", help="表名")
+    export.add_argument("-o", "--output", help="输出文件，默认以CSV输出到标准输出")
+    export.add_argument("-f", "--format", choices=("csv", "xlsx"), help="输出格式，默认按文件扩展名判断")
+    export.set_defaults(handler=cmd_export)
+
+    dump = subparsers.add_parser("dump", parents=[common], help="把全部或指定的表并行导出到一个目录，每张表一个文件")
+    dump.add_argument("db", help="数据库文件")
+    dump.add_argument("-o", "--output", required=True, help="输出目录，不存在时自动创建")
+    dump.add_argument("-t", "--table", action="append", help="只导出指定的表，可重复指定，默认全部表")
+    dump.add_argument("-f", "--format", choices=("csv", "xlsx"), default="csv", help="输出格式")
+    dump.add_argument("-j", "--jobs", type=int, help="并行的进程数，默认取CPU核数和表数中较小的一个")
+    dump.set_defaults(handler=cmd_dump)
+
+    import_ = subparsers.add_parser("import", parents=[common], help="从CSV或Excel文件导入数据到已有的表")
+    import_.add_argument("db", help="数据库文件")
+    import_.add_argument("table", help="表名")
+    import_.add_argument("file", help="CSV、xlsx或xls文件，首行为列名")
+    import_.add_argument("--fast", action="store_true", help="导入期间关闭同步写入（断电可能导致数据库损坏）")
+    import_.add_argument("--defer-indexes", action="store_true", help="导入完成后再重建索引")
+    import_.add_argument("--batch-size", type=int, default=10000, help="每批插入的行数")
+    import_.add_argument("--sheet", help="Excel工作表名，默认第一个工作表")
+    import_.add_argument("--start-row", type=int, default=1, help="Excel表头所在行（从1开始）")
+    import_.set_defaults(handler=cmd_import)
+
+    check = subparsers.add_parser("check", parents=[common], help="检查数据库完整性和外键约束")
+    check.add_argument("db", help="数据库文件")
+    check.add_argument("--quick", action="store_true", help="使用quick_check，速度更快但检查较少")
+    check.set_defaults(handler=cmd_check)
+
+    diff = subparsers.add_parser("diff", parents=[common], help="比较两个数据库，列出每张表新增、修改和删除的行")
+    diff.add_argument("old", help="旧的数据库文件")
+    diff.add_argument("new", help="新的数据库文件")
+    diff.add_argument("-t", "--table", action="append", help="只比较指定的表，可重复指定")
+    diff.add_argument("-o", "--output", help="输出文件，默认输出到标准输出")
+    diff.add_argument("-f", "--format", choices=("text", "jsonl"), default="text", help="输出格式")
+    diff.add_argument("--summary", action="store_true", help="只输出每张表的汇总，不列出逐行的变化")
+    diff.add_argument("-j", "--jobs", type=int, help="并行的进程数，默认按数据库大小自动选择")
+    diff.set_defaults(handler=cmd_diff)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except BrokenPipeError:
+        # 输出被提前关闭（例如管道到head），不再写标准输出
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except KeyboardInterrupt:
+        print("已取消", file=sys.stderr)
+        return 130
+    except (sqlite3.Error, OSError, ValueError, KeyError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
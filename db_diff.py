@@ -0,0 +1,445 @@
+"""比较两个数据库（通常是同一个数据库的两个快照），找出每张表新增、修改和删除的行
+
+不依赖图形界面。每张表按主键（没有主键时按rowid）切分为若干范围，在两个库中分别计算
+同一范围的哈希，相同则跳过，不同则把范围继续细分，直到范围足够小时逐行比较。
+只有发生变化的范围才会被细分和逐行读取，行级比较的工作量与变化量成正比；
+每个范围仍需在两个库中各按主键顺序扫描一遍以计算哈希，这部分在多个进程中并行，
+每个进程用只读连接打开两个数据库。
+
+比较期间数据库不应被修改，否则不同进程读到的可能是不同时刻的数据。
+"""
+import hashlib
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+from db_engine import format_size, open_connection, primary_key_columns, quote_ident, table_has_rowid
+from db_transfer import OperationCancelled
+
+DIFF_STATUS = {
+    "same": "相同",
+    "changed": "有变化",
+    "added": "新增的表",
+    "removed": "删除的表",
+    "skipped": "无法比较",
+}
+
+# 两个库合计小于此大小时在当前进程中比较，省去启动进程的开销
+PARALLEL_MIN_BYTES = 32 << 20
+
+
+class _TableSpec:
+    """一张表的比较方式：用作键的列和参与比较的列，会被传给工作进程"""
+    def __init__(self, table, key_columns, key_sql, columns):
+        self.table = table
+        self.key_columns = key_columns
+        self.key_sql = key_sql
+        self.columns = columns
+
+    @property
+    def key_expr(self):
+        return self.key_sql[0] if len(self.key_sql) == 1 else "(" + ", ".join(self.key_sql) + ")"
+
+    def range_where(self, lo, hi):
+        """范围(lo, hi]的WHERE子句和参数；lo、hi为键的元组，None表示不限"""
+        marks = "?" if len(self.key_sql) == 1 else "(" + ", ".join("?" * len(self.key_sql)) + ")"
+        conditions, params = [], []
+        if lo is not None:
+            conditions.append(f"{self.key_expr} > {marks}")
+            params.extend(lo)
+        if hi is not None:
+            conditions.append(f"{self.key_expr} <= {marks}")
+            params.extend(hi)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def select_sql(self, where):
+        selected = ", ".join(self.key_sql + [quote_ident(col) for col in self.columns])
+        return (f"SELECT {selected} FROM {quote_ident(self.table)}{where} "
+                f"ORDER BY {', '.join(self.key_sql)}")
+
+
+class TableDiff:
+    """一张表的比较结果；inserted和deleted为[(键, 行)]，updated为[(键, 旧行, 新行)]，行不含键列"""
+    def __init__(self, table, status, key_columns=(), columns=(), note=""):
+        self.table = table
+        self.status = status
+        self.key_columns = list(key_columns)
+        self.columns = list(columns)
+        self.note = note
+        self.inserted = []
+        self.updated = []
+        self.deleted = []
+        self.rows_a = 0
+        self.rows_b = 0
+        # 计算过哈希的范围数和其中哈希相同、直接跳过的范围数
+        self.ranges = 0
+        self.ranges_same = 0
+
+    @property
+    def changes(self):
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+    def describe(self):
+        text = DIFF_STATUS[self.status]
+        if self.status == "changed":
+            text += f"：新增 {len(self.inserted)} 行，修改 {len(self.updated)} 行，删除 {len(self.deleted)} 行"
+        if self.note:
+            text += f"（{self.note}）"
+        return text
+
+
+class DatabaseDiff:
+    """两个数据库的比较结果，tables按表名排序"""
+    def __init__(self, path_a, path_b, tables, seconds, workers):
+        self.path_a = path_a
+        self.path_b = path_b
+        self.tables = tables
+        self.seconds = seconds
+        self.workers = workers
+
+    @property
+    def changed_tables(self):
+        return [diff for diff in self.tables if diff.status != "same"]
+
+    def describe(self):
+        inserted = sum(len(diff.inserted) for diff in self.tables)
+        updated = sum(len(diff.updated) for diff in self.tables)
+        deleted = sum(len(diff.deleted) for diff in self.tables)
+        ranges = sum(diff.ranges for diff in self.tables)
+        skipped = sum(diff.ranges_same for diff in self.tables)
+        mode = f"{self.workers} 个进程" if self.workers > 1 else "单进程"
+        return (f"比较 {len(self.tables)} 张表，{len(self.changed_tables)} 张有差异；"
+                f"新增 {inserted} 行，修改 {updated} 行，删除 {deleted} 行；"
+                f"哈希 {ranges} 个范围，其中 {skipped} 个相同；用时 {self.seconds:.2f} 秒（{mode}）")
+
+
+def _user_tables(conn):
+    return {name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")}
+
+
+def _column_names(conn, table):
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({quote_ident(table)})")]
+
+
+def _rowid_alias(columns):
+    """返回没有被同名列遮蔽的rowid别名"""
+    for alias in ("rowid", "_rowid_", "oid"):
+        if alias not in columns:
+            return alias
+    return None
+
+
+def _has_null_key(conn, table, key_columns):
+    condition = " OR ".join(f"{quote_ident(col)} IS NULL" for col in key_columns)
+    return conn.execute(f"SELECT 1 FROM {quote_ident(table)} WHERE {condition} LIMIT 1").fetchone() is not None
+
+
+def plan_table(conn_a, conn_b, table):
+    """决定一张两边都有的表按什么键比较，返回(_TableSpec或None, TableDiff)"""
+    columns_a = _column_names(conn_a, table)
+    columns_b = _column_names(conn_b, table)
+    common = [col for col in columns_a if col in columns_b]
+    notes = []
+    only_a = [col for col in columns_a if col not in columns_b]
+    only_b = [col for col in columns_b if col not in columns_a]
+    if only_a or only_b:
+        parts = []
+        if only_a:
+            parts.append("仅A有列 " + "、".join(only_a))
+        if only_b:
+            parts.append("仅B有列 " + "、".join(only_b))
+        notes.append("，".join(parts) + "，只比较共同的列")
+
+    pk_a = primary_key_columns(conn_a, table)
+    pk_b = primary_key_columns(conn_b, table)
+    rowid_a = table_has_rowid(conn_a, table)
+    rowid_b = table_has_rowid(conn_b, table)
+    key_columns = None
+    if pk_a and pk_a == pk_b and all(col in common for col in pk_a):
+        key_columns = pk_a
+        # rowid表的非INTEGER主键允许NULL，NULL无法按范围定位，这种情况改用rowid
+        if rowid_a and rowid_b and (_has_null_key(conn_a, table, pk_a) or _has_null_key(conn_b, table, pk_a)):
+            key_columns = None
+            notes.append("主键列中有NULL，按rowid比较")
+    elif pk_a != pk_b:
+        notes.append("两边主键不同，按rowid比较")
+
+    if key_columns is not None:
+        spec = _TableSpec(table, key_columns, [quote_ident(col) for col in key_columns],
+                          [col for col in common if col not in key_columns])
+    else:
+        alias = _rowid_alias(set(columns_a) | set(columns_b))
+        if not (rowid_a and rowid_b) or alias is None:
+            diff = TableDiff(table, "skipped", columns=common, note="没有可用作键的主键或rowid")
+            return None, diff
+        if not pk_a:
+            notes.append("没有主键，按rowid比较，VACUUM后rowid可能改变")
+        spec = _TableSpec(table, ["rowid"], [alias], common)
+    diff = TableDiff(table, "same", spec.key_columns, spec.columns, "；".join(notes))
+    return spec, diff
+
+
+# 工作进程中打开的两个只读连接
+_worker_connections = None
+
+
+def _init_worker(path_a, path_b):
+    global _worker_connections
+    _worker_connections = (open_connection(path_a, read_only=True), open_connection(path_b, read_only=True))
+
+
+def _close_worker():
+    global _worker_connections
+    if _worker_connections is not None:
+        for conn in _worker_connections:
+            conn.close()
+        _worker_connections = None
+
+
+def _hash_range(conn, spec, where, params, batch_size=2000):
+    """按键的顺序读取范围内的行，返回(行数, 摘要)
+
+    用repr序列化，1和1.0、-1和-2这类Python hash()相等的值也能区分。
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    count = 0
+    cursor = conn.execute(spec.select_sql(where), params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        digest.update(repr(rows).encode("utf-8", "surrogatepass"))
+        count += len(rows)
+    return count, digest.digest()
+
+
+def _split_points(conn, spec, where, params, count, parts):
+    """在范围内按行数大致均分为parts份，返回分界点的键（每份包含其分界点）"""
+    step = max(1, -(-count // parts))
+    aliases = [f"_k{i}" for i in range(len(spec.key_sql))]
+    inner = ", ".join(f"{expr} AS {alias}" for expr, alias in zip(spec.key_sql, aliases))
+    sql = (f"SELECT {', '.join(aliases)} FROM (SELECT {inner}, row_number() OVER (ORDER BY {', '.join(spec.key_sql)}) "
+           f"AS _rn FROM {quote_ident(spec.table)}{where}) WHERE _rn % ? = 0 AND _rn < ?")
+    return [tuple(row) for row in conn.execute(sql, list(params) + [step, count])]
+
+
+def _integer_split_points(conn_a, conn_b, spec, parts):
+    """单列整数键按最小值到最大值等分，只需查找两端，省去一次按顺序扫描；不适用时返回None"""
+    if len(spec.key_sql) != 1:
+        return None
+    key = spec.key_sql[0]
+    bounds = [conn.execute(f"SELECT min({key}), max({key}) FROM {quote_ident(spec.table)}").fetchone()
+              for conn in (conn_a, conn_b)]
+    values = [value for pair in bounds for value in pair if value is not None]
+    if not values or not all(type(value) is int for value in values):
+        return None
+    low, high = min(values), max(values)
+    if high - low < parts:
+        return None
+    return [(low + (high - low) * i // parts,) for i in range(1, parts)]
+
+
+def _subranges(lo, hi, points):
+    bounds = [lo] + points + [hi]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def _diff_rows(conn_a, conn_b, spec, where, params):
+    """逐行比较一个小范围，返回(inserted, updated, deleted)"""
+    width = len(spec.key_sql)
+    rows_a = {row[:width]: row[width:] for row in conn_a.execute(spec.select_sql(where), params)}
+    rows_b = {row[:width]: row[width:] for row in conn_b.execute(spec.select_sql(where), params)}
+    inserted = [(key, row) for key, row in rows_b.items() if key not in rows_a]
+    deleted = [(key, row) for key, row in rows_a.items() if key not in rows_b]
+    updated = []
+    for key, old in rows_a.items():
+        new = rows_b.get(key)
+        # 比较repr，把1改为1.0这类只改变存储类型的修改也算作变化
+        if new is not None and (old != new or repr(old) != repr(new)):
+            updated.append((key, old, new))
+    return inserted, updated, deleted
+
+
+def _compare_range(spec, lo, hi, top, leaf_rows, fanout, chunk_rows):
+    """在工作进程中比较一个范围
+
+    返回("same", None, 行数A, 行数B)、("rows", (inserted, updated, deleted), 行数A, 行数B)
+    或("split", 子范围列表, 0, 0)。top为True时是整张表：行数较多时不计算哈希，直接按chunk_rows切分，
+    整数键按取值等分（键不连续时各份行数不均，行数多的份会被继续细分）。
+    """
+    conn_a, conn_b = _worker_connections
+    where, params = spec.range_where(lo, hi)
+    if top:
+        table = quote_ident(spec.table)
+        count_a = conn_a.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        count_b = conn_b.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        largest = max(count_a, count_b)
+        if largest > chunk_rows:
+            parts = min(1024, -(-largest // chunk_rows))
+            points = _integer_split_points(conn_a, conn_b, spec, parts)
+            if points is None:
+                conn = conn_a if count_a >= count_b else conn_b
+                points = _split_points(conn, spec, where, params, largest, parts)
+            return "split", _subranges(lo, hi, points), 0, 0
+
+    count_a, hash_a = _hash_range(conn_a, spec, where, params)
+    count_b, hash_b = _hash_range(conn_b, spec, where, params)
+    if count_a == count_b and hash_a == hash_b:
+        return "same", None, count_a, count_b
+    if max(count_a, count_b) <= leaf_rows:
+        return "rows", _diff_rows(conn_a, conn_b, spec, where, params), count_a, count_b
+    conn = conn_a if count_a >= count_b else conn_b
+    points = _split_points(conn, spec, where, params, max(count_a, count_b), fanout)
+    return "split", _subranges(lo, hi, points), 0, 0
+
+
+class _InlineExecutor:
+    """与ProcessPoolExecutor接口相同、在当前进程中逐个执行的执行器，用于小数据库"""
+    def __init__(self, path_a, path_b):
+        _init_worker(path_a, path_b)
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        _close_worker()
+
+
+def _sort_changes(items):
+    try:
+        items.sort(key=lambda item: item[0])
+    except TypeError:
+        # 同一键列中混有不同存储类型（例如整数和文本）时无法排序，保持发现的顺序
+        pass
+
+
+def _count_rows(conn, table):
+    return conn.execute(f"SELECT count(*) FROM {quote_ident(table)}").fetchone()[0]
+
+
+def diff_databases(path_a, path_b, tables=None, workers=None, leaf_rows=500, fanout=16, chunk_rows=20000,
+                   progress=None, cancel=None):
+    """比较数据库path_a（旧）和path_b（新），返回DatabaseDiff
+
+    tables指定时只比较这些表。workers为进程数，None时按数据库大小自动选择，
+    小于等于1时在当前进程中比较。范围内的行数不超过leaf_rows时逐行比较，
+    否则切分为fanout份；大表先按chunk_rows行一份切分后分给各个进程。
+    progress(text)报告进度，cancel（threading.Event）置位时在当前范围完成后抛出OperationCancelled。
+    """
+    start = time.perf_counter()
+    for path in (path_a, path_b):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"数据库文件不存在: {path}")
+    if os.path.samefile(path_a, path_b):
+        raise ValueError("不能把数据库与它自己比较")
+
+    conn_a = open_connection(path_a, read_only=True)
+    conn_b = open_connection(path_b, read_only=True)
+    try:
+        tables_a, tables_b = _user_tables(conn_a), _user_tables(conn_b)
+        names = sorted(tables_a | tables_b) if tables is None else list(tables)
+        results = {}
+        specs = []
+        for table in names:
+            if table in tables_a and table in tables_b:
+                spec, diff = plan_table(conn_a, conn_b, table)
+                if spec is not None:
+                    specs.append(spec)
+            elif table in tables_a:
+                diff = TableDiff(table, "removed", columns=_column_names(conn_a, table))
+                diff.rows_a = _count_rows(conn_a, table)
+            elif table in tables_b:
+                diff = TableDiff(table, "added", columns=_column_names(conn_b, table))
+                diff.rows_b = _count_rows(conn_b, table)
+            else:
+                raise KeyError(f"两个数据库中都没有表: {table}")
+            results[table] = diff
+    finally:
+        conn_a.close()
+        conn_b.close()
+
+    if workers is None:
+        size = sum(os.path.getsize(path) for path in (path_a, path_b))
+        workers = min(os.cpu_count() or 1, 8) if size >= PARALLEL_MIN_BYTES else 1
+    if workers > 1:
+        # 图形界面在后台线程中调用，fork多线程的进程可能使子进程在其他线程持有的锁上死锁，因此用spawn
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(path_a, path_b))
+    else:
+        executor = _InlineExecutor(path_a, path_b)
+
+    queue = deque((spec, None, None, True) for spec in specs)
+    running = {}
+    finished = 0
+    last_report = 0.0
+    try:
+        while queue or running:
+            if cancel is not None and cancel.is_set():
+                raise OperationCancelled()
+            # 只提交有限的任务，取消时不必等待排队的任务
+            while queue and len(running) < max(1, workers * 2):
+                spec, lo, hi, top = queue.popleft()
+                future = executor.submit(_compare_range, spec, lo, hi, top, leaf_rows, fanout, chunk_rows)
+                running[future] = spec
+            done, _ = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                spec = running.pop(future)
+                kind, payload, count_a, count_b = future.result()
+                diff = results[spec.table]
+                if kind == "split":
+                    queue.extend((spec, lo, hi, False) for lo, hi in payload)
+                    continue
+                diff.ranges += 1
+                diff.rows_a += count_a
+                diff.rows_b += count_b
+                if kind == "same":
+                    diff.ranges_same += 1
+                else:
+                    inserted, updated, deleted = payload
+                    diff.inserted.extend(inserted)
+                    diff.updated.extend(updated)
+                    diff.deleted.extend(deleted)
+                finished += 1
+            now = time.perf_counter()
+            if progress is not None and now - last_report >= 0.2:
+                last_report = now
+                changes = sum(diff.changes for diff in results.values())
+                progress(f"已比较 {finished} 个范围，待比较 {len(queue) + len(running)} 个，发现 {changes} 处变化")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    for diff in results.values():
+        if diff.status == "same" and diff.changes:
+            diff.status = "changed"
+        for items in (diff.inserted, diff.updated, diff.deleted):
+            _sort_changes(items)
+    return DatabaseDiff(path_a, path_b, [results[name] for name in names], time.perf_counter() - start, workers)
+
+
+def change_rows(diff, limit=None):
+    """把一张表的变化转换为表格的行：(变化, 键, 各列的值)，修改的列显示为“旧值 → 新值”"""
+    def text(value):
+        if isinstance(value, bytes):
+            return f"<BLOB {format_size(len(value))}>"
+        return "NULL" if value is None else str(value)
+
+    def key_text(key):
+        return ", ".join(text(value) for value in key)
+
+    rows = []
+    for key, row in diff.inserted:
+        rows.append(("新增", key_text(key), [text(value) for value in row]))
+    for key, old, new in diff.updated:
+        cells = [text(b) if repr(a) == repr(b) else f"{text(a)} → {text(b)}" for a, b in zip(old, new)]
+        rows.append(("修改", key_text(key), cells))
+    for key, row in diff.deleted:
+        rows.append(("删除", key_text(key), [text(value) for value in row]))
+    return rows if limit is None else rows[:limit]
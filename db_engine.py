@@ -0,0 +1,1069 @@
+"""SQLite数据访问层，不依赖图形界面"""
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def quote_ident(name):
+    """为标识符加上双引号，避免表名或列名中的特殊字符破坏SQL语句"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def table_has_rowid(conn, table_name):
+    """判断表是否带有rowid（视图和WITHOUT ROWID表没有）
+
+    在视图上SELECT rowid不会报错而是返回NULL，因此先按sqlite_master排除视图。
+    """
+    for schema_table in ("sqlite_master", "sqlite_temp_master"):
+        row = conn.execute(f"SELECT type FROM {schema_table} WHERE name = ? COLLATE NOCASE "
+                           f"AND type IN ('table', 'view')", (table_name,)).fetchone()
+        if row is not None:
+            if row[0] == "view":
+                return False
+            break
+    try:
+        conn.execute(f"SELECT rowid FROM {quote_ident(table_name)} LIMIT 0")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def variable_limit(conn):
+    """返回单条语句允许的最大参数个数"""
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    except AttributeError:
+        # Python 3.11之前没有getlimit，使用SQLite的默认下限
+        return 999
+
+
+def _key_match_sql(key_columns):
+    """生成按键定位一行的WHERE条件"""
+    return " AND ".join(f"{quote_ident(col)} = ?" for col in key_columns)
+
+
+def delete_by_keys(conn, table_name, key_columns, keys, chunk_size=500):
+    """在一个保存点中按rowid或主键分批删除，全部成功或全部撤销，返回删除的行数
+
+    单列键生成DELETE ... WHERE k IN (...)，复合主键生成WHERE (a, b) IN (VALUES (?, ?), ...)，
+    每条语句的参数个数不超过连接的上限。keys为键值元组的列表。
+    连接上没有未提交的事务时删除完成即提交；已有事务时只释放保存点，由调用方提交或回滚。
+    """
+    width = len(key_columns)
+    chunk_size = max(1, min(chunk_size, variable_limit(conn) // width))
+    table = quote_ident(table_name)
+    if width == 1:
+        target = quote_ident(key_columns[0])
+        row_placeholder = "?"
+    else:
+        target = "(" + ", ".join(quote_ident(col) for col in key_columns) + ")"
+        row_placeholder = "(" + ", ".join("?" for _ in key_columns) + ")"
+
+    deleted = 0
+    conn.execute("SAVEPOINT delete_by_keys")
+    try:
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            placeholders = ", ".join(row_placeholder for _ in chunk)
+            if width > 1:
+                placeholders = "VALUES " + placeholders
+            params = [value for key in chunk for value in key]
+            cursor = conn.execute(f"DELETE FROM {table} WHERE {target} IN ({placeholders})", params)
+            deleted += cursor.rowcount
+    except BaseException:
+        conn.execute("ROLLBACK TO delete_by_keys")
+        conn.execute("RELEASE delete_by_keys")
+        raise
+    # 最外层的保存点释放时提交
+    conn.execute("RELEASE delete_by_keys")
+    return deleted
+
+
+def fetch_row(conn, table_name, key_columns, key):
+    """按键读取一行的原始值，返回{列名: 值}，行不存在时返回None"""
+    cursor = conn.execute(f"SELECT * FROM {quote_ident(table_name)} WHERE {_key_match_sql(key_columns)}", key)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([desc[0] for desc in cursor.description], row))
+
+
+def update_row(conn, table_name, key_columns, key, values):
+    """按键更新一行中指定列的值，返回更新的行数"""
+    if not values:
+        return 0
+    set_clause = ", ".join(f"{quote_ident(col)} = ?" for col in values)
+    cursor = conn.execute(
+        f"UPDATE {quote_ident(table_name)} SET {set_clause} WHERE {_key_match_sql(key_columns)}",
+        list(values.values()) + list(key))
+    conn.commit()
+    return cursor.rowcount
+
+
+def primary_key_columns(conn, table_name):
+    """按主键中的顺序返回主键列名"""
+    info = conn.execute(f"PRAGMA table_info({quote_ident(table_name)})").fetchall()
+    return [col[1] for col in sorted((col for col in info if col[5] > 0), key=lambda col: col[5])]
+
+
+_FILTER_OPERATORS = (">=", "<=", "!=", "<>", "=", ">", "<")
+
+
+def _filter_value(text):
+    """筛选值尽量按数字绑定，这样没有类型亲和性的列也能按数值比较"""
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def compile_filters(columns, filters):
+    """把每列的筛选文本编译为参数化的WHERE条件，返回(where_sql, params)，没有条件时where_sql为空串
+
+    支持的写法：=值、!=值、>值、>=值、<值、<=值、NULL、NOT NULL、含%或_的LIKE模式，
+    其他文本按包含匹配（LIKE '%文本%'）。
+    """
+    conditions = []
+    params = []
+    for column, text in filters.items():
+        text = text.strip()
+        if not text:
+            continue
+        if column not in columns:
+            raise ValueError(f"没有名为 {column} 的列")
+        target = quote_ident(column)
+        upper = text.upper()
+        if upper == "NULL":
+            conditions.append(f"{target} IS NULL")
+            continue
+        if upper in ("NOT NULL", "!NULL"):
+            conditions.append(f"{target} IS NOT NULL")
+            continue
+
+        operator = next((op for op in _FILTER_OPERATORS if text.startswith(op)), None)
+        if operator is not None:
+            value = text[len(operator):].strip()
+            if not value:
+                raise ValueError(f"列 {column} 的筛选条件缺少比较值")
+            conditions.append(f"{target} {'!=' if operator == '<>' else operator} ?")
+            params.append(_filter_value(value))
+        elif "%" in text or "_" in text:
+            conditions.append(f"{target} LIKE ?")
+            params.append(text)
+        else:
+            conditions.append(f"{target} LIKE ?")
+            params.append(f"%{text}%")
+    return " AND ".join(conditions), params
+
+
+def format_size(size):
+    """把字节数格式化为便于阅读的文本"""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+# 常见文件格式的文件头，用于在表格中提示BLOB的类型
+BLOB_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "PNG图像"),
+    (b"\xff\xd8\xff", "JPEG图像"),
+    (b"GIF87a", "GIF图像"),
+    (b"GIF89a", "GIF图像"),
+    (b"BM", "BMP图像"),
+    (b"%PDF", "PDF"),
+    (b"PK\x03\x04", "ZIP"),
+    (b"\x1f\x8b", "GZIP"),
+    (b"SQLite format 3\x00", "SQLite数据库"),
+)
+
+
+def blob_kind(head):
+    """按文件头判断BLOB的类型，无法识别时返回None"""
+    for signature, kind in BLOB_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    return None
+
+
+class BlobValue:
+    """分页读取时BLOB单元格的占位值：只读取长度，内容需要时按块读取
+
+    head为内容开头的若干字节，由显示它的模型按需填充。
+    """
+    __slots__ = ("length", "head")
+
+    def __init__(self, length, head=None):
+        self.length = length
+        self.head = head
+
+    def __str__(self):
+        return blob_preview(self.head or b"", self.length)
+
+    def __repr__(self):
+        return f"BlobValue({self.length})"
+
+
+def blob_preview(head, length, hex_bytes=8):
+    """BLOB在表格中的显示文本：类型或开头几个字节的十六进制，加上大小"""
+    kind = blob_kind(head)
+    if kind is None:
+        kind = head[:hex_bytes].hex(" ") + (" ..." if length > hex_bytes else "") if head else "BLOB"
+    return f"<{kind}, {format_size(length)}>"
+
+
+def cell_text(value):
+    """单元格的显示文本，BLOB只显示预览，不把整个内容转换成字符串"""
+    if isinstance(value, bytes):
+        return blob_preview(value[:16], len(value))
+    return str(value)
+
+
+def blob_affinity_columns(conn, table_name):
+    """返回具有BLOB亲和性的列（声明类型包含BLOB或没有声明类型），这些列最可能保存大对象"""
+    return {col[1] for col in conn.execute(f"PRAGMA table_info({quote_ident(table_name)})")
+            if not col[2] or "BLOB" in col[2].upper()}
+
+
+def read_blob_chunks(conn, table_name, column, key_columns, key, use_rowid=True, chunk_size=1 << 20, limit=None):
+    """按键逐块读取一个单元格的内容（最多limit字节），不把整个BLOB一次读入内存
+
+    rowid表通过Connection.blobopen增量读取；WITHOUT ROWID表、Python 3.11之前（没有blobopen）等
+    不支持增量读取时退化为按键读取整个值再分块返回。值为NULL时不返回任何块，行不存在时抛出LookupError。
+    """
+    if use_rowid and hasattr(conn, "blobopen"):
+        try:
+            blob = conn.blobopen(table_name, column, key[0], readonly=True)
+        except sqlite3.OperationalError:
+            # 行不存在或值不是BLOB/文本（例如NULL），交给下面的查询区分
+            blob = None
+        if blob is not None:
+            with blob:
+                remaining = len(blob) if limit is None else min(limit, len(blob))
+                while remaining > 0:
+                    chunk = blob.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+            return
+
+    row = conn.execute(f"SELECT {quote_ident(column)} FROM {quote_ident(table_name)} "
+                       f"WHERE {_key_match_sql(key_columns)}", list(key)).fetchone()
+    if row is None:
+        raise LookupError("记录已不存在")
+    value = row[0]
+    if value is None:
+        return
+    if not isinstance(value, bytes):
+        value = str(value).encode("utf-8")
+    if limit is not None:
+        value = value[:limit]
+    for offset in range(0, len(value), chunk_size):
+        yield value[offset:offset + chunk_size]
+
+
+# 跳转时跳过的页，起始键在需要时再按偏移推算
+_UNKNOWN_START = object()
+
+
+class RowPager:
+    """按键集分页读取表数据，内存中只保留有限数量的数据页
+
+    每一页从上一页最后一行的排序键之后开始读取（WHERE ... ORDER BY ... LIMIT ?），
+    读取代价与页所在位置无关。被淘汰的页只保留起始键，需要时再重新读取。
+    键为rowid；WITHOUT ROWID表使用主键（可以是复合主键）；
+    每一行的键随数据一起保存，编辑和删除可以直接按键走B树定位。
+    指定sort_column时按该列排序，键作为并列时的次序；filters会编译为参数化的WHERE条件。
+    没有键的视图退化为LIMIT/OFFSET分页。
+    BLOB亲和性的列中的BLOB值只读取长度，以BlobValue表示，内容通过blob_chunks按需读取。
+    """
+    def __init__(self, conn, table_name, page_size=256, max_pages=16, catalog=None,
+                 sort_column=None, descending=False, filters=None):
+        self.conn = conn
+        self.table_name = table_name
+        self.page_size = page_size
+        self.max_pages = max_pages
+
+        cursor = conn.execute(f"SELECT * FROM {quote_ident(table_name)} LIMIT 0")
+        self.columns = [desc[0] for desc in cursor.description]
+
+        self.use_rowid = table_has_rowid(conn, table_name)
+        if self.use_rowid:
+            # 表中有同名列时rowid会被遮蔽，改用它的别名
+            alias = next((name for name in ("rowid", "_rowid_", "oid")
+                          if name.lower() not in {col.lower() for col in self.columns}), "rowid")
+            self.key_columns = [alias]
+        else:
+            self.key_columns = (catalog.primary_key(table_name) if catalog is not None
+                                else primary_key_columns(conn, table_name))
+
+        if sort_column is not None and sort_column not in self.columns:
+            raise ValueError(f"没有名为 {sort_column} 的列")
+        # 只有能按键重新定位的行才能按需读取BLOB内容
+        self.blob_columns = blob_affinity_columns(conn, table_name) if self.has_keys else set()
+        self._blob_indexes = [i for i, col in enumerate(self.columns) if col in self.blob_columns]
+
+        self.sort_column = sort_column
+        self.descending = descending
+        self.filters = dict(filters or {})
+        self._where, self._where_params = compile_filters(self.columns, self.filters)
+
+        # 排序键：排序列（如果有）加上行键，每页的起点记录为上一页最后一行的排序键
+        self._order_columns = ([sort_column] if sort_column is not None else []) + self.key_columns
+
+        # 第i页从键_page_starts[i]之后开始，第0页为None
+        self._page_starts = []
+        self._pages = OrderedDict()
+        self._next_start = None
+        self.loaded_rows = 0
+        self.exhausted = False
+
+    @property
+    def has_keys(self):
+        """是否能按键定位每一行"""
+        return bool(self.key_columns)
+
+    def order_by_sql(self):
+        """返回当前排序对应的ORDER BY子句内容"""
+        direction = " DESC" if self.descending else ""
+        return ", ".join(quote_ident(col) + direction for col in self._order_columns)
+
+    def where_sql(self):
+        """返回当前筛选条件(where_sql, params)"""
+        return self._where, list(self._where_params)
+
+    def _after(self, start):
+        """生成“排在start之后”的条件及参数，能让排序列上的索引直接定位到起点
+
+        返回(condition, params, null_tail)。降序时NULL排在最后，null_tail为True表示
+        还需要接上排序列为NULL的行；把它们单独查询可以避免OR条件妨碍索引定位。
+        """
+        keys = ", ".join(quote_ident(col) for col in self.key_columns)
+        placeholders = ", ".join("?" for _ in self.key_columns)
+        beyond = "<" if self.descending else ">"
+        if self.sort_column is None:
+            return f"({keys}) {beyond} ({placeholders})", list(start), False
+
+        sort_value, key = start[0], list(start[1:])
+        target = quote_ident(self.sort_column)
+        tie = f"({keys}) {beyond} ({placeholders})"
+        # SQLite中NULL排在最小：升序时在最前，降序时在最后
+        if sort_value is None:
+            if self.descending:
+                return f"({target} IS NULL AND {tie})", key, False
+            return f"(({target} IS NULL AND {tie}) OR {target} IS NOT NULL)", key, False
+        if self.descending:
+            condition = f"({target} <= ? AND ({target} < ? OR ({target} = ? AND {tie})))"
+            return condition, [sort_value, sort_value, sort_value] + key, True
+        condition = f"({target} >= ? AND ({target} > ? OR ({target} = ? AND {tie})))"
+        return condition, [sort_value, sort_value, sort_value] + key, False
+
+    def _select(self, columns_sql, condition, params, limit):
+        conditions = []
+        all_params = []
+        if self._where:
+            conditions.append(f"({self._where})")
+            all_params.extend(self._where_params)
+        if condition:
+            conditions.append(condition)
+            all_params.extend(params)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        sql = f"SELECT {columns_sql} FROM {quote_ident(self.table_name)}{where} ORDER BY {self.order_by_sql()} LIMIT ?"
+        return sql, all_params + [limit]
+
+    def _key_select(self, start, extra_columns_sql, limit, offset=0):
+        """生成按排序键从start之后读取的语句，结果的前几列是排序键"""
+        columns_sql = ", ".join(quote_ident(col) for col in self._order_columns)
+        if extra_columns_sql:
+            columns_sql += ", " + extra_columns_sql
+        if start is None:
+            condition, condition_params, null_tail = "", [], False
+        else:
+            condition, condition_params, null_tail = self._after(start)
+
+        if not null_tail:
+            sql, params = self._select(columns_sql, condition, condition_params, limit)
+            if offset:
+                sql += " OFFSET ?"
+                params.append(offset)
+            return sql, params
+
+        # 非NULL部分和NULL部分各取足够的行，合并后只需对少量结果排序
+        head_sql, head_params = self._select(columns_sql, condition, condition_params, limit + offset)
+        tail_sql, tail_params = self._select(columns_sql, f"{quote_ident(self.sort_column)} IS NULL", [],
+                                             limit + offset)
+        order = ", ".join(f"{position} DESC" for position in range(1, len(self._order_columns) + 1))
+        sql = (f"SELECT * FROM ({head_sql}) UNION ALL SELECT * FROM ({tail_sql}) "
+               f"ORDER BY {order} LIMIT ? OFFSET ?")
+        return sql, head_params + tail_params + [limit, offset]
+
+    def _row_columns_sql(self):
+        """读取一行数据的列表达式：BLOB列中的BLOB只取长度（SQLite不会为此读取溢出页），放在最后"""
+        if not self._blob_indexes:
+            return "*"
+        values = []
+        lengths = []
+        for col in self.columns:
+            target = quote_ident(col)
+            if col in self.blob_columns:
+                values.append(f"CASE WHEN typeof({target}) = 'blob' THEN NULL ELSE {target} END")
+                lengths.append(f"CASE WHEN typeof({target}) = 'blob' THEN length({target}) END")
+            else:
+                values.append(target)
+        return ", ".join(values + lengths)
+
+    def _decode_row(self, row):
+        width = len(self.columns)
+        values = list(row[:width])
+        for index, length in zip(self._blob_indexes, row[width:]):
+            if length is not None:
+                values[index] = BlobValue(length)
+        return tuple(values)
+
+    def _page_start(self, page_index):
+        """返回第page_index页的起始键；跳转时跳过的页从最近的已知起点按偏移推算一次"""
+        start = self._page_starts[page_index]
+        if start is not _UNKNOWN_START:
+            return start
+        known = page_index - 1
+        while self._page_starts[known] is _UNKNOWN_START:
+            known -= 1
+        sql, params = self._key_select(self._page_starts[known], "", 1, (page_index - known) * self.page_size - 1)
+        row = self.conn.execute(sql, params).fetchone()
+        if row is None:
+            # 跳过的行已被删除，该页没有数据
+            return _UNKNOWN_START
+        self._page_starts[page_index] = tuple(row)
+        return self._page_starts[page_index]
+
+    def _query_page(self, page_index):
+        if self.has_keys:
+            start = self._page_start(page_index) if page_index < len(self._page_starts) else self._next_start
+            if start is _UNKNOWN_START:
+                return [], []
+            width = len(self._order_columns)
+            sql, params = self._key_select(start, self._row_columns_sql(), self.page_size)
+            rows = self.conn.execute(sql, params).fetchall()
+            if self._blob_indexes:
+                return [row[:width] for row in rows], [self._decode_row(row[width:]) for row in rows]
+            return [row[:width] for row in rows], [row[width:] for row in rows]
+
+        where = f" WHERE {self._where}" if self._where else ""
+        order = f" ORDER BY {quote_ident(self.sort_column)}{' DESC' if self.descending else ''}" if self.sort_column else ""
+        sql = f"SELECT * FROM {quote_ident(self.table_name)}{where}{order} LIMIT ? OFFSET ?"
+        params = list(self._where_params) + [self.page_size, page_index * self.page_size]
+        rows = self.conn.execute(sql, params).fetchall()
+        return [None] * len(rows), rows
+
+    def _store_page(self, page_index, page):
+        self._pages[page_index] = page
+        self._pages.move_to_end(page_index)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def fetch_more(self):
+        """读取下一页，返回新增的行数"""
+        if self.exhausted:
+            return 0
+
+        page_index = len(self._page_starts)
+        keys, rows = self._query_page(page_index)
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if not rows:
+            return 0
+
+        self._page_starts.append(self._next_start)
+        self._next_start = keys[-1]
+        self._store_page(page_index, (keys, rows))
+        self.loaded_rows += len(rows)
+        return len(rows)
+
+    def load_through(self, row_index):
+        """把已加载的范围扩展到包含row_index，中间的页不读取（用于跳转到指定行），返回新增的行数"""
+        loaded = 0
+        if not self._page_starts:
+            # 跳过的页要从最近的已知起点推算起始键，第0页是唯一一开始就已知的起点，先读取它
+            loaded = self.fetch_more()
+        if row_index < self.loaded_rows or self.exhausted:
+            return loaded
+        first_page = len(self._page_starts)
+        target_page = row_index // self.page_size
+        skipped = target_page - first_page
+        if skipped > 0:
+            if self.has_keys:
+                # 一次查询找到目标页的起始键，只读取排序键，不经过中间页的数据
+                sql, params = self._key_select(self._next_start, "", 1, skipped * self.page_size - 1)
+                row = self.conn.execute(sql, params).fetchone()
+                if row is None:
+                    return loaded
+                self._page_starts.extend([_UNKNOWN_START] * skipped)
+                self._next_start = tuple(row)
+            else:
+                where = f" WHERE {self._where}" if self._where else ""
+                sql = f"SELECT 1 FROM {quote_ident(self.table_name)}{where} LIMIT 1 OFFSET ?"
+                if self.conn.execute(sql, list(self._where_params) + [target_page * self.page_size - 1]).fetchone() is None:
+                    return loaded
+                self._page_starts.extend([None] * skipped)
+            self.loaded_rows += skipped * self.page_size
+        return loaded + skipped * self.page_size + self.fetch_more()
+
+    def position_of(self, key):
+        """返回键为key的行在当前排序和筛选下的行号，行不存在或不满足筛选条件时返回None"""
+        if not self.has_keys:
+            return None
+        table = quote_ident(self.table_name)
+        order_columns = ", ".join(quote_ident(col) for col in self._order_columns)
+        where = f"({self._where}) AND " if self._where else ""
+        row = self.conn.execute(f"SELECT {order_columns} FROM {table} WHERE {where}{_key_match_sql(self.key_columns)}",
+                                list(self._where_params) + list(key)).fetchone()
+        if row is None:
+            return None
+
+        def count(condition, params):
+            conditions = [f"({self._where})"] if self._where else []
+            conditions.append(condition)
+            sql = f"SELECT count(*) FROM {table} WHERE {' AND '.join(conditions)}"
+            return self.conn.execute(sql, list(self._where_params) + list(params)).fetchone()[0]
+
+        # 行号 = 排在它前面的行数 = 满足筛选的行数 - 排在它之后的行数 - 1
+        condition, params, null_tail = self._after(tuple(row))
+        after = count(condition, params)
+        if null_tail:
+            after += count(f"{quote_ident(self.sort_column)} IS NULL", [])
+        return count("1", []) - after - 1
+
+    def _page(self, page_index):
+        page = self._pages.get(page_index)
+        if page is None:
+            page = self._query_page(page_index)
+            self._store_page(page_index, page)
+        else:
+            self._pages.move_to_end(page_index)
+        return page
+
+    def _locate(self, row_index):
+        if row_index < 0 or row_index >= self.loaded_rows:
+            return None, None
+        page = self._page(row_index // self.page_size)
+        offset = row_index % self.page_size
+        if offset >= len(page[1]):
+            return None, None
+        return page[0][offset], page[1][offset]
+
+    def row(self, row_index):
+        """返回指定行的数据元组，行已不存在时返回None"""
+        return self._locate(row_index)[1]
+
+    def row_key(self, row_index):
+        """返回指定行的键元组（rowid或主键），没有键或行已不存在时返回None"""
+        order_key = self._locate(row_index)[0]
+        if order_key is None:
+            return None
+        return tuple(order_key[len(order_key) - len(self.key_columns):])
+
+    def value(self, row_index, column_index):
+        row = self.row(row_index)
+        return None if row is None else row[column_index]
+
+    def blob_chunks(self, row_index, column_index, chunk_size=1 << 20, limit=None):
+        """按块读取指定单元格的内容，行已不存在时抛出LookupError"""
+        key = self.row_key(row_index)
+        if key is None:
+            raise LookupError("无法定位记录")
+        return read_blob_chunks(self.conn, self.table_name, self.columns[column_index], self.key_columns, key,
+                                self.use_rowid, chunk_size, limit)
+
+    def blob_head(self, row_index, column_index, size=16):
+        """读取指定单元格内容的开头size个字节"""
+        return b"".join(self.blob_chunks(row_index, column_index, size, size))
+
+    def keys_for_range(self, first, last):
+        """返回第first到last行（含）的键元组列表，只读取键，不影响已缓存的数据页"""
+        if not self.has_keys:
+            raise ValueError(f"{self.table_name} 没有rowid或主键，无法定位记录")
+        last = min(last, self.loaded_rows - 1)
+        if first > last:
+            return []
+        page_index = first // self.page_size
+        offset = first - page_index * self.page_size
+        start = self._page_start(page_index)
+        if start is _UNKNOWN_START:
+            return []
+        sql, params = self._key_select(start, "", last - first + 1, offset)
+        width = len(self.key_columns)
+        return [tuple(row[len(row) - width:]) for row in self.conn.execute(sql, params)]
+
+
+def sort_needs_temp_btree(conn, table_name, sort_column, descending=False, where="", params=()):
+    """用EXPLAIN QUERY PLAN判断按该列排序是否无法使用索引、需要临时B树对整个结果排序"""
+    where_sql = f" WHERE {where}" if where else ""
+    direction = " DESC" if descending else ""
+    sql = (f"EXPLAIN QUERY PLAN SELECT * FROM {quote_ident(table_name)}{where_sql} "
+           f"ORDER BY {quote_ident(sort_column)}{direction} LIMIT 1")
+    return any("TEMP B-TREE" in row[-1] for row in conn.execute(sql, list(params)))
+
+
+def approximate_row_count(conn, table_name):
+    """不扫描全表，粗略估计表的行数（rowid表用rowid范围，否则返回None）"""
+    if not table_has_rowid(conn, table_name):
+        return None
+    row = conn.execute(f"SELECT max(rowid) - min(rowid) + 1 FROM {quote_ident(table_name)}").fetchone()
+    return row[0] or 0
+
+
+class SchemaCatalog:
+    """按连接缓存表、列、索引和外键等结构信息，供所有标签页共用
+
+    每次读取前用PRAGMA schema_version做一次廉价校验：任何连接修改了结构
+    （包括附加的数据库），缓存就整体失效并在下次访问时重新读取。
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self._version = None
+        self._cache = {}
+
+    def _schema_version(self):
+        schemas = [row[1] for row in self.conn.execute("PRAGMA database_list")]
+        return tuple((schema, self.conn.execute(f"PRAGMA {quote_ident(schema)}.schema_version").fetchone()[0])
+                     for schema in schemas)
+
+    def _get(self, key, load):
+        version = self._schema_version()
+        if version != self._version:
+            self._cache.clear()
+            self._version = version
+        if key not in self._cache:
+            self._cache[key] = load()
+        return self._cache[key]
+
+    def _pragma(self, schema, pragma, name):
+        return self.conn.execute(f"PRAGMA {quote_ident(schema)}.{pragma}({quote_ident(name)})").fetchall()
+
+    def invalidate(self):
+        self._version = None
+        self._cache.clear()
+
+    def schemas(self):
+        """返回main以及所有附加数据库的名称"""
+        return [version[0] for version in self._get(("schemas",), self._schema_version)]
+
+    def tables(self, schema="main"):
+        """返回数据库中所有表的名称"""
+        return self._get(("tables", schema), lambda: [
+            row[0] for row in self.conn.execute(
+                f"SELECT name FROM {quote_ident(schema)}.sqlite_master WHERE type='table'")])
+
+    def columns(self, table_name, schema="main"):
+        """返回PRAGMA table_info的结果(cid, name, type, notnull, dflt_value, pk)"""
+        return self._get(("columns", schema, table_name),
+                         lambda: self._pragma(schema, "table_info", table_name))
+
+    def column_names(self, table_name, schema="main"):
+        return [col[1] for col in self.columns(table_name, schema)]
+
+    def primary_key(self, table_name, schema="main"):
+        """按主键中的顺序返回主键列名"""
+        columns = [col for col in self.columns(table_name, schema) if col[5] > 0]
+        return [col[1] for col in sorted(columns, key=lambda col: col[5])]
+
+    def indexes(self, table_name, schema="main"):
+        """返回PRAGMA index_list的结果(seq, name, unique, origin, partial)"""
+        return self._get(("indexes", schema, table_name),
+                         lambda: self._pragma(schema, "index_list", table_name))
+
+    def index_columns(self, index_name, schema="main"):
+        """返回PRAGMA index_info的结果(seqno, cid, name)"""
+        return self._get(("index_columns", schema, index_name),
+                         lambda: self._pragma(schema, "index_info", index_name))
+
+    def foreign_keys(self, table_name, schema="main"):
+        """返回PRAGMA foreign_key_list的结果"""
+        return self._get(("foreign_keys", schema, table_name),
+                         lambda: self._pragma(schema, "foreign_key_list", table_name))
+
+    def create_sql(self, table_name, schema="main"):
+        """返回建表语句，表不存在时返回None"""
+        def load():
+            row = self.conn.execute(
+                f"SELECT sql FROM {quote_ident(schema)}.sqlite_master WHERE type='table' AND name=?",
+                (table_name,)).fetchone()
+            return row[0] if row else None
+        return self._get(("create_sql", schema, table_name), load)
+
+
+# 数据库不超过这么多页时，rowid表也用dbstat统计叶子页单元数（需要读取该表的全部页，约每100MB耗时0.1秒）
+DBSTAT_ESTIMATE_MAX_PAGES = 32768
+
+
+def _dbstat_row_count(conn, table_name, clustered=False):
+    """由dbstat中该表B树的单元数得出行数；没有dbstat或该名称没有B树（如视图）时返回None
+
+    rowid表的行只存放在叶子页；WITHOUT ROWID表是聚簇的索引B树，
+    内部页的每个单元也是一行，需要一并计入（clustered=True）。
+    """
+    pagetypes = "('leaf', 'internal')" if clustered else "('leaf')"
+    try:
+        row = conn.execute(f"SELECT sum(ncell) FROM dbstat WHERE name = ? AND pagetype IN {pagetypes}",
+                           (table_name,)).fetchone()
+        return row[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def estimate_row_count(conn, table_name):
+    """不做全表计数，立即返回表行数的估计值，无法估计时返回None
+
+    依次尝试：ANALYZE收集的sqlite_stat1统计、dbstat虚拟表中该表B树存放行的单元数
+    （rowid表只在数据库较小、读取开销有限时使用）、rowid范围（只需两次B树查找）。
+    rowid稀疏或大量删除后rowid范围会远大于实际行数，因此不超过已用页数所能容纳的行数上限。
+    """
+    try:
+        rows = conn.execute("SELECT idx, stat FROM sqlite_stat1 WHERE tbl = ?", (table_name,)).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    counts = [int(stat.split()[0]) for _, stat in rows if stat and stat.split()[0].isdigit()]
+    if counts:
+        return max(counts)
+
+    if not table_has_rowid(conn, table_name):
+        return _dbstat_row_count(conn, table_name, clustered=True)
+
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    if page_count <= DBSTAT_ESTIMATE_MAX_PAGES:
+        count = _dbstat_row_count(conn, table_name)
+        if count is not None:
+            return count
+
+    span = approximate_row_count(conn, table_name)
+    # 表的叶子单元至少占5字节（2字节单元指针、载荷长度、rowid和记录头各1字节），页头8字节
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    used_pages = page_count - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return min(span, max(0, used_pages) * ((page_size - 8) // 5))
+
+
+def exact_row_count(conn, table_name):
+    return conn.execute(f"SELECT count(*) FROM {quote_ident(table_name)}").fetchone()[0]
+
+
+class RowCountCache:
+    """缓存每个表的精确行数
+
+    缓存项记录计数时的数据版本：PRAGMA data_version（其他连接的提交）加上本连接的
+    total_changes（本连接自己的修改），任一变化后缓存项失效。
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self._counts = {}
+
+    def version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0], self.conn.total_changes
+
+    def get(self, table_name):
+        """返回仍然有效的精确行数，没有时返回None"""
+        entry = self._counts.get(table_name)
+        if entry is None:
+            return None
+        count, version = entry
+        if version != self.version():
+            del self._counts[table_name]
+            return None
+        return count
+
+    def put(self, table_name, count, version):
+        """保存在数据版本version下得到的计数"""
+        self._counts[table_name] = (count, version)
+
+    def clear(self):
+        self._counts.clear()
+
+
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]")
+
+
+def normalize_sql(sql):
+    """规范化SQL文本用作缓存键：去掉首尾空白和末尾分号，合并引号以外的连续空白"""
+    parts = []
+    position = 0
+    for match in _SQL_LITERAL.finditer(sql):
+        parts.append(re.sub(r"\s+", " ", sql[position:match.start()]))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(re.sub(r"\s+", " ", sql[position:]))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+_LEADING_COMMENTS = re.compile(r"^(?:\s+|--[^\n]*(?:\n|$)|/\*.*?(?:\*/|$))*", re.DOTALL)
+
+
+def strip_leading_comments(sql):
+    """去掉语句开头的空白和注释"""
+    return sql[_LEADING_COMMENTS.match(sql).end():]
+
+
+def is_read_only_sql(sql):
+    """粗略判断语句是否只读（只有只读语句的结果可以缓存）"""
+    text = _SQL_LITERAL.sub("''", strip_leading_comments(sql)).strip().upper()
+    if text.startswith(("SELECT", "VALUES")):
+        return True
+    if text.startswith("WITH"):
+        return not re.search(r"\b(INSERT|UPDATE|DELETE|REPLACE)\b", text)
+    return False
+
+
+class QueryResultCache:
+    """按规范化SQL和参数缓存查询结果，总大小超过预算时按LRU淘汰
+
+    条目记录写入时的数据版本（PRAGMA data_version、schema_version以及本连接的
+    total_changes），任何一项变化后整个缓存失效。
+    """
+    def __init__(self, conn, budget_bytes=256 * 1048576):
+        self.conn = conn
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def version(self):
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        schema_version = self.conn.execute("PRAGMA schema_version").fetchone()[0]
+        return data_version, schema_version, self.conn.total_changes
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _revalidate(self):
+        version = self.version()
+        if version != self._version:
+            self.clear()
+            self._version = version
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    def _evict(self):
+        while self._size > self.budget_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+
+    def set_budget(self, budget_bytes):
+        """修改内存预算，超出部分立即按LRU淘汰"""
+        self.budget_bytes = budget_bytes
+        self._evict()
+
+    def get(self, sql, params=()):
+        """返回缓存的(columns, rows)，未命中时返回None"""
+        self._revalidate()
+        key = (normalize_sql(sql), tuple(params))
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, sql, params, columns, rows, version):
+        """保存在数据版本version下得到的结果；结果超过预算或数据已变化时不缓存"""
+        self._revalidate()
+        if version != self._version:
+            return False
+        size = estimate_rows_size(rows)
+        if size > self.budget_bytes:
+            return False
+        key = (normalize_sql(sql), tuple(params))
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= old[2]
+        self._entries[key] = (columns, rows, size)
+        self._size += size
+        self._evict()
+        return True
+
+
+def estimate_rows_size(rows, sample=200):
+    """按抽样估计结果集占用的内存字节数"""
+    if not rows:
+        return 0
+    step = max(1, len(rows) // sample)
+    sampled = rows[::step]
+    sampled_size = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sampled)
+    return int(sampled_size / len(sampled) * len(rows)) + sys.getsizeof(rows)
+
+
+DEFAULT_PRAGMAS = {
+    "busy_timeout": 5000,
+    "cache_size": -65536,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+
+
+def open_connection(db_path, read_only=False, pragmas=None):
+    """按URI打开数据库并应用连接参数；read_only为True时以只读方式打开，文件不存在时报错而不是新建"""
+    uri = f"{Path(db_path).resolve().as_uri()}?mode={'ro' if read_only else 'rw'}"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    for name, value in (DEFAULT_PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class ConnectionManager:
+    """管理同一个数据库的全部连接：读操作各用独立的只读连接，写操作经唯一的写连接串行执行
+
+    写连接由锁保护，同一时间只有一个操作（界面或后台线程）在写。所有连接使用相同的PRAGMA设置。
+    日志模式保持数据库原有的设置，不做切换（WAL会持久写入数据库文件）：
+    WAL模式下只读连接之间、只读连接与写入之间都不会相互阻塞；默认的回滚日志模式下
+    只读连接之间仍可并发，但提交需要等所有读取结束，读取较多时写操作可能等待到busy_timeout后失败，
+    读取也会在提交期间短暂等待。
+    """
+    def __init__(self, db_path, pragmas=None):
+        self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._readers = []
+        self._lock = threading.Lock()
+
+    def reader(self):
+        """打开新的只读连接，使用完毕后调用release关闭"""
+        conn = open_connection(self.db_path, read_only=True, pragmas=self.pragmas)
+        with self._lock:
+            self._readers.append(conn)
+        return conn
+
+    def release(self, conn):
+        """关闭reader()返回的连接"""
+        with self._lock:
+            if conn in self._readers:
+                self._readers.remove(conn)
+        conn.close()
+
+    @contextmanager
+    def write(self):
+        """获取写连接，等待其他写操作结束（最长busy_timeout）
+
+        with块内的异常会回滚未提交的事务。
+        """
+        timeout = self.pragmas.get("busy_timeout", 5000) / 1000
+        if not self._write_lock.acquire(timeout=timeout):
+            raise sqlite3.OperationalError("database is locked: 另一个写操作尚未完成")
+        try:
+            if self._writer is None:
+                self._writer = open_connection(self.db_path, pragmas=self.pragmas)
+            try:
+                yield self._writer
+            except BaseException:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+        finally:
+            self._write_lock.release()
+
+    def close(self):
+        """关闭所有连接"""
+        with self._lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+def split_statements(sql):
+    """用sqlite3.complete_statement把脚本拆分为单条语句，跳过只有注释或分号的片段
+
+    字符串、注释和触发器定义中的分号不会被当作语句结束；末尾缺少分号的语句也会返回。
+    """
+    statements = []
+    start = 0
+    position = sql.find(";")
+    while position >= 0:
+        candidate = sql[start:position + 1]
+        if sqlite3.complete_statement(candidate):
+            if strip_leading_comments(candidate).strip(" \t\r\n;"):
+                statements.append(candidate.strip())
+            start = position + 1
+        position = sql.find(";", position + 1)
+    tail = sql[start:]
+    if strip_leading_comments(tail).strip():
+        statements.append(tail.strip())
+    return statements
+
+
+_TRANSACTION_CONTROL = re.compile(r"(BEGIN|COMMIT|END|ROLLBACK|VACUUM)\b", re.IGNORECASE)
+
+
+def controls_transactions(statements):
+    """脚本中是否有自己控制事务的语句（这类脚本不能再包在一个事务中）"""
+    return any(_TRANSACTION_CONTROL.match(strip_leading_comments(sql)) for sql in statements)
+
+
+class StatementResult:
+    """脚本中一条语句的执行结果；columns为None表示没有结果集"""
+    def __init__(self, index, sql, columns=None, rows=None, row_count=-1, seconds=0.0, error=None):
+        self.index = index
+        self.sql = sql
+        self.columns = columns
+        self.rows = rows
+        self.row_count = row_count
+        self.seconds = seconds
+        self.error = error
+
+
+def execute_statements(conn, statements, single_transaction=False):
+    """依次执行语句，每执行完一条产出一个StatementResult，出错的语句产出后停止
+
+    single_transaction为True时整个脚本在一个事务中执行（脚本自己控制事务时除外），
+    出错或中途停止迭代时全部回滚；否则每条语句各自提交。
+    """
+    isolation_level = conn.isolation_level
+    # 自动提交模式：事务只由下面的BEGIN或脚本中的语句控制
+    conn.isolation_level = None
+    completed = False
+    try:
+        if single_transaction and not controls_transactions(statements):
+            conn.execute("BEGIN")
+        for index, sql in enumerate(statements):
+            start = time.perf_counter()
+            try:
+                cursor = conn.execute(sql)
+                if cursor.description is not None:
+                    columns = [desc[0] for desc in cursor.description]
+                    rows = cursor.fetchall()
+                    result = StatementResult(index, sql, columns, rows, len(rows), time.perf_counter() - start)
+                else:
+                    result = StatementResult(index, sql, row_count=cursor.rowcount,
+                                             seconds=time.perf_counter() - start)
+            except sqlite3.Error as e:
+                yield StatementResult(index, sql, seconds=time.perf_counter() - start, error=str(e))
+                return
+            yield result
+        completed = True
+    finally:
+        if conn.in_transaction:
+            if completed:
+                conn.commit()
+            else:
+                conn.rollback()
+        conn.isolation_level = isolation_level
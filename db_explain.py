@@ -0,0 +1,374 @@
+"""查询计划分析与索引建议，不依赖图形界面"""
+import re
+import time
+
+from db_engine import is_read_only_sql, quote_ident
+from db_transfer import OperationCancelled
+
+
+class PlanNode:
+    """EXPLAIN QUERY PLAN中的一个节点"""
+    def __init__(self, node_id, parent_id, detail):
+        self.node_id = node_id
+        self.parent_id = parent_id
+        self.detail = detail
+        self.children = []
+
+    @property
+    def kind(self):
+        """节点类型：full_scan、temp_btree、auto_index、search或other"""
+        detail = self.detail
+        if "AUTOMATIC" in detail:
+            return "auto_index"
+        if "TEMP B-TREE" in detail:
+            return "temp_btree"
+        match = re.match(r"SCAN (\S+)", detail)
+        if match and " USING " not in detail and " VIRTUAL TABLE " not in detail \
+                and not match.group(1).startswith("(") and match.group(1) != "CONSTANT":
+            return "full_scan"
+        if detail.startswith("SEARCH "):
+            return "search"
+        return "other"
+
+    @property
+    def table(self):
+        """SCAN/SEARCH节点访问的表名或别名"""
+        match = re.match(r"(?:SCAN|SEARCH) (\S+)", self.detail)
+        return match.group(1) if match else None
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def explain_query_plan(conn, sql, params=()):
+    """执行EXPLAIN QUERY PLAN并返回计划树的根节点列表"""
+    nodes = {}
+    roots = []
+    for node_id, parent_id, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        node = PlanNode(node_id, parent_id, detail)
+        nodes[node_id] = node
+        parent = nodes.get(parent_id)
+        if parent is None:
+            roots.append(node)
+        else:
+            parent.children.append(node)
+    return roots
+
+
+_TOKEN = re.compile(r"""
+    '(?:[^']|'')*'                    # 字符串
+  | "(?:[^"]|"")*" | `[^`]*` | \[[^\]]*\]   # 带引号的标识符
+  | \d+(?:\.\d*)?(?:[eE][-+]?\d+)?    # 数字
+  | [A-Za-z_][A-Za-z0-9_$]*           # 标识符或关键字
+  | <=|>=|<>|!=|==|\|\|               # 双字符运算符
+  | \S                                # 其他单个字符
+""", re.VERBOSE)
+
+_KEYWORDS = {
+    "SELECT", "FROM", "WHERE", "GROUP", "BY", "HAVING", "ORDER", "LIMIT", "OFFSET", "ON", "USING",
+    "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS", "NATURAL", "AS", "AND", "OR", "NOT",
+    "IN", "IS", "NULL", "LIKE", "GLOB", "BETWEEN", "ASC", "DESC", "UNION", "ALL", "EXCEPT",
+    "INTERSECT", "DISTINCT", "WITH", "CASE", "WHEN", "THEN", "ELSE", "END", "EXISTS", "WINDOW",
+    "COLLATE", "ESCAPE", "VALUES", "INDEXED", "NULLS", "FIRST", "LAST", "CAST",
+}
+_EQUALITY_OPERATORS = {"=", "==", "IS", "IN"}
+_RANGE_OPERATORS = {"<", ">", "<=", ">=", "BETWEEN", "LIKE", "GLOB"}
+_COMPARISON_OPERATORS = _EQUALITY_OPERATORS | _RANGE_OPERATORS
+
+
+def _tokenize(sql):
+    tokens = []
+    for token in _TOKEN.findall(sql):
+        if token[0] in "\"`[":
+            tokens.append(("name", token[1:-1].replace('""', '"') if token[0] == '"' else token[1:-1]))
+        elif token[0] == "'" or token[0].isdigit():
+            tokens.append(("literal", token))
+        elif token[0].isalpha() or token[0] == "_":
+            upper = token.upper()
+            tokens.append(("keyword", upper) if upper in _KEYWORDS else ("name", token))
+        else:
+            tokens.append(("op", token))
+    return tokens
+
+
+class QueryColumns:
+    """从SQL文本中粗略提取的、与索引选择相关的列引用
+
+    只做词法层面的分析，不展开子查询和视图；无法判断归属的列会被忽略。
+    equality/ranges/order_by为 {表名: [列名, ...]}，aliases为 {别名: 表名}。
+    """
+    def __init__(self, conn, sql):
+        self.conn = conn
+        self.aliases = {}
+        self.equality = {}
+        self.ranges = {}
+        self.order_by = {}
+        self._table_columns = {}
+        self._parse(_tokenize(sql))
+
+    def _columns_of(self, table):
+        columns = self._table_columns.get(table.lower())
+        if columns is None:
+            columns = {row[1].lower(): row[1] for row in
+                       self.conn.execute(f"PRAGMA table_info({quote_ident(table)})")}
+            self._table_columns[table.lower()] = columns
+        return columns
+
+    def _is_table(self, name):
+        return bool(self._columns_of(name))
+
+    def resolve_table(self, name):
+        """把计划中出现的表名或别名解析为表名"""
+        return self.aliases.get(name.lower(), name)
+
+    def _resolve(self, qualifier, column):
+        """返回(表名, 列名)，无法确定时返回None"""
+        if qualifier is not None:
+            table = self.aliases.get(qualifier.lower())
+            if table is None:
+                return None
+            name = self._columns_of(table).get(column.lower())
+            return (table, name) if name else None
+        matches = []
+        for table in set(self.aliases.values()):
+            name = self._columns_of(table).get(column.lower())
+            if name:
+                matches.append((table, name))
+        return matches[0] if len(matches) == 1 else None
+
+    def _parse(self, tokens):
+        # 第一遍：收集FROM/JOIN中的表及别名
+        clause = None
+        for i, (kind, value) in enumerate(tokens):
+            if kind == "keyword":
+                if value in ("FROM", "JOIN"):
+                    clause = "from"
+                elif value in ("WHERE", "GROUP", "ORDER", "HAVING", "LIMIT", "ON", "USING", "SELECT",
+                               "UNION", "EXCEPT", "INTERSECT", "WINDOW"):
+                    clause = None
+                continue
+            if clause != "from" or kind != "name":
+                continue
+            previous = tokens[i - 1] if i > 0 else None
+            if previous not in (("keyword", "FROM"), ("keyword", "JOIN"), ("op", ",")):
+                continue
+            table = value
+            next_index = i + 1
+            if next_index + 1 < len(tokens) and tokens[next_index] == ("op", "."):
+                # schema.table
+                table = tokens[next_index + 1][1]
+                next_index += 2
+            if not self._is_table(table):
+                continue
+            self.aliases.setdefault(table.lower(), table)
+            if next_index < len(tokens) and tokens[next_index] == ("keyword", "AS"):
+                next_index += 1
+            if next_index < len(tokens) and tokens[next_index][0] == "name":
+                self.aliases[tokens[next_index][1].lower()] = table
+
+        # 第二遍：收集WHERE/ON中的比较列和ORDER BY/GROUP BY中的排序列
+        clause = None
+        i = 0
+        while i < len(tokens):
+            kind, value = tokens[i]
+            if kind == "keyword":
+                if value in ("WHERE", "ON"):
+                    clause = "filter"
+                elif value in ("ORDER", "GROUP") and i + 1 < len(tokens) and tokens[i + 1] == ("keyword", "BY"):
+                    clause = "order"
+                    i += 1
+                elif value in ("SELECT", "FROM", "JOIN", "HAVING", "LIMIT", "USING", "UNION", "EXCEPT",
+                               "INTERSECT", "WINDOW"):
+                    clause = None
+                i += 1
+                continue
+            if kind != "name" or clause is None:
+                i += 1
+                continue
+            qualifier = None
+            end = i + 1
+            if end + 1 < len(tokens) and tokens[end] == ("op", ".") and tokens[end + 1][0] == "name":
+                qualifier, value = value, tokens[end + 1][1]
+                end += 2
+            if end < len(tokens) and tokens[end] == ("op", "("):
+                # 函数调用
+                i = end
+                continue
+            resolved = self._resolve(qualifier, value)
+            if resolved is not None:
+                table, column = resolved
+                if clause == "order":
+                    self._add(self.order_by, table, column)
+                else:
+                    operator = self._operator_after(tokens, end)
+                    if operator is None and i > 0 and tokens[i - 1][1] in _COMPARISON_OPERATORS:
+                        operator = tokens[i - 1][1]
+                    if operator in _EQUALITY_OPERATORS:
+                        self._add(self.equality, table, column)
+                    elif operator in _RANGE_OPERATORS:
+                        self._add(self.ranges, table, column)
+            i = end
+
+    @staticmethod
+    def _operator_after(tokens, index):
+        if index < len(tokens):
+            kind, value = tokens[index]
+            if value == "NOT" and index + 1 < len(tokens):
+                # NOT IN / NOT LIKE 等无法使用索引
+                return None
+            if kind in ("op", "keyword") and value in _COMPARISON_OPERATORS:
+                return value
+        return None
+
+    @staticmethod
+    def _add(mapping, table, column):
+        columns = mapping.setdefault(table, [])
+        if column not in columns:
+            columns.append(column)
+
+
+class IndexSuggestion:
+    """一条索引建议"""
+    def __init__(self, table, columns, reason):
+        self.table = table
+        self.columns = columns
+        self.reason = reason
+
+    @property
+    def name(self):
+        text = "_".join([self.table] + list(self.columns))
+        return "idx_" + re.sub(r"\W+", "_", text).strip("_").lower()
+
+    @property
+    def create_sql(self):
+        columns = ", ".join(quote_ident(col) for col in self.columns)
+        return f"CREATE INDEX {quote_ident(self.name)} ON {quote_ident(self.table)} ({columns})"
+
+
+def _existing_index_prefixes(conn, table):
+    prefixes = []
+    for row in conn.execute(f"PRAGMA index_list({quote_ident(table)})"):
+        columns = [info[2] for info in conn.execute(f"PRAGMA index_info({quote_ident(row[1])})")]
+        prefixes.append([col.lower() for col in columns if col is not None])
+    return prefixes
+
+
+def _covered(conn, table, columns):
+    wanted = [col.lower() for col in columns]
+    return any(prefix[:len(wanted)] == wanted for prefix in _existing_index_prefixes(conn, table))
+
+
+def suggest_indexes(conn, sql, plan=None, params=()):
+    """根据查询计划中的全表扫描、临时B树和自动索引提出CREATE INDEX建议
+
+    索引列顺序为：等值条件列，然后是第一个范围条件列；没有范围条件时追加排序列。
+    已有索引的前缀能覆盖的建议会被去掉。
+    """
+    if plan is None:
+        plan = explain_query_plan(conn, sql, params)
+    refs = QueryColumns(conn, sql)
+    suggestions = []
+
+    def add(table, columns, reason):
+        if not columns or _covered(conn, table, columns):
+            return
+        key = (table.lower(), tuple(col.lower() for col in columns))
+        if any((s.table.lower(), tuple(col.lower() for col in s.columns)) == key for s in suggestions):
+            return
+        suggestions.append(IndexSuggestion(table, columns, reason))
+
+    def columns_for(table, include_order):
+        columns = list(refs.equality.get(table, []))
+        ranges = [col for col in refs.ranges.get(table, []) if col not in columns]
+        if ranges:
+            columns.append(ranges[0])
+        elif include_order:
+            columns.extend(col for col in refs.order_by.get(table, []) if col not in columns)
+        return columns
+
+    nodes = [node for root in plan for node in root.walk()]
+    # 同时需要临时B树排序时，全表扫描的建议把排序列一并放进索引
+    sorts_in_btree = any(node.kind == "temp_btree" for node in nodes)
+    for node in nodes:
+        kind = node.kind
+        if kind == "full_scan":
+            table = refs.resolve_table(node.table)
+            add(table, columns_for(table, sorts_in_btree), f"全表扫描 {node.table}")
+        elif kind == "auto_index":
+            table = refs.resolve_table(node.table)
+            match = re.search(r"\(([^)]*)\)\s*$", node.detail)
+            if match:
+                columns = [re.split(r"[=<>]", term)[0].strip() for term in match.group(1).split(" AND ")]
+                add(table, columns, f"查询时临时创建自动索引 {node.table}")
+        elif kind == "temp_btree" and ("ORDER BY" in node.detail or "GROUP BY" in node.detail):
+            tables = list(refs.order_by)
+            if len(tables) == 1:
+                table = tables[0]
+                columns = list(refs.equality.get(table, []))
+                columns.extend(col for col in refs.order_by[table] if col not in columns)
+                add(table, columns, node.detail.replace("USE TEMP B-TREE FOR", "使用临时B树执行"))
+    return suggestions
+
+
+class IndexTrial:
+    """在回滚的事务中试建索引前后的查询耗时对比"""
+    def __init__(self, baseline_seconds, build_seconds, indexed_seconds, rows, plan):
+        self.baseline_seconds = baseline_seconds
+        self.build_seconds = build_seconds
+        self.indexed_seconds = indexed_seconds
+        self.rows = rows
+        self.plan = plan
+
+    @property
+    def speedup(self):
+        return self.baseline_seconds / self.indexed_seconds if self.indexed_seconds > 0 else float("inf")
+
+    def describe(self):
+        return (f"无索引 {self.baseline_seconds:.3f} 秒，有索引 {self.indexed_seconds:.3f} 秒"
+                f"（{self.speedup:.1f} 倍），建索引 {self.build_seconds:.3f} 秒，返回 {self.rows} 行")
+
+
+def _time_query(conn, sql, params):
+    start = time.perf_counter()
+    rows = 0
+    cursor = conn.execute(sql, params)
+    while True:
+        batch = cursor.fetchmany(5000)
+        if not batch:
+            break
+        rows += len(batch)
+    return time.perf_counter() - start, rows
+
+
+def trial_index(conn, sql, create_sql, params=(), cancel=None):
+    """在一个最终回滚的事务中临时创建索引，比较查询前后的耗时，数据库不会被修改
+
+    conn应为独立连接；cancel为threading.Event，置位后中断执行并抛出OperationCancelled。
+    只接受只读语句，否则计时运行本身就会修改数据。计时前先不计时地执行一遍预热页缓存，
+    两次计时都在热缓存下进行。
+    """
+    if not is_read_only_sql(sql):
+        raise ValueError("只能对只读查询试建索引")
+    if cancel is not None:
+        conn.set_progress_handler(lambda: 1 if cancel.is_set() else 0, 10000)
+    try:
+        _time_query(conn, sql, params)
+        baseline, rows = _time_query(conn, sql, params)
+        conn.execute("BEGIN")
+        try:
+            start = time.perf_counter()
+            conn.execute(create_sql)
+            build = time.perf_counter() - start
+            plan = explain_query_plan(conn, sql, params)
+            indexed, _ = _time_query(conn, sql, params)
+        finally:
+            conn.rollback()
+    except Exception:
+        if cancel is not None and cancel.is_set():
+            raise OperationCancelled()
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+    return IndexTrial(baseline, build, indexed, rows, plan)
@@ -1,19 +1,90 @@
 import sys
 import os
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # 命令行模式在导入PyQt5和pandas之前分派，可在没有图形环境的机器上运行
+    from db_cli import COMMANDS, main as cli_main
+    if sys.argv[1] in COMMANDS:
+        # 以spawn方式启动的工作进程会重新导入__main__，换成db_cli后子进程不再导入PyQt5和pandas
+        sys.modules["__main__"] = sys.modules["db_cli"]
+        sys.exit(cli_main(sys.argv[1:]))
+
 import sqlite3
-import pandas as pd
+import threading
+import time
+from collections import OrderedDict
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QTableView, QVBoxLayout, QHBoxLayout,
                              QPushButton, QWidget, QLineEdit, QLabel, QComboBox, QMessageBox,
                              QFileDialog, QTabWidget, QSplitter, QTextEdit, QHeaderView, QMenu,
-                             QStatusBar, QToolBar, QAction, QFrame)
-from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSize
+                             QStatusBar, QToolBar, QAction, QFrame, QProgressDialog, QCheckBox, QSpinBox,
+                             QDockWidget)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSize, QThread, QTimer, QEventLoop, QObject, pyqtSignal
 from PyQt5.QtGui import QCursor, QIcon, QFont, QColor, QPalette, QPixmap
+from db_engine import (
+    BlobValue,
+    ConnectionManager,
+    QueryResultCache,
+    RowCountCache,
+    RowPager,
+    SchemaCatalog,
+    blob_kind,
+    cell_text,
+    compile_filters,
+    delete_by_keys,
+    estimate_row_count,
+    exact_row_count,
+    execute_statements,
+    fetch_row,
+    format_size,
+    is_read_only_sql,
+    read_blob_chunks,
+    sort_needs_temp_btree,
+    split_statements,
+    update_row,
+)
+from db_profile import Profiler
+from db_transfer import (OperationCancelled, export_csv, export_xlsx, import_csv, import_excel,
+                         list_excel_sheets, read_csv_header, read_excel_header)
+
+class CellTextCache:
+    """按(行块, 列)缓存格式化后的单元格文本，容量有限，按LRU淘汰"""
+    def __init__(self, block_size=128, max_blocks=512):
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self._blocks = OrderedDict()
+
+    def get(self, row, col, format_block):
+        """返回单元格文本，未命中时调用format_block(col, start, end)批量格式化整个行块"""
+        block = row // self.block_size
+        key = (block, col)
+        texts = self._blocks.get(key)
+        if texts is None:
+            start = block * self.block_size
+            texts = format_block(col, start, start + self.block_size)
+            self._blocks[key] = texts
+            if len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(key)
+        return texts[row - block * self.block_size]
+
+    def clear(self):
+        self._blocks.clear()
+
+    def invalidate_from(self, row):
+        """丢弃包含row及其之后行的缓存块（追加数据时最后一块可能不完整）"""
+        first_block = row // self.block_size
+        for key in [key for key in self._blocks if key[0] >= first_block]:
+            del self._blocks[key]
 
 class PandasModel(QAbstractTableModel):
     """用于在QTableView中显示pandas DataFrame的模型"""
     def __init__(self, data):
         super().__init__()
         self._data = data
+        # 每列只从DataFrame中取出一次，之后按行块批量格式化
+        self._columns = [None] * len(data.columns)
+        self._text_cache = CellTextCache()
 
     def rowCount(self, parent=QModelIndex()):
         return len(self._data)
@@ -21,12 +92,21 @@ class PandasModel(QAbstractTableModel):
     def columnCount(self, parent=QModelIndex()):
         return len(self._data.columns)
 
+    def _column_values(self, col):
+        values = self._columns[col]
+        if values is None:
+            values = self._data.iloc[:, col].to_numpy(dtype=object)
+            self._columns[col] = values
+        return values
+
+    def _format_block(self, col, start, end):
+        return list(map(str, self._column_values(col)[start:end]))
+
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid():
             return None
         if role == Qt.DisplayRole:
-            value = self._data.iloc[index.row(), index.column()]
-            return str(value)
+            return self._text_cache.get(index.row(), index.column(), self._format_block)
         return None
 
     def headerData(self, section, orientation, role=Qt.DisplayRole):
@@ -37,11 +117,474 @@ class PandasModel(QAbstractTableModel):
                 return str(self._data.index[section])
         return None
 
+class PagedTableModel(QAbstractTableModel):
+    """按需分页加载表数据的模型，只保留可见区域附近的数据页"""
+    def __init__(self, pager, profiler=None):
+        super().__init__()
+        self._pager = pager
+        self._profiler = profiler
+        self._row_count = 0
+        self._row_count += self._pager.fetch_more()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._pager.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            value = self._pager.value(index.row(), index.column())
+            if isinstance(value, BlobValue) and value.head is None:
+                # 只读取开头几个字节用于预览，BLOB内容在查看或保存时才读取
+                try:
+                    value.head = self._pager.blob_head(index.row(), index.column())
+                except (sqlite3.Error, LookupError):
+                    value.head = b""
+            return cell_text(value)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return str(self._pager.columns[section])
+            if orientation == Qt.Vertical:
+                return str(section)
+        return None
+
+    @property
+    def pager(self):
+        return self._pager
+    
+    def load_through(self, row):
+        """跳转到row：把行数扩展到包含该行，中间的页留到滚动到时再读取"""
+        start = self._row_count
+        fetched = self._pager.load_through(row)
+        if fetched:
+            self.beginInsertRows(QModelIndex(), start, start + fetched - 1)
+            self._row_count += fetched
+            self.endInsertRows()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self._pager.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        start = self._row_count
+        if self._profiler is not None:
+            with self._profiler.profile(self._pager.conn, f"读取下一页 {self._pager.table_name}") as record:
+                fetched = self._pager.fetch_more()
+                record.rows = fetched
+        else:
+            fetched = self._pager.fetch_more()
+        if fetched:
+            self.beginInsertRows(QModelIndex(), start, start + fetched - 1)
+            self._row_count += fetched
+            self.endInsertRows()
+
+class QueryResultModel(QAbstractTableModel):
+    """逐批追加查询结果的模型，用于边执行边显示"""
+    def __init__(self, columns, rows=None):
+        super().__init__()
+        self._columns = columns
+        self._rows = list(rows) if rows is not None else []
+        self._text_cache = CellTextCache()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        start = len(self._rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._rows.extend(rows)
+        self._text_cache.invalidate_from(start)
+        self.endInsertRows()
+
+    def _format_block(self, col, start, end):
+        return [cell_text(row[col]) for row in self._rows[start:end]]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self._text_cache.get(index.row(), index.column(), self._format_block)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return str(self._columns[section])
+            if orientation == Qt.Vertical:
+                return str(section)
+        return None
+
+class QueryWorker(QThread):
+    """在后台线程中执行SQL查询，结果分批发送给界面
+
+    只读语句使用独立的只读连接，其他语句通过连接管理器的写连接执行。
+    """
+    columns_ready = pyqtSignal(list)
+    rows_ready = pyqtSignal(list)
+    progress = pyqtSignal(int, float)
+    succeeded = pyqtSignal(int, float, bool)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, connections, query, profiler, batch_size=1000):
+        super().__init__()
+        self.connections = connections
+        self.query = query
+        self.profiler = profiler
+        self.batch_size = batch_size
+        self._cancel_requested = False
+        self._connection = None
+
+    def cancel(self):
+        """请求取消查询，可以在界面线程中调用"""
+        self._cancel_requested = True
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.interrupt()
+            except sqlite3.ProgrammingError:
+                # 连接已经关闭，查询已结束
+                pass
+
+    def _progress_handler(self):
+        # 返回非零值会让SQLite中断当前语句
+        return 1 if self._cancel_requested else 0
+
+    def run(self):
+        try:
+            if is_read_only_sql(self.query):
+                connection = self.connections.reader()
+                try:
+                    self._execute(connection)
+                finally:
+                    self.connections.release(connection)
+            else:
+                with self.connections.write() as connection:
+                    self._execute(connection)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _execute(self, connection):
+        start = time.perf_counter()
+        row_count = 0
+        self._connection = connection
+        try:
+            with self.profiler.profile(connection, "SQL查询", self._progress_handler, 10000) as record:
+                cursor = connection.execute(self.query)
+
+                if cursor.description is None:
+                    # 没有结果集的语句（INSERT/UPDATE/DDL等）
+                    connection.commit()
+                    record.rows = max(cursor.rowcount, 0)
+                    self.succeeded.emit(record.rows, time.perf_counter() - start, False)
+                    return
+
+                self.columns_ready.emit([desc[0] for desc in cursor.description])
+                while not self._cancel_requested:
+                    rows = cursor.fetchmany(self.batch_size)
+                    if not rows:
+                        break
+                    row_count += len(rows)
+                    record.rows = row_count
+                    self.rows_ready.emit(rows)
+                    self.progress.emit(row_count, time.perf_counter() - start)
+                cursor.close()
+
+            if self._cancel_requested:
+                if connection.in_transaction:
+                    connection.rollback()
+                self.cancelled.emit()
+            else:
+                # 带RETURNING的写语句也有结果集
+                if connection.in_transaction:
+                    connection.commit()
+                self.succeeded.emit(row_count, time.perf_counter() - start, True)
+        except sqlite3.OperationalError as e:
+            if connection.in_transaction:
+                connection.rollback()
+            if self._cancel_requested:
+                self.cancelled.emit()
+            else:
+                self.failed.emit(str(e))
+        finally:
+            self._connection = None
+
+class ScriptWorker(QThread):
+    """在后台线程中依次执行脚本中的多条语句，分批把每条语句的结果发送给界面"""
+    results_ready = pyqtSignal(list)
+    succeeded = pyqtSignal(int, float)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, connections, statements, single_transaction, profiler):
+        super().__init__()
+        self.connections = connections
+        self.statements = statements
+        self.single_transaction = single_transaction
+        self.profiler = profiler
+        self._cancel_requested = False
+        self._connection = None
+
+    def cancel(self):
+        """请求取消脚本，可以在界面线程中调用；在一个事务中执行时已执行的语句全部回滚"""
+        self._cancel_requested = True
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.interrupt()
+            except sqlite3.ProgrammingError:
+                pass
+
+    def _progress_handler(self):
+        return 1 if self._cancel_requested else 0
+
+    def run(self):
+        try:
+            if all(is_read_only_sql(sql) for sql in self.statements):
+                connection = self.connections.reader()
+                try:
+                    self._execute(connection)
+                finally:
+                    self.connections.release(connection)
+            else:
+                with self.connections.write() as connection:
+                    self._execute(connection)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _execute(self, connection):
+        start = time.perf_counter()
+        self._connection = connection
+        pending = []
+        last_emit = start
+        error = None
+        try:
+            with self.profiler.profile(connection, "SQL脚本", self._progress_handler, 10000) as record:
+                results = execute_statements(connection, self.statements, self.single_transaction)
+                try:
+                    for result in results:
+                        pending.append(result)
+                        if result.error is not None:
+                            error = result
+                        elif result.columns is not None:
+                            record.rows += result.row_count
+                        # 几万条语句的脚本按时间分批发送，避免界面被逐条的信号拖慢
+                        now = time.perf_counter()
+                        if now - last_emit > 0.1 or result.columns is not None:
+                            self.results_ready.emit(pending)
+                            pending = []
+                            last_emit = now
+                        if self._cancel_requested:
+                            break
+                finally:
+                    # 提前结束迭代时回滚未提交的事务
+                    results.close()
+        finally:
+            self._connection = None
+            if pending:
+                self.results_ready.emit(pending)
+        
+        if self._cancel_requested:
+            self.cancelled.emit()
+        elif error is not None:
+            self.failed.emit(f"第 {error.index + 1} 条语句执行失败: {error.error}")
+        else:
+            self.succeeded.emit(len(self.statements), time.perf_counter() - start)
+
+class TaskWorker(QThread):
+    """在后台线程中执行耗时任务（导入、导出等），支持进度报告与取消
+
+    task(report, cancel)在后台线程中调用：report(text)更新进度文字，
+    cancel为threading.Event，用户取消时置位。
+    """
+    progress = pyqtSignal(str)
+
+    def __init__(self, task):
+        super().__init__()
+        self.task = task
+        self.cancel_event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            self.result = self.task(self.progress.emit, self.cancel_event)
+        except Exception as e:
+            self.error = e
+
+def run_task(parent, title, task):
+    """在后台执行task并显示可取消的进度对话框，期间界面保持响应
+
+    返回task的返回值；task抛出的异常（包括OperationCancelled）会在界面线程中重新抛出。
+    """
+    dialog = QProgressDialog(title, "取消", 0, 0, parent)
+    dialog.setWindowTitle(title)
+    dialog.setWindowModality(Qt.WindowModal)
+    dialog.setMinimumDuration(0)
+    dialog.setAutoClose(False)
+    dialog.setAutoReset(False)
+    
+    worker = TaskWorker(task)
+    worker.progress.connect(dialog.setLabelText)
+    dialog.canceled.connect(worker.cancel)
+    
+    loop = QEventLoop()
+    worker.finished.connect(loop.quit)
+    dialog.show()
+    worker.start()
+    loop.exec_()
+    worker.wait()
+    dialog.close()
+    dialog.deleteLater()
+    worker.deleteLater()
+    
+    if worker.error is not None:
+        raise worker.error
+    return worker.result
+
+class RowCountWorker(QThread):
+    """在后台线程中用独立的只读连接精确统计表的行数"""
+    counted = pyqtSignal(str, int, object)
+
+    def __init__(self, connections, table_name, version):
+        super().__init__()
+        self.connections = connections
+        self.table_name = table_name
+        self.version = version
+        self._cancel_requested = False
+        self._connection = None
+
+    def cancel(self):
+        self._cancel_requested = True
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.interrupt()
+            except sqlite3.ProgrammingError:
+                pass
+
+    def run(self):
+        try:
+            self._connection = self.connections.reader()
+            if self._cancel_requested:
+                return
+            count = exact_row_count(self._connection, self.table_name)
+            self.counted.emit(self.table_name, count, self.version)
+        except sqlite3.Error:
+            # 计数只用于显示，失败或被取消时保留估计值
+            pass
+        finally:
+            connection, self._connection = self._connection, None
+            if connection is not None:
+                self.connections.release(connection)
+
+class RowCountService(QObject):
+    """表行数服务：先立即给出估计值，再在后台得到精确值并缓存到数据变化为止"""
+    count_ready = pyqtSignal(str, int, bool)
+
+    def __init__(self, connections):
+        super().__init__()
+        self.connections = connections
+        self.db_connection = connections.reader()
+        self.cache = RowCountCache(self.db_connection)
+        self._workers = {}
+        self._latest = {}
+        self._stale = set()
+
+    def request(self, table_name):
+        """请求表的行数，结果通过count_ready(table_name, count, exact)发出"""
+        count = self.cache.get(table_name)
+        if count is not None:
+            self._publish(table_name, count, True)
+            return
+        
+        try:
+            estimate = estimate_row_count(self.db_connection, table_name)
+        except sqlite3.Error:
+            estimate = None
+        if estimate is not None:
+            self._publish(table_name, estimate, False)
+        
+        if table_name in self._workers:
+            return
+        worker = RowCountWorker(self.connections, table_name, self.cache.version())
+        worker.counted.connect(self._on_counted)
+        worker.finished.connect(lambda: self._on_worker_finished(table_name))
+        self._workers[table_name] = worker
+        worker.start()
+
+    def latest(self, table_name):
+        """返回最近一次发出的(count, exact)，没有时返回None"""
+        return self._latest.get(table_name)
+
+    def _publish(self, table_name, count, exact):
+        self._latest[table_name] = (count, exact)
+        self.count_ready.emit(table_name, count, exact)
+
+    def _on_counted(self, table_name, count, version):
+        self.cache.put(table_name, count, version)
+        if self.cache.get(table_name) is None:
+            # 计数期间数据已经变化，线程结束后重新统计
+            self._stale.add(table_name)
+            return
+        self._publish(table_name, count, True)
+
+    def _on_worker_finished(self, table_name):
+        worker = self._workers.pop(table_name, None)
+        if worker is not None:
+            worker.deleteLater()
+        if table_name in self._stale:
+            self._stale.discard(table_name)
+            self.request(table_name)
+
+    def shutdown(self):
+        """取消所有后台计数并等待线程结束"""
+        for worker in list(self._workers.values()):
+            worker.cancel()
+            worker.wait()
+        self._workers.clear()
+        self._stale.clear()
+        self.connections.release(self.db_connection)
+
 class SQLQueryTab(QWidget):
     """SQL查询执行标签页"""
-    def __init__(self, db_connection):
+    def __init__(self, connections, profiler):
         super().__init__()
-        self.db_connection = db_connection
+        self.connections = connections
+        self.db_connection = connections.reader()
+        self.profiler = profiler
+        self._worker = None
+        self._query_start = 0.0
+        self._rows_fetched = 0
+        self._query_sql = None
+        self._query_version = None
+        self._query_columns = None
+        self.result_cache = QueryResultCache(self.db_connection)
         self.initUI()
 
     def initUI(self):
@@ -55,40 +598,418 @@ class SQLQueryTab(QWidget):
         # 执行按钮
         btn_layout = QHBoxLayout()
         self.execute_btn = QPushButton("执行查询")
+        self.execute_btn.setToolTip("有选中的文本时只执行选中的部分；多条语句按脚本依次执行")
         self.execute_btn.clicked.connect(self.execute_query)
         btn_layout.addWidget(self.execute_btn)
+        
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_query)
+        btn_layout.addWidget(self.cancel_btn)
+        
+        self.explain_btn = QPushButton("分析计划")
+        self.explain_btn.clicked.connect(self.explain_query)
+        btn_layout.addWidget(self.explain_btn)
+        
+        # 多条语句的脚本默认在一个事务中执行，出错时全部回滚
+        self.transaction_check = QCheckBox("脚本在一个事务中执行")
+        self.transaction_check.setChecked(True)
+        btn_layout.addWidget(self.transaction_check)
+        
+        self.status_label = QLabel()
+        btn_layout.addWidget(self.status_label)
         btn_layout.addStretch()
+        
+        # 结果缓存：相同的只读查询在数据未变化时直接使用上次的结果
+        self.cache_check = QCheckBox("使用结果缓存")
+        self.cache_check.toggled.connect(self.on_cache_toggled)
+        btn_layout.addWidget(self.cache_check)
+        btn_layout.addWidget(QLabel("上限:"))
+        self.cache_budget_spin = QSpinBox()
+        self.cache_budget_spin.setRange(1, 65536)
+        self.cache_budget_spin.setValue(self.result_cache.budget_bytes // 1048576)
+        self.cache_budget_spin.setSuffix(" MB")
+        self.cache_budget_spin.valueChanged.connect(self.on_cache_budget_changed)
+        btn_layout.addWidget(self.cache_budget_spin)
+        self.cache_source_label = QLabel("结果来自缓存")
+        self.cache_source_label.setStyleSheet("color: #2e7d32; font-weight: bold;")
+        self.cache_source_label.hide()
+        btn_layout.addWidget(self.cache_source_label)
+        self.cache_stats_label = QLabel()
+        btn_layout.addWidget(self.cache_stats_label)
         layout.addLayout(btn_layout)
         
-        # 结果显示区域
+        # 结果显示区域：单条查询显示在“结果”页，脚本另有“消息”页和每个查询各自的结果页
+        self.result_tabs = QTabWidget()
         self.result_table = QTableView()
         self.result_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        layout.addWidget(self.result_table)
+        self.result_tabs.addTab(self.result_table, "结果")
+        layout.addWidget(self.result_tabs)
+        self._script_views = []
+        self._script_messages = None
         
         self.setLayout(layout)
+        
+        # 查询执行期间定时刷新耗时
+        self.elapsed_timer = QTimer(self)
+        self.elapsed_timer.setInterval(200)
+        self.elapsed_timer.timeout.connect(self.update_progress_label)
+        self.update_cache_stats()
+    
+    def on_cache_toggled(self, checked):
+        if not checked:
+            self.result_cache.clear()
+        self.update_cache_stats()
+    
+    def on_cache_budget_changed(self, value):
+        self.result_cache.set_budget(value * 1048576)
+        self.update_cache_stats()
+    
+    def update_cache_stats(self):
+        cache = self.result_cache
+        self.cache_stats_label.setText(
+            f"命中 {cache.hits} / 未命中 {cache.misses}，{len(cache)} 项，{cache.size / 1048576:.1f} MB")
+    
+    def selected_or_all_sql(self):
+        """有选中的文本时返回选中部分，否则返回全部文本"""
+        cursor = self.query_edit.textCursor()
+        if cursor.hasSelection():
+            # QTextEdit用U+2029表示选中文本中的段落分隔
+            return cursor.selectedText().replace("\u2029", "\n")
+        return self.query_edit.toPlainText()
+    
+    def reset_result_tabs(self):
+        """移除上一次脚本的结果页，只保留单条查询的结果页"""
+        self.result_tabs.clear()
+        for view in self._script_views:
+            view.deleteLater()
+        self._script_views = []
+        self._script_messages = None
+        self.result_tabs.addTab(self.result_table, "结果")
     
     def execute_query(self):
-        query = self.query_edit.toPlainText().strip()
-        if not query:
+        if self._worker is not None:
+            return
+        statements = split_statements(self.selected_or_all_sql())
+        if not statements:
             QMessageBox.warning(self, "警告", "请输入SQL查询语句")
             return
-        
+        if len(statements) > 1:
+            self.execute_script(statements)
+            return
+        query = statements[0]
+        
+        self.reset_result_tabs()
+        self.result_table.setModel(None)
+        self.cache_source_label.hide()
+        self._query_sql = None
+        if self.cache_check.isChecked() and is_read_only_sql(query):
+            start = time.perf_counter()
+            cached = self.result_cache.get(query)
+            self.update_cache_stats()
+            if cached is not None:
+                columns, rows = cached
+                self.result_table.setModel(QueryResultModel(columns, rows))
+                self.cache_source_label.show()
+                self.status_label.setText(
+                    f"返回 {len(rows)} 条记录（来自缓存），用时 {time.perf_counter() - start:.3f} 秒")
+                return
+            # 在执行前记录数据版本，执行期间若有写入则结果不会被缓存
+            self._query_sql = query
+            self._query_version = self.result_cache.version()
+        
+        # 在后台线程中执行，界面在查询期间保持响应
+        self._rows_fetched = 0
+        self._query_start = time.perf_counter()
+        
+        worker = QueryWorker(self.connections, query, self.profiler)
+        worker.columns_ready.connect(self.on_columns_ready)
+        worker.rows_ready.connect(self.on_rows_ready)
+        worker.progress.connect(self.on_progress)
+        worker.succeeded.connect(self.on_query_succeeded)
+        worker.failed.connect(self.on_query_failed)
+        worker.cancelled.connect(self.on_query_cancelled)
+        worker.finished.connect(self.on_worker_finished)
+        self._worker = worker
+        
+        self.execute_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.update_progress_label()
+        self.elapsed_timer.start()
+        worker.start()
+    
+    MAX_SCRIPT_RESULT_TABS = 20
+    
+    def execute_script(self, statements):
+        """在后台依次执行多条语句，每条查询的结果显示在单独的页中"""
+        self.reset_result_tabs()
+        self.result_tabs.clear()
+        self.cache_source_label.hide()
+        
+        messages_view = QTableView()
+        messages_view.horizontalHeader().setStretchLastSection(True)
+        self._script_messages = QueryResultModel(["序号", "语句", "行数", "耗时(ms)", "信息"])
+        messages_view.setModel(self._script_messages)
+        self._script_views.append(messages_view)
+        self.result_tabs.addTab(messages_view, "消息")
+        
+        self._statement_count = len(statements)
+        self._statements_done = 0
+        self._rows_fetched = 0
+        self._query_start = time.perf_counter()
+        
+        worker = ScriptWorker(self.connections, statements, self.transaction_check.isChecked(), self.profiler)
+        worker.results_ready.connect(self.on_script_results)
+        worker.succeeded.connect(self.on_script_succeeded)
+        worker.failed.connect(self.on_query_failed)
+        worker.cancelled.connect(self.on_query_cancelled)
+        worker.finished.connect(self.on_worker_finished)
+        self._worker = worker
+        
+        self.execute_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.update_progress_label()
+        self.elapsed_timer.start()
+        worker.start()
+    
+    def on_script_results(self, results):
+        messages = []
+        for result in results:
+            self._statements_done += 1
+            if result.error is not None:
+                info = result.error
+            elif result.columns is not None:
+                self._rows_fetched += result.row_count
+                result_tabs = len(self._script_views) - 1
+                if result_tabs < self.MAX_SCRIPT_RESULT_TABS:
+                    view = QTableView()
+                    view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+                    view.setModel(QueryResultModel(result.columns, result.rows))
+                    self._script_views.append(view)
+                    self.result_tabs.addTab(view, f"结果 {result_tabs + 1}")
+                    info = f"结果 {result_tabs + 1}"
+                else:
+                    info = f"结果页已达 {self.MAX_SCRIPT_RESULT_TABS} 个，未显示"
+            else:
+                info = "成功"
+            row_count = "" if result.row_count < 0 else result.row_count
+            messages.append((result.index + 1, " ".join(result.sql.split())[:200], row_count,
+                             f"{result.seconds * 1000:.1f}", info))
+        if self._script_messages is not None:
+            self._script_messages.append_rows(messages)
+    
+    def on_script_succeeded(self, statement_count, elapsed):
+        self.elapsed_timer.stop()
+        self.status_label.setText(f"执行 {statement_count} 条语句，用时 {elapsed:.2f} 秒")
+        QMessageBox.information(self, "成功", f"脚本执行完成，共 {statement_count} 条语句")
+    
+    def cancel_query(self):
+        if self._worker is not None:
+            self._worker.cancel()
+    
+    def explain_query(self):
+        """显示查询计划树，标出全表扫描、临时B树和自动索引，并给出索引建议"""
+        statements = split_statements(self.selected_or_all_sql())
+        if not statements:
+            QMessageBox.warning(self, "警告", "请输入SQL查询语句")
+            return
+        if len(statements) > 1:
+            QMessageBox.warning(self, "警告", f"编辑器中有 {len(statements)} 条语句，请选中要分析的一条语句")
+            return
+        query = statements[0].rstrip(";").strip()
+        from db_explain import explain_query_plan, suggest_indexes, trial_index
         try:
-            # 执行查询
-            df = pd.read_sql_query(query, self.db_connection)
-            model = PandasModel(df)
-            self.result_table.setModel(model)
-            QMessageBox.information(self, "成功", f"查询成功，返回 {len(df)} 条记录")
+            plan = explain_query_plan(self.db_connection, query)
+            suggestions = suggest_indexes(self.db_connection, query, plan)
         except Exception as e:
-            QMessageBox.critical(self, "错误", f"查询执行失败: {str(e)}")
+            QMessageBox.critical(self, "错误", f"分析查询计划失败: {str(e)}")
+            return
+        
+        from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QListWidget,
+                                     QListWidgetItem, QDialogButtonBox)
+        
+        highlights = {
+            "full_scan": (QColor("#ffcdd2"), "全表扫描"),
+            "temp_btree": (QColor("#ffe0b2"), "临时B树"),
+            "auto_index": (QColor("#fff9c4"), "自动索引"),
+        }
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("查询计划")
+        dialog.resize(700, 500)
+        layout = QVBoxLayout()
+        
+        plan_tree = QTreeWidget()
+        plan_tree.setHeaderLabels(["步骤", "说明"])
+        plan_tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(plan_tree)
+        
+        def show_plan(roots):
+            plan_tree.clear()
+            
+            def add_node(node, parent):
+                item = QTreeWidgetItem(parent, [node.detail, ""])
+                highlight = highlights.get(node.kind)
+                if highlight is not None:
+                    color, label = highlight
+                    item.setText(1, label)
+                    for column in range(2):
+                        item.setBackground(column, color)
+                for child in node.children:
+                    add_node(child, item)
+            
+            for root in roots:
+                add_node(root, plan_tree)
+            plan_tree.expandAll()
+        
+        show_plan(plan)
+        
+        layout.addWidget(QLabel("索引建议:"))
+        suggestion_list = QListWidget()
+        for suggestion in suggestions:
+            item = QListWidgetItem(f"{suggestion.create_sql}    -- {suggestion.reason}")
+            item.setData(Qt.UserRole, suggestion.create_sql)
+            suggestion_list.addItem(item)
+        if suggestions:
+            suggestion_list.setCurrentRow(0)
+        else:
+            suggestion_list.addItem("没有可提出的索引建议")
+            suggestion_list.setEnabled(False)
+        layout.addWidget(suggestion_list)
+        
+        trial_label = QLabel()
+        trial_label.setWordWrap(True)
+        layout.addWidget(trial_label)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        trial_btn = button_box.addButton("评估收益", QDialogButtonBox.ActionRole)
+        create_btn = button_box.addButton("创建索引", QDialogButtonBox.ActionRole)
+        trial_btn.setEnabled(bool(suggestions) and is_read_only_sql(query))
+        if not is_read_only_sql(query):
+            trial_btn.setToolTip("只能对只读查询评估索引收益")
+        create_btn.setEnabled(bool(suggestions))
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        
+        def selected_sql():
+            item = suggestion_list.currentItem()
+            return item.data(Qt.UserRole) if item is not None else None
+        
+        def run_trial():
+            create_sql = selected_sql()
+            if not create_sql:
+                return
+            
+            def task(report, cancel):
+                report("正在试建索引并比较查询耗时...")
+                # 试建索引需要写锁，事务最终回滚
+                with self.connections.write() as connection:
+                    return trial_index(connection, query, create_sql, cancel=cancel)
+            
+            try:
+                trial = run_task(dialog, "评估索引收益", task)
+            except OperationCancelled:
+                trial_label.setText("评估已取消")
+                return
+            except Exception as e:
+                QMessageBox.critical(dialog, "错误", f"评估索引失败: {str(e)}")
+                return
+            trial_label.setText(f"{trial.describe()}（试建的索引已回滚）")
+            show_plan(trial.plan)
+        
+        def create_index():
+            create_sql = selected_sql()
+            if not create_sql:
+                return
+            try:
+                with self.connections.write() as writer:
+                    writer.execute(create_sql)
+                    writer.commit()
+                show_plan(explain_query_plan(self.db_connection, query))
+                trial_label.setText(f"已创建索引: {create_sql}")
+                suggestion_list.takeItem(suggestion_list.currentRow())
+            except Exception as e:
+                QMessageBox.critical(dialog, "错误", f"创建索引失败: {str(e)}")
+        
+        trial_btn.clicked.connect(run_trial)
+        create_btn.clicked.connect(create_index)
+        
+        dialog.setLayout(layout)
+        dialog.exec_()
+    
+    def shutdown(self):
+        """取消正在执行的查询并等待后台线程结束"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker.wait()
+    
+    def update_progress_label(self):
+        elapsed = time.perf_counter() - self._query_start
+        if isinstance(self._worker, ScriptWorker):
+            self.status_label.setText(
+                f"正在执行脚本... {self._statements_done}/{self._statement_count} 条语句，用时 {elapsed:.1f} 秒")
+            return
+        self.status_label.setText(f"正在执行... 已获取 {self._rows_fetched} 行，用时 {elapsed:.1f} 秒")
+    
+    def on_columns_ready(self, columns):
+        self._query_columns = columns
+        self.result_table.setModel(QueryResultModel(columns))
+    
+    def on_rows_ready(self, rows):
+        model = self.result_table.model()
+        if isinstance(model, QueryResultModel):
+            model.append_rows(rows)
+    
+    def on_progress(self, rows_fetched, elapsed):
+        self._rows_fetched = rows_fetched
+    
+    def on_query_succeeded(self, row_count, elapsed, has_result):
+        self.elapsed_timer.stop()
+        if has_result:
+            model = self.result_table.model()
+            if self._query_sql is not None and isinstance(model, QueryResultModel):
+                self.result_cache.put(self._query_sql, (), self._query_columns, model._rows, self._query_version)
+                self.update_cache_stats()
+            self.status_label.setText(f"返回 {row_count} 条记录，用时 {elapsed:.2f} 秒")
+            QMessageBox.information(self, "成功", f"查询成功，返回 {row_count} 条记录")
+        else:
+            self.status_label.setText(f"影响 {row_count} 条记录，用时 {elapsed:.2f} 秒")
+            QMessageBox.information(self, "成功", f"执行成功，影响 {row_count} 条记录")
+    
+    def on_query_failed(self, message):
+        self.elapsed_timer.stop()
+        self.status_label.setText("查询失败")
+        QMessageBox.critical(self, "错误", f"查询执行失败: {message}")
+    
+    def on_query_cancelled(self):
+        self.elapsed_timer.stop()
+        self.status_label.setText(f"查询已取消，已获取 {self._rows_fetched} 行")
+    
+    def on_worker_finished(self):
+        self.elapsed_timer.stop()
+        self.execute_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self._worker.deleteLater()
+        self._worker = None
 
 class TableViewTab(QWidget):
     """表格查看标签页"""
-    def __init__(self, db_connection, table_name):
+    def __init__(self, connections, table_name, catalog, row_counts, profiler):
         super().__init__()
-        self.db_connection = db_connection
+        # 浏览使用本标签页自己的只读连接，修改通过连接管理器的写连接
+        self.connections = connections
+        self.db_connection = connections.reader()
         self.table_name = table_name
+        self.catalog = catalog
+        self.row_counts = row_counts
+        self.profiler = profiler
+        # 排序和筛选在SQLite中执行，与分页读取配合
+        self.sort_column = None
+        self.sort_descending = False
+        self.filters = {}
+        self.filter_edits = {}
         self.initUI()
+        self.row_counts.count_ready.connect(self.on_row_count)
         self.load_data()
 
     def initUI(self):
@@ -97,6 +1018,8 @@ class TableViewTab(QWidget):
         # 表格信息
         info_layout = QHBoxLayout()
         info_layout.addWidget(QLabel(f"表名: {self.table_name}"))
+        self.row_count_label = QLabel()
+        info_layout.addWidget(self.row_count_label)
         self.refresh_btn = QPushButton("刷新")
         self.refresh_btn.clicked.connect(self.load_data)
         info_layout.addWidget(self.refresh_btn)
@@ -124,28 +1047,179 @@ class TableViewTab(QWidget):
         info_layout.addStretch()
         layout.addLayout(info_layout)
         
-        # 表格视图
+        # 筛选栏，每列一个输入框，在load_data中按列生成
+        self.filter_layout = QHBoxLayout()
+        layout.addLayout(self.filter_layout)
+        
+        # 表格视图，点击列标题按该列排序
         self.table_view = QTableView()
-        self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        header = self.table_view.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Stretch)
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.sectionClicked.connect(self.sort_by_column)
         self.table_view.setContextMenuPolicy(Qt.CustomContextMenu)
         self.table_view.customContextMenuRequested.connect(self.show_context_menu)
+        self.table_view.doubleClicked.connect(self.on_cell_double_clicked)
         layout.addWidget(self.table_view)
         
         self.setLayout(layout)
     
     def load_data(self):
         try:
-            query = f"SELECT * FROM {self.table_name}"
-            df = pd.read_sql_query(query, self.db_connection)
-            model = PandasModel(df)
+            # 表结构可能已被修改，丢弃已不存在的列上的排序和筛选
+            columns = self.catalog.column_names(self.table_name)
+            if self.sort_column not in columns:
+                self.sort_column = None
+            self.filters = {col: text for col, text in self.filters.items() if col in columns}
+            self.update_filter_bar(columns)
+            
+            # 分页读取，打开表格的耗时与表的大小无关；排序和筛选由SQLite完成
+            with self.profiler.profile(self.db_connection, f"加载表 {self.table_name}") as record:
+                pager = RowPager(self.db_connection, self.table_name, catalog=self.catalog,
+                                 sort_column=self.sort_column, descending=self.sort_descending,
+                                 filters=self.filters)
+                model = PagedTableModel(pager, self.profiler)
+                record.rows = model.rowCount()
             self.table_view.setModel(model)
+            
+            # 行数先显示估计值，后台统计完成后更新为精确值
+            self.row_counts.request(self.table_name)
+            
+            header = self.table_view.horizontalHeader()
+            if self.sort_column is None:
+                header.setSortIndicator(-1, Qt.AscendingOrder)
+            else:
+                header.setSortIndicator(pager.columns.index(self.sort_column),
+                                        Qt.DescendingOrder if self.sort_descending else Qt.AscendingOrder)
         except Exception as e:
             QMessageBox.critical(self, "错误", f"加载表格数据失败: {str(e)}")
     
+    def on_row_count(self, table_name, count, exact):
+        if table_name == self.table_name:
+            self.row_count_label.setText(f"共 {count} 行" if exact else f"约 {count} 行")
+    
+    def update_filter_bar(self, columns):
+        """按表的列生成筛选输入框，列没有变化时保留现有输入"""
+        if list(self.filter_edits) == columns:
+            return
+        
+        while self.filter_layout.count():
+            item = self.filter_layout.takeAt(0)
+            if item.widget() is not None:
+                item.widget().deleteLater()
+        self.filter_edits = {}
+        
+        self.filter_layout.addWidget(QLabel("筛选:"))
+        for column in columns:
+            edit = QLineEdit(self.filters.get(column, ""))
+            edit.setPlaceholderText(column)
+            edit.setToolTip("包含匹配；也可输入 =值、!=值、>值、>=值、<值、<=值、NULL、NOT NULL 或含%的LIKE模式")
+            edit.returnPressed.connect(self.apply_filters)
+            self.filter_layout.addWidget(edit)
+            self.filter_edits[column] = edit
+        
+        apply_btn = QPushButton("筛选")
+        apply_btn.clicked.connect(self.apply_filters)
+        self.filter_layout.addWidget(apply_btn)
+        clear_btn = QPushButton("清除筛选")
+        clear_btn.clicked.connect(self.clear_filters)
+        self.filter_layout.addWidget(clear_btn)
+    
+    def apply_filters(self):
+        """按筛选栏的输入重新查询"""
+        filters = {col: edit.text().strip() for col, edit in self.filter_edits.items() if edit.text().strip()}
+        try:
+            compile_filters(list(self.filter_edits), filters)
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", f"筛选条件无效: {str(e)}")
+            return
+        self.filters = filters
+        self.load_data()
+    
+    def clear_filters(self):
+        for edit in self.filter_edits.values():
+            edit.clear()
+        self.filters = {}
+        self.load_data()
+    
+    def locate_row(self, key):
+        """定位并选中键为key的行（来自全局搜索）；该行不满足当前筛选条件时先清除筛选"""
+        model = self.table_view.model()
+        if not isinstance(model, PagedTableModel):
+            return False
+        position = model.pager.position_of(key)
+        if position is None and self.filters:
+            self.clear_filters()
+            model = self.table_view.model()
+            position = model.pager.position_of(key)
+        if position is None:
+            QMessageBox.warning(self, "警告", "记录已不存在，请更新搜索索引后重试")
+            return False
+        # 只读取目标行所在的页，不经过前面的行
+        model.load_through(position)
+        if position >= model.rowCount():
+            return False
+        self.table_view.selectRow(position)
+        self.table_view.scrollTo(model.index(position, 0), QTableView.PositionAtCenter)
+        return True
+    
+    def sort_by_column(self, section):
+        """点击列标题：升序、降序、取消排序依次切换"""
+        model = self.table_view.model()
+        if not isinstance(model, PagedTableModel):
+            return
+        column = model.pager.columns[section]
+        
+        if column != self.sort_column:
+            sort_column, descending = column, False
+        elif not self.sort_descending:
+            sort_column, descending = column, True
+        else:
+            sort_column, descending = None, False
+        
+        # 无法使用索引的排序需要先扫描并排序整个结果，执行前提示代价
+        if sort_column is not None and sort_column != self.sort_column:
+            where, params = model.pager.where_sql()
+            try:
+                needs_sort = sort_needs_temp_btree(self.db_connection, self.table_name, sort_column,
+                                                   descending, where, params)
+            except Exception:
+                needs_sort = False
+            if needs_sort:
+                latest = self.row_counts.latest(self.table_name)
+                estimate = latest[0] if latest else estimate_row_count(self.db_connection, self.table_name)
+                size_text = f"约 {estimate} 行" if estimate is not None else "全部行"
+                reply = QMessageBox.question(self, "确认排序",
+                                             f"列 {sort_column} 上没有可用的索引，排序需要扫描并排序{size_text}数据，"
+                                             f"每次翻页都要重新排序。确定继续吗？",
+                                             QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+                if reply != QMessageBox.Yes:
+                    self.load_data()
+                    return
+        
+        self.sort_column = sort_column
+        self.sort_descending = descending
+        self.load_data()
+    
+    def release_connection(self):
+        """关闭本标签页的只读连接，标签页关闭时调用"""
+        self.table_view.setModel(None)
+        self.connections.release(self.db_connection)
+    
+    def main_window(self):
+        """返回所属的主窗口，标签页尚未加入主窗口时返回None"""
+        parent = self.parent()
+        while parent and not isinstance(parent, DatabaseManager):
+            parent = parent.parent()
+        return parent
+    
     def show_table_structure(self):
         """显示表结构信息"""
         try:
             # 创建一个新的对话框显示表结构
+            import pandas as pd
             from PyQt5.QtWidgets import QDialog, QVBoxLayout, QTabWidget
             
             dialog = QDialog(self)
@@ -157,9 +1231,7 @@ class TableViewTab(QWidget):
             tab_widget = QTabWidget()
             
             # 获取表的列信息
-            cursor = self.db_connection.cursor()
-            cursor.execute(f"PRAGMA table_info({self.table_name})")
-            columns = cursor.fetchall()
+            columns = self.catalog.columns(self.table_name)
             
             # 创建列信息标签页
             columns_df = pd.DataFrame(columns, columns=['cid', 'name', 'type', 'notnull', 'dflt_value', 'pk'])
@@ -170,8 +1242,7 @@ class TableViewTab(QWidget):
             tab_widget.addTab(columns_table, "列信息")
             
             # 获取索引信息
-            cursor.execute(f"PRAGMA index_list({self.table_name})")
-            indexes = cursor.fetchall()
+            indexes = self.catalog.indexes(self.table_name)
             
             if indexes:
                 indexes_df = pd.DataFrame(indexes, columns=['seq', 'name', 'unique', 'origin', 'partial'])
@@ -184,8 +1255,7 @@ class TableViewTab(QWidget):
                 # 获取每个索引的详细信息
                 for index in indexes:
                     index_name = index[1]
-                    cursor.execute(f"PRAGMA index_info({index_name})")
-                    index_info = cursor.fetchall()
+                    index_info = self.catalog.index_columns(index_name)
                     if index_info:
                         index_info_df = pd.DataFrame(index_info, columns=['seqno', 'cid', 'name'])
                         index_info_df.columns = ['序号', '列ID', '列名']
@@ -195,8 +1265,7 @@ class TableViewTab(QWidget):
                         tab_widget.addTab(index_info_table, f"索引详情: {index_name}")
             
             # 获取外键信息
-            cursor.execute(f"PRAGMA foreign_key_list({self.table_name})")
-            foreign_keys = cursor.fetchall()
+            foreign_keys = self.catalog.foreign_keys(self.table_name)
             
             if foreign_keys:
                 fk_df = pd.DataFrame(foreign_keys, columns=['id', 'seq', 'table', 'from', 'to', 'on_update', 'on_delete', 'match'])
@@ -206,9 +1275,20 @@ class TableViewTab(QWidget):
                 fk_table.setModel(PandasModel(fk_df))
                 tab_widget.addTab(fk_table, "外键信息")
             
+            # 存储信息：表和它的索引占用的空间，按需统计（需要读取表的每一页）
+            storage_widget = QWidget()
+            storage_layout = QVBoxLayout()
+            storage_btn = QPushButton("统计空间占用")
+            storage_layout.addWidget(storage_btn)
+            storage_table = QTableView()
+            storage_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+            storage_layout.addWidget(storage_table)
+            storage_widget.setLayout(storage_layout)
+            storage_btn.clicked.connect(lambda: self.show_table_storage(dialog, storage_table, indexes))
+            tab_widget.addTab(storage_widget, "存储")
+            
             # 获取表的创建SQL
-            cursor.execute(f"SELECT sql FROM sqlite_master WHERE type='table' AND name='{self.table_name}'")
-            create_sql = cursor.fetchone()[0]
+            create_sql = self.catalog.create_sql(self.table_name)
             
             if create_sql:
                 sql_text = QTextEdit()
@@ -222,12 +1302,144 @@ class TableViewTab(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"获取表结构失败: {str(e)}")
     
+    def show_table_storage(self, parent, view, indexes):
+        """在表结构对话框中统计本表及其索引的空间占用"""
+        from db_storage import STORAGE_COLUMNS, analyze_storage, storage_rows
+        
+        names = [self.table_name] + [index[1] for index in indexes]
+        
+        def task(report, cancel):
+            connection = self.connections.reader()
+            try:
+                return analyze_storage(connection, names, progress=report, cancel=cancel)
+            finally:
+                self.connections.release(connection)
+        
+        try:
+            objects = run_task(parent, "统计空间占用", task)
+        except OperationCancelled:
+            return
+        except Exception as e:
+            QMessageBox.critical(parent, "错误", f"统计空间占用失败: {str(e)}")
+            return
+        view.setModel(QueryResultModel(STORAGE_COLUMNS, storage_rows(objects)))
+    
     def show_context_menu(self, position):
         menu = QMenu()
+        index = self.table_view.indexAt(position)
+        if self.is_blob_cell(index):
+            view_blob_action = menu.addAction("查看BLOB")
+            view_blob_action.triggered.connect(lambda: self.show_blob_viewer(index))
+            save_blob_action = menu.addAction("保存BLOB到文件")
+            save_blob_action.triggered.connect(lambda: self.save_blob(index))
+            menu.addSeparator()
         export_action = menu.addAction("导出数据")
         export_action.triggered.connect(self.export_data)
         menu.exec_(QCursor.pos())
     
+    # 查看器中最多显示的十六进制字节数，以及直接显示为图像的最大BLOB
+    BLOB_HEX_LIMIT = 64 * 1024
+    BLOB_IMAGE_LIMIT = 32 * 1024 * 1024
+    
+    def is_blob_cell(self, index):
+        model = self.table_view.model()
+        if not index.isValid() or not isinstance(model, PagedTableModel):
+            return False
+        return isinstance(model.pager.value(index.row(), index.column()), BlobValue)
+    
+    def on_cell_double_clicked(self, index):
+        if self.is_blob_cell(index):
+            self.show_blob_viewer(index)
+    
+    def show_blob_viewer(self, index):
+        """显示BLOB内容：可识别的图像直接显示，其余显示开头部分的十六进制"""
+        from PyQt5.QtWidgets import QDialog, QDialogButtonBox, QScrollArea
+        
+        pager = self.table_view.model().pager
+        value = pager.value(index.row(), index.column())
+        column = pager.columns[index.column()]
+        try:
+            head = pager.blob_head(index.row(), index.column())
+            kind = blob_kind(head)
+            is_image = kind is not None and kind.endswith("图像") and value.length <= self.BLOB_IMAGE_LIMIT
+            limit = None if is_image else self.BLOB_HEX_LIMIT
+            data = b"".join(pager.blob_chunks(index.row(), index.column(), limit=limit))
+        except (sqlite3.Error, LookupError) as e:
+            QMessageBox.critical(self, "错误", f"读取BLOB失败: {str(e)}")
+            return
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"查看BLOB - {column}")
+        dialog.resize(720, 520)
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f"{kind or 'BLOB'}，{format_size(value.length)}（{value.length} 字节）"))
+        
+        pixmap = QPixmap()
+        if is_image and pixmap.loadFromData(data):
+            image_label = QLabel()
+            image_label.setPixmap(pixmap)
+            scroll = QScrollArea()
+            scroll.setWidget(image_label)
+            layout.addWidget(scroll)
+        else:
+            hex_view = QTextEdit()
+            hex_view.setReadOnly(True)
+            hex_view.setFont(QFont("Courier New", 9))
+            lines = [f"{offset:08x}  {data[offset:offset + 16].hex(' '):<47}  "
+                     + "".join(chr(b) if 32 <= b < 127 else "." for b in data[offset:offset + 16])
+                     for offset in range(0, len(data), 16)]
+            if value.length > len(data):
+                lines.append(f"... 只显示前 {format_size(len(data))}，完整内容请保存到文件")
+            hex_view.setPlainText("\n".join(lines))
+            layout.addWidget(hex_view)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        save_btn = button_box.addButton("保存到文件...", QDialogButtonBox.ActionRole)
+        save_btn.clicked.connect(lambda: self.save_blob(index))
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        dialog.setLayout(layout)
+        dialog.exec_()
+    
+    def save_blob(self, index):
+        """用增量BLOB读取把单元格内容分块写入文件，内存占用与BLOB大小无关"""
+        pager = self.table_view.model().pager
+        key = pager.row_key(index.row())
+        value = pager.value(index.row(), index.column())
+        column = pager.columns[index.column()]
+        if key is None or not isinstance(value, BlobValue):
+            return
+        
+        file_path, _ = QFileDialog.getSaveFileName(self, "保存BLOB", f"{self.table_name}_{column}", "所有文件 (*)")
+        if not file_path:
+            return
+        
+        def task(report, cancel):
+            connection = self.connections.reader()
+            try:
+                written = 0
+                with open(file_path, "wb") as f:
+                    for chunk in read_blob_chunks(connection, self.table_name, column, pager.key_columns, key,
+                                                  pager.use_rowid):
+                        if cancel.is_set():
+                            raise OperationCancelled()
+                        f.write(chunk)
+                        written += len(chunk)
+                        report(f"已保存 {format_size(written)} / {format_size(value.length)}")
+                return written
+            finally:
+                self.connections.release(connection)
+        
+        try:
+            written = run_task(self, "保存BLOB", task)
+            QMessageBox.information(self, "成功", f"已保存到 {file_path}（{format_size(written)}）")
+        except OperationCancelled:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            QMessageBox.information(self, "提示", "保存已取消")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"保存BLOB失败: {str(e)}")
+    
     def show_db_operations_menu(self):
         """显示数据库操作菜单"""
         menu = QMenu(self)
@@ -296,18 +1508,45 @@ class TableViewTab(QWidget):
             file_path += default_suffix
         
         try:
-            query = f"SELECT * FROM {self.table_name}"
-            df = pd.read_sql_query(query, self.db_connection)
-            
             if file_path.endswith('.csv'):
-                df.to_csv(file_path, index=False)
+                # 直接从游标分批写出，内存占用与表大小无关
+                stats = run_task(self, "导出数据", lambda report, cancel: self._export_csv(file_path, report, cancel))
+                QMessageBox.information(self, "成功", f"数据已成功导出到 {file_path}\n{stats.describe()}")
             elif file_path.endswith('.xlsx'):
-                df.to_excel(file_path, index=False)
-            
-            QMessageBox.information(self, "成功", f"数据已成功导出到 {file_path}")
+                # 只写模式逐行写出，超过单表行数上限时自动分到多个工作表
+                stats = run_task(self, "导出数据", lambda report, cancel: self._export_xlsx(file_path, report, cancel))
+                QMessageBox.information(self, "成功", f"数据已成功导出到 {file_path}\n{stats.describe()}")
+        except OperationCancelled:
+            QMessageBox.information(self, "提示", "导出已取消")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"导出数据失败: {str(e)}")
     
+    def _export_csv(self, file_path, report, cancel):
+        """在后台线程中使用独立的只读连接导出CSV"""
+        start = time.perf_counter()
+        
+        def progress(rows, bytes_written):
+            elapsed = time.perf_counter() - start
+            rate = bytes_written / 1048576 / elapsed if elapsed > 0 else 0.0
+            report(f"已导出 {rows} 行，{bytes_written / 1048576:.1f} MB，{rate:.1f} MB/s")
+        
+        connection = self.connections.reader()
+        try:
+            return export_csv(connection, self.table_name, file_path, progress=progress, cancel=cancel)
+        finally:
+            self.connections.release(connection)
+    
+    def _export_xlsx(self, file_path, report, cancel):
+        """在后台线程中使用独立的只读连接导出Excel"""
+        def progress(rows, bytes_written):
+            report(f"已导出 {rows} 行")
+        
+        connection = self.connections.reader()
+        try:
+            return export_xlsx(connection, self.table_name, file_path, progress=progress, cancel=cancel)
+        finally:
+            self.connections.release(connection)
+    
     def create_table(self):
         """创建新表"""
         from PyQt5.QtWidgets import QDialog, QFormLayout, QDialogButtonBox, QVBoxLayout
@@ -349,21 +1588,14 @@ class TableViewTab(QWidget):
                 create_sql += "\n)"
                 
                 # 执行创建表操作
-                cursor = self.db_connection.cursor()
-                cursor.execute(create_sql)
-                self.db_connection.commit()
+                with self.connections.write() as writer:
+                    writer.execute(create_sql)
+                    writer.commit()
                 
                 # 更新表格下拉框
-                parent = self.parent()
-                while parent and not isinstance(parent, DatabaseManager):
-                    parent = parent.parent()
-                
-                if parent and isinstance(parent, DatabaseManager):
-                    # 更新表格下拉框
-                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                    tables = cursor.fetchall()
-                    parent.table_combo.clear()
-                    parent.table_combo.addItems([table[0] for table in tables])
+                main_window = self.main_window()
+                if main_window is not None:
+                    main_window.refresh_table_list()
                 
                 QMessageBox.information(self, "成功", f"表 {table_name} 创建成功")
             except Exception as e:
@@ -377,26 +1609,19 @@ class TableViewTab(QWidget):
         
         if reply == QMessageBox.Yes:
             try:
-                cursor = self.db_connection.cursor()
-                cursor.execute(f"DROP TABLE {self.table_name}")
-                self.db_connection.commit()
+                with self.connections.write() as writer:
+                    writer.execute(f"DROP TABLE {self.table_name}")
+                    writer.commit()
                 
                 # 更新表格下拉框并关闭当前标签页
-                parent = self.parent()
-                while parent and not isinstance(parent, DatabaseManager):
-                    parent = parent.parent()
-                
-                if parent and isinstance(parent, DatabaseManager):
-                    # 更新表格下拉框
-                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                    tables = cursor.fetchall()
-                    parent.table_combo.clear()
-                    parent.table_combo.addItems([table[0] for table in tables])
+                main_window = self.main_window()
+                if main_window is not None:
+                    main_window.refresh_table_list()
                     
                     # 关闭当前标签页
-                    index = parent.tab_widget.indexOf(self)
+                    index = main_window.tab_widget.indexOf(self)
                     if index >= 0:
-                        parent.tab_widget.removeTab(index)
+                        main_window.close_tab(index)
                 
                 QMessageBox.information(self, "成功", f"表 {self.table_name} 已删除")
             except Exception as e:
@@ -451,8 +1676,6 @@ class TableViewTab(QWidget):
         
         if dialog.exec_() == QDialog.Accepted:
             try:
-                cursor = self.db_connection.cursor()
-                
                 if add_column_radio.isChecked():
                     # 添加列
                     column_name = column_name_edit.text().strip()
@@ -463,8 +1686,9 @@ class TableViewTab(QWidget):
                         return
                     
                     alter_sql = f"ALTER TABLE {self.table_name} ADD COLUMN {column_name} {column_type}"
-                    cursor.execute(alter_sql)
-                    self.db_connection.commit()
+                    with self.connections.write() as writer:
+                        writer.execute(alter_sql)
+                        writer.commit()
                     
                     # 刷新表格数据
                     self.load_data()
@@ -478,25 +1702,20 @@ class TableViewTab(QWidget):
                         return
                     
                     alter_sql = f"ALTER TABLE {self.table_name} RENAME TO {new_table_name}"
-                    cursor.execute(alter_sql)
-                    self.db_connection.commit()
+                    with self.connections.write() as writer:
+                        writer.execute(alter_sql)
+                        writer.commit()
                     
                     # 更新标签页标题
-                    parent = self.parent()
-                    while parent and not isinstance(parent, DatabaseManager):
-                        parent = parent.parent()
-                    
-                    if parent and isinstance(parent, DatabaseManager):
+                    main_window = self.main_window()
+                    if main_window is not None:
                         # 更新表格下拉框
-                        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                        tables = cursor.fetchall()
-                        parent.table_combo.clear()
-                        parent.table_combo.addItems([table[0] for table in tables])
+                        main_window.refresh_table_list()
                         
                         # 更新标签页标题
-                        index = parent.tab_widget.indexOf(self)
+                        index = main_window.tab_widget.indexOf(self)
                         if index >= 0:
-                            parent.tab_widget.setTabText(index, new_table_name)
+                            main_window.tab_widget.setTabText(index, new_table_name)
                     
                     # 更新当前表名
                     self.table_name = new_table_name
@@ -508,9 +1727,7 @@ class TableViewTab(QWidget):
         """添加记录到表中"""
         try:
             # 获取表结构
-            cursor = self.db_connection.cursor()
-            cursor.execute(f"PRAGMA table_info({self.table_name})")
-            columns = cursor.fetchall()
+            columns = self.catalog.columns(self.table_name)
             
             # 创建添加记录对话框
             from PyQt5.QtWidgets import QDialog, QFormLayout, QDialogButtonBox, QVBoxLayout
@@ -563,8 +1780,11 @@ class TableViewTab(QWidget):
                 insert_sql = f"INSERT INTO {self.table_name} ({columns_str}) VALUES ({placeholders})"
                 
                 # 执行插入操作
-                cursor.execute(insert_sql, list(values.values()))
-                self.db_connection.commit()
+                with self.connections.write() as writer, \
+                        self.profiler.profile(writer, f"添加记录 {self.table_name}") as record:
+                    cursor = writer.execute(insert_sql, list(values.values()))
+                    writer.commit()
+                    record.rows = cursor.rowcount
                 
                 # 刷新表格数据
                 self.load_data()
@@ -575,33 +1795,33 @@ class TableViewTab(QWidget):
     def edit_record(self):
         """编辑选中的记录"""
         # 获取选中的行
-        selected_indexes = self.table_view.selectedIndexes()
-        if not selected_indexes:
+        row_ranges = self.selected_row_ranges()
+        if not row_ranges:
             QMessageBox.warning(self, "警告", "请先选择要编辑的记录")
             return
         
         # 获取选中行的第一行
-        row = selected_indexes[0].row()
+        row = row_ranges[0][0]
         
         try:
-            # 获取表结构
-            cursor = self.db_connection.cursor()
-            cursor.execute(f"PRAGMA table_info({self.table_name})")
-            columns = cursor.fetchall()
+            # 模型中保存了每行的rowid（或主键），按键读取原始值，不依赖显示文本
+            pager = self.table_view.model().pager
+            key = pager.row_key(row)
+            if key is None:
+                QMessageBox.warning(self, "警告", f"{self.table_name} 没有rowid或主键，无法定位要编辑的记录")
+                return
+            row_data = fetch_row(self.db_connection, self.table_name, pager.key_columns, key)
+            if row_data is None:
+                QMessageBox.warning(self, "警告", "记录已不存在，请刷新后重试")
+                self.load_data()
+                return
             
-            # 获取主键列（如果有）
-            primary_key_col = None
-            for col in columns:
-                if col[5] > 0:  # 第6列表示是否为主键
-                    primary_key_col = col[1]
-                    break
+            # 获取表结构
+            columns = self.catalog.columns(self.table_name)
             
-            # 获取当前行的数据
-            model = self.table_view.model()
-            row_data = {}
-            for col_idx, col in enumerate([col[1] for col in columns]):
-                value = model.data(model.index(row, col_idx), Qt.DisplayRole)
-                row_data[col] = value
+            # 编辑框中显示的原始文本，未修改的列不写回，保留原来的类型（浮点数、NULL、BLOB等）
+            original_texts = {col_name: "" if value is None else cell_text(value) for col_name, value in row_data.items()}
+            blob_columns = {col_name for col_name, value in row_data.items() if isinstance(value, bytes)}
             
             # 创建编辑记录对话框
             from PyQt5.QtWidgets import QDialog, QFormLayout, QDialogButtonBox, QVBoxLayout
@@ -616,23 +1836,27 @@ class TableViewTab(QWidget):
             for col in columns:
                 col_name = col[1]
                 col_type = col[2]
+                original_text = original_texts.get(col_name, "")
                 
                 # 根据列类型创建适当的输入控件
                 if col_type.upper() in ('INTEGER', 'REAL', 'NUMERIC'):
-                    input_widget = QLineEdit(row_data.get(col_name, ""))
+                    input_widget = QLineEdit(original_text)
                 elif col_type.upper() == 'BOOLEAN':
                     input_widget = QComboBox()
                     input_widget.addItems(['True', 'False'])
-                    input_widget.setCurrentText(row_data.get(col_name, "False"))
+                    input_widget.setCurrentText(original_text or "False")
                 else:  # TEXT, BLOB, etc.
-                    input_widget = QLineEdit(row_data.get(col_name, ""))
+                    input_widget = QLineEdit(original_text)
                 
                 form_layout.addRow(f"{col_name}:", input_widget)
                 field_inputs[col_name] = input_widget
                 
-                # 如果是主键，禁止编辑
-                if col_name == primary_key_col:
-                    input_widget.setReadOnly(True)
+                # 如果是主键或BLOB，禁止编辑（BLOB只显示预览，可在表格中查看或保存）
+                if col[5] > 0 or col_name in blob_columns:
+                    if isinstance(input_widget, QComboBox):
+                        input_widget.setEnabled(False)
+                    else:
+                        input_widget.setReadOnly(True)
             
             layout.addLayout(form_layout)
             
@@ -644,37 +1868,21 @@ class TableViewTab(QWidget):
             dialog.setLayout(layout)
             
             if dialog.exec_() == QDialog.Accepted:
-                # 收集输入的值
+                # 收集修改过的值
                 new_values = {}
                 for col_name, input_widget in field_inputs.items():
                     if isinstance(input_widget, QComboBox):
-                        new_values[col_name] = input_widget.currentText()
+                        text = input_widget.currentText()
                     else:
-                        new_values[col_name] = input_widget.text()
-                
-                # 构建UPDATE语句
-                set_clause = ", ".join([f"{col} = ?" for col in new_values.keys()])
-                
-                # 构建WHERE子句
-                if primary_key_col:
-                    where_clause = f"{primary_key_col} = ?"
-                    params = list(new_values.values()) + [row_data[primary_key_col]]
-                else:
-                    # 如果没有主键，使用所有列作为条件
-                    where_conditions = []
-                    params = []
-                    for col in columns:
-                        col_name = col[1]
-                        where_conditions.append(f"{col_name} = ?")
-                        params.append(row_data[col_name])
-                    where_clause = " AND ".join(where_conditions)
-                    params = list(new_values.values()) + params
-                
-                update_sql = f"UPDATE {self.table_name} SET {set_clause} WHERE {where_clause}"
+                        text = input_widget.text()
+                    if text != original_texts.get(col_name, ""):
+                        new_values[col_name] = text
                 
-                # 执行更新操作
-                cursor.execute(update_sql, params)
-                self.db_connection.commit()
+                # 按键执行更新，走rowid或主键索引
+                with self.connections.write() as writer, \
+                        self.profiler.profile(writer, f"编辑记录 {self.table_name}") as record:
+                    update_row(writer, self.table_name, pager.key_columns, key, new_values)
+                    record.rows = 1 if new_values else 0
                 
                 # 刷新表格数据
                 self.load_data()
@@ -682,62 +1890,46 @@ class TableViewTab(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"更新记录失败: {str(e)}")
     
+    def selected_row_ranges(self):
+        """把当前选择转换为按顺序排列、互不重叠的行区间列表[(first, last), ...]"""
+        ranges = sorted((selection_range.top(), selection_range.bottom())
+                        for selection_range in self.table_view.selectionModel().selection())
+        merged = []
+        for first, last in ranges:
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+            else:
+                merged.append((first, last))
+        return merged
+    
     def delete_record(self):
         """删除选中的记录"""
-        # 获取选中的行
-        selected_indexes = self.table_view.selectedIndexes()
-        if not selected_indexes:
+        # 获取选中的行区间
+        row_ranges = self.selected_row_ranges()
+        if not row_ranges:
             QMessageBox.warning(self, "警告", "请先选择要删除的记录")
             return
         
-        # 获取选中的所有不同行
-        rows = set(index.row() for index in selected_indexes)
-        
+        row_count = sum(last - first + 1 for first, last in row_ranges)
         reply = QMessageBox.question(self, "确认删除", 
-                                    f"确定要删除选中的 {len(rows)} 条记录吗？此操作不可撤销！",
+                                    f"确定要删除选中的 {row_count} 条记录吗？此操作不可撤销！",
                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         
         if reply == QMessageBox.Yes:
             try:
-                # 获取表结构
-                cursor = self.db_connection.cursor()
-                cursor.execute(f"PRAGMA table_info({self.table_name})")
-                columns = cursor.fetchall()
-                
-                # 获取主键列（如果有）
-                primary_key_col = None
-                for col in columns:
-                    if col[5] > 0:  # 第6列表示是否为主键
-                        primary_key_col = col[1]
-                        break
+                pager = self.table_view.model().pager
+                if not pager.has_keys:
+                    QMessageBox.warning(self, "警告", f"{self.table_name} 没有rowid或主键，无法定位要删除的记录")
+                    return
                 
-                # 获取当前选中行的数据
-                model = self.table_view.model()
-                deleted_count = 0
-                
-                for row in sorted(rows, reverse=True):  # 从后向前删除，避免索引变化
-                    if primary_key_col:
-                        # 如果有主键，使用主键作为条件
-                        pk_col_idx = [col[1] for col in columns].index(primary_key_col)
-                        pk_value = model.data(model.index(row, pk_col_idx), Qt.DisplayRole)
-                        delete_sql = f"DELETE FROM {self.table_name} WHERE {primary_key_col} = ?"
-                        cursor.execute(delete_sql, (pk_value,))
-                    else:
-                        # 如果没有主键，使用所有列作为条件
-                        where_conditions = []
-                        params = []
-                        for col_idx, col in enumerate([col[1] for col in columns]):
-                            value = model.data(model.index(row, col_idx), Qt.DisplayRole)
-                            where_conditions.append(f"{col} = ?")
-                            params.append(value)
-                        
-                        where_clause = " AND ".join(where_conditions)
-                        delete_sql = f"DELETE FROM {self.table_name} WHERE {where_clause}"
-                        cursor.execute(delete_sql, params)
-                    
-                    deleted_count += 1
-                
-                self.db_connection.commit()
+                # 按rowid（或主键）分批删除，每条语句删除一批行，全部在一个事务中完成
+                keys = []
+                for first, last in row_ranges:
+                    keys.extend(pager.keys_for_range(first, last))
+                with self.connections.write() as writer, \
+                        self.profiler.profile(writer, f"删除记录 {self.table_name}") as record:
+                    deleted_count = delete_by_keys(writer, self.table_name, pager.key_columns, keys)
+                    record.rows = deleted_count
                 
                 # 刷新表格数据
                 self.load_data()
@@ -752,44 +1944,68 @@ class TableViewTab(QWidget):
             return
         
         try:
-            # 读取CSV文件
-            df = pd.read_csv(file_path)
+            # 只读取表头，数据在导入时分块读取
+            csv_columns = read_csv_header(file_path)
             
             # 获取表结构
-            cursor = self.db_connection.cursor()
-            cursor.execute(f"PRAGMA table_info({self.table_name})")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = self.catalog.column_names(self.table_name)
             
             # 检查CSV文件的列是否与表结构匹配
-            csv_columns = df.columns.tolist()
-            if not all(col in columns for col in csv_columns):
+            if not csv_columns or not all(col in columns for col in csv_columns):
                 QMessageBox.warning(self, "警告", "CSV文件的列与表结构不匹配")
                 return
             
-            # 确认导入
-            reply = QMessageBox.question(self, "确认导入", 
-                                        f"确定要导入 {len(df)} 条记录吗？",
-                                        QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            # 确认导入并选择导入选项
+            size_mb = os.path.getsize(file_path) / 1048576
+            options = self.ask_import_options(f"确定要从 {os.path.basename(file_path)} ({size_mb:.1f} MB) 导入数据吗？")
+            if options is None:
+                return
+            fast, defer_indexes = options
             
-            if reply == QMessageBox.Yes:
-                # 构建INSERT语句
-                columns_str = ", ".join(csv_columns)
-                placeholders = ", ".join(["?" for _ in csv_columns])
-                insert_sql = f"INSERT INTO {self.table_name} ({columns_str}) VALUES ({placeholders})"
-                
-                # 执行批量插入
-                for _, row in df.iterrows():
-                    values = [row[col] for col in csv_columns]
-                    cursor.execute(insert_sql, values)
-                
-                self.db_connection.commit()
-                
-                # 刷新表格数据
-                self.load_data()
-                QMessageBox.information(self, "成功", f"成功导入 {len(df)} 条记录")
+            def task(report, cancel):
+                with self.connections.write() as connection, \
+                        self.profiler.profile(connection, f"导入数据 {self.table_name}", trace=False) as record:
+                    stats = import_csv(connection, self.table_name, file_path, fast=fast,
+                                       defer_indexes=defer_indexes,
+                                       progress=lambda rows: report(f"已导入 {rows} 行"), cancel=cancel)
+                    # 批量插入不逐条跟踪，每行计为一条语句
+                    record.rows = record.statement_count = stats.rows
+                return stats
+            
+            stats = run_task(self, "导入数据", task)
+            
+            # 刷新表格数据
+            self.load_data()
+            QMessageBox.information(self, "成功", f"成功导入 {stats.rows} 条记录\n{stats.describe()}")
+        except OperationCancelled:
+            QMessageBox.information(self, "提示", "导入已取消，未写入任何数据")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"导入数据失败: {str(e)}")
     
+    def ask_import_options(self, message):
+        """确认导入并选择加速选项，取消时返回None，否则返回(fast, defer_indexes)"""
+        from PyQt5.QtWidgets import QDialog, QDialogButtonBox, QVBoxLayout, QCheckBox
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("确认导入")
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(message))
+        
+        fast_check = QCheckBox("快速模式（导入期间关闭同步写入，断电可能导致数据库损坏）")
+        layout.addWidget(fast_check)
+        defer_indexes_check = QCheckBox("导入完成后再重建索引")
+        layout.addWidget(defer_indexes_check)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Yes | QDialogButtonBox.No)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        dialog.setLayout(layout)
+        
+        if dialog.exec_() != QDialog.Accepted:
+            return None
+        return fast_check.isChecked(), defer_indexes_check.isChecked()
+    
     def import_from_excel(self):
         """从Excel文件导入数据"""
         file_path, _ = QFileDialog.getOpenFileName(self, "选择Excel文件", "", "Excel文件 (*.xlsx *.xls)")
@@ -797,50 +2013,246 @@ class TableViewTab(QWidget):
             return
         
         try:
-            # 读取Excel文件
-            df = pd.read_excel(file_path)
+            # 选择工作表和表头所在行
+            sheet_choice = self.ask_excel_sheet(list_excel_sheets(file_path))
+            if sheet_choice is None:
+                return
+            sheet_name, start_row = sheet_choice
+            
+            # 只读取表头，数据在导入时逐行读取
+            excel_columns = read_excel_header(file_path, sheet_name, start_row)
             
             # 获取表结构
-            cursor = self.db_connection.cursor()
-            cursor.execute(f"PRAGMA table_info({self.table_name})")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = self.catalog.column_names(self.table_name)
             
             # 检查Excel文件的列是否与表结构匹配
-            excel_columns = df.columns.tolist()
-            if not all(col in columns for col in excel_columns):
+            if not excel_columns or not all(col in columns for col in excel_columns):
                 QMessageBox.warning(self, "警告", "Excel文件的列与表结构不匹配")
                 return
             
-            # 确认导入
-            reply = QMessageBox.question(self, "确认导入", 
-                                        f"确定要导入 {len(df)} 条记录吗？",
-                                        QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            # 确认导入并选择导入选项
+            options = self.ask_import_options(f"确定要从工作表 {sheet_name} 的第 {start_row} 行开始导入数据吗？")
+            if options is None:
+                return
+            fast, defer_indexes = options
             
-            if reply == QMessageBox.Yes:
-                # 构建INSERT语句
-                columns_str = ", ".join(excel_columns)
-                placeholders = ", ".join(["?" for _ in excel_columns])
-                insert_sql = f"INSERT INTO {self.table_name} ({columns_str}) VALUES ({placeholders})"
-                
-                # 执行批量插入
-                for _, row in df.iterrows():
-                    values = [row[col] for col in excel_columns]
-                    cursor.execute(insert_sql, values)
-                
-                self.db_connection.commit()
-                
-                # 刷新表格数据
-                self.load_data()
-                QMessageBox.information(self, "成功", f"成功导入 {len(df)} 条记录")
+            def task(report, cancel):
+                with self.connections.write() as connection, \
+                        self.profiler.profile(connection, f"导入数据 {self.table_name}", trace=False) as record:
+                    stats = import_excel(connection, self.table_name, file_path, sheet_name, start_row,
+                                         fast=fast, defer_indexes=defer_indexes,
+                                         progress=lambda rows: report(f"已导入 {rows} 行"), cancel=cancel)
+                    # 批量插入不逐条跟踪，每行计为一条语句
+                    record.rows = record.statement_count = stats.rows
+                return stats
+            
+            stats = run_task(self, "导入数据", task)
+            
+            # 刷新表格数据
+            self.load_data()
+            QMessageBox.information(self, "成功", f"成功导入 {stats.rows} 条记录\n{stats.describe()}")
+        except OperationCancelled:
+            QMessageBox.information(self, "提示", "导入已取消，未写入任何数据")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"导入数据失败: {str(e)}")
+    
+    def ask_excel_sheet(self, sheet_names):
+        """选择要导入的工作表和表头所在行，取消时返回None，否则返回(sheet_name, start_row)"""
+        from PyQt5.QtWidgets import QDialog, QFormLayout, QDialogButtonBox, QVBoxLayout, QSpinBox
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("选择工作表")
+        layout = QVBoxLayout()
+        
+        form_layout = QFormLayout()
+        sheet_combo = QComboBox()
+        sheet_combo.addItems(sheet_names)
+        form_layout.addRow("工作表:", sheet_combo)
+        
+        start_row_spin = QSpinBox()
+        start_row_spin.setRange(1, 1048576)
+        form_layout.addRow("表头所在行:", start_row_spin)
+        layout.addLayout(form_layout)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        dialog.setLayout(layout)
+        
+        if dialog.exec_() != QDialog.Accepted:
+            return None
+        return sheet_combo.currentText(), start_row_spin.value()
+
+class ProfileModel(QAbstractTableModel):
+    """性能记录列表的模型，最新的记录在最前面"""
+    HEADERS = ["时间", "操作", "耗时(ms)", "行数", "VM步数", "语句数", "SQL"]
+
+    def __init__(self):
+        super().__init__()
+        self._records = []
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._records)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def record(self, row):
+        return self._records[row]
+
+    def add_record(self, record):
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._records.insert(0, record)
+        self.endInsertRows()
+
+    def set_records(self, records):
+        self.beginResetModel()
+        self._records = list(reversed(records))
+        self.endResetModel()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._records[index.row()]
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return time.strftime("%H:%M:%S", time.localtime(record.started))
+            if column == 1:
+                return record.source
+            if column == 2:
+                return f"{record.seconds * 1000:.1f}"
+            if column == 3:
+                return str(record.rows)
+            if column == 4:
+                return f"{record.vm_steps:,}"
+            if column == 5:
+                return str(record.statement_count)
+            return " ".join(record.sql.split())
+        if role == Qt.ForegroundRole and record.error is not None:
+            return QColor("#c62828")
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+class ProfilerPanel(QWidget):
+    """性能分析面板：列出每次界面操作的耗时、行数、VM步数和执行的SQL"""
+    record_added = pyqtSignal(object)
+
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+        self.initUI()
+        # 记录可能在后台线程中产生，通过信号转到界面线程
+        self.record_added.connect(self.on_record_added)
+        self.profiler.listeners.append(self.record_added.emit)
+
+    def initUI(self):
+        layout = QVBoxLayout()
+        
+        btn_layout = QHBoxLayout()
+        self.enabled_check = QCheckBox("记录")
+        self.enabled_check.setChecked(self.profiler.enabled)
+        self.enabled_check.toggled.connect(self.on_enabled_toggled)
+        btn_layout.addWidget(self.enabled_check)
+        
+        clear_btn = QPushButton("清空")
+        clear_btn.clicked.connect(self.clear_records)
+        btn_layout.addWidget(clear_btn)
+        
+        export_btn = QPushButton("导出JSON")
+        export_btn.clicked.connect(self.export_json)
+        btn_layout.addWidget(export_btn)
+        
+        self.summary_label = QLabel()
+        btn_layout.addWidget(self.summary_label)
+        btn_layout.addStretch()
+        layout.addLayout(btn_layout)
+        
+        splitter = QSplitter(Qt.Horizontal)
+        self.model = ProfileModel()
+        self.model.set_records(self.profiler.records())
+        self.records_view = QTableView()
+        self.records_view.setModel(self.model)
+        self.records_view.setSelectionBehavior(QTableView.SelectRows)
+        self.records_view.setSelectionMode(QTableView.SingleSelection)
+        self.records_view.horizontalHeader().setStretchLastSection(True)
+        self.records_view.selectionModel().currentRowChanged.connect(self.show_trace)
+        splitter.addWidget(self.records_view)
+        
+        # 选中记录的SQL跟踪日志
+        self.trace_edit = QTextEdit()
+        self.trace_edit.setReadOnly(True)
+        splitter.addWidget(self.trace_edit)
+        splitter.setSizes([600, 300])
+        layout.addWidget(splitter)
+        
+        self.setLayout(layout)
+        self.update_summary()
+
+    def on_enabled_toggled(self, checked):
+        self.profiler.enabled = checked
+
+    def on_record_added(self, record):
+        self.model.add_record(record)
+        self.update_summary()
+
+    def update_summary(self):
+        records = self.profiler.records()
+        total = sum(record.seconds for record in records)
+        self.summary_label.setText(f"共 {len(records)} 次操作，合计 {total * 1000:.1f} ms")
+
+    def show_trace(self, current, previous=None):
+        if not current.isValid():
+            self.trace_edit.clear()
+            return
+        record = self.model.record(current.row())
+        lines = [f"{record.source}  {record.seconds * 1000:.1f} ms，{record.rows} 行，"
+                 f"约 {record.vm_steps:,} VM步"]
+        if record.error is not None:
+            lines.append(f"错误: {record.error}")
+        lines.extend(f"+{offset * 1000:.1f} ms  {sql}" for offset, sql in record.statements)
+        if record.statement_count > len(record.statements):
+            lines.append(f"……另有 {record.statement_count - len(record.statements)} 条语句未列出")
+        self.trace_edit.setPlainText("\n".join(lines))
+
+    def clear_records(self):
+        self.profiler.clear()
+        self.model.set_records([])
+        self.trace_edit.clear()
+        self.update_summary()
+
+    def export_json(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出性能记录", "profile.json", "JSON文件 (*.json)")
+        if not file_path:
+            return
+        try:
+            self.profiler.export_json(file_path)
+            QMessageBox.information(self, "成功", f"性能记录已导出到 {file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"导出性能记录失败: {str(e)}")
 
 class DatabaseManager(QMainWindow):
     """数据库管理器主窗口"""
     def __init__(self):
         super().__init__()
+        self.connections = None
         self.db_connection = None
         self.db_path = None
+        self.catalog = None
+        self.row_counts = None
+        self.connection_status = ""
+        self.profiler = Profiler()
+        self.search_index = None
+        self.search_dialog = None
         self.setStyleSheet(self.get_style_sheet())
         self.initUI()
     
@@ -978,22 +2390,57 @@ class DatabaseManager(QMainWindow):
         self.table_combo.currentIndexChanged.connect(self.open_table)
         table_layout.addWidget(self.table_combo)
         
+        self.profiler_btn = QPushButton("性能分析")
+        self.profiler_btn.setCheckable(True)
+        table_layout.addWidget(self.profiler_btn)
+        
+        self.search_btn = QPushButton("全局搜索")
+        self.search_btn.clicked.connect(self.show_global_search)
+        table_layout.addWidget(self.search_btn)
+        
+        self.storage_btn = QPushButton("存储分析")
+        self.storage_btn.clicked.connect(self.show_storage_panel)
+        table_layout.addWidget(self.storage_btn)
+        
+        self.diff_btn = QPushButton("比较数据库")
+        self.diff_btn.setToolTip("与另一个数据库文件（例如旧的备份）逐表比较，列出新增、修改和删除的行")
+        self.diff_btn.clicked.connect(self.show_database_diff)
+        table_layout.addWidget(self.diff_btn)
+        
+        self.dump_btn = QPushButton("导出数据库")
+        self.dump_btn.setToolTip("把全部或选中的表并行导出到一个目录，每张表一个文件")
+        self.dump_btn.clicked.connect(self.show_export_database)
+        table_layout.addWidget(self.dump_btn)
+        
         main_layout.addLayout(table_layout)
         
         # 标签页区域
         self.tab_widget = QTabWidget()
         self.tab_widget.setTabsClosable(True)
         self.tab_widget.tabCloseRequested.connect(self.close_tab)
+        self.tab_widget.currentChanged.connect(self.update_status_bar)
         main_layout.addWidget(self.tab_widget)
         
         self.setCentralWidget(central_widget)
         
+        # 性能分析面板，默认隐藏，第一次显示时才创建
+        self.profiler_dock = QDockWidget("性能分析", self)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.profiler_dock)
+        self.profiler_dock.hide()
+        self.profiler_btn.toggled.connect(self.toggle_profiler)
+        self.profiler_dock.visibilityChanged.connect(self.profiler_btn.setChecked)
+        
         # 添加状态栏
         self.statusBar().showMessage("就绪")
         
         # 添加SQL查询标签页
         self.sql_tab = None
     
+    def toggle_profiler(self, checked):
+        if checked and self.profiler_dock.widget() is None:
+            self.profiler_dock.setWidget(ProfilerPanel(self.profiler))
+        self.profiler_dock.setVisible(checked)
+    
     def browse_database(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "选择SQLite数据库文件", "", "SQLite数据库文件 (*.db *.sqlite *.db3);;所有文件 (*)")
         if file_path:
@@ -1008,29 +2455,33 @@ class DatabaseManager(QMainWindow):
         try:
             self.statusBar().showMessage("正在连接数据库...")
             
-            # 关闭现有连接
-            if self.db_connection is not None:
-                self.db_connection.close()
+            # 停止正在执行的查询并关闭现有连接
+            if self.sql_tab is not None:
+                self.sql_tab.shutdown()
+            if self.row_counts is not None:
+                self.row_counts.shutdown()
+            if self.connections is not None:
+                self.connections.close()
+            self.close_search()
             
-            # 建立新连接
-            self.db_connection = sqlite3.connect(db_path)
+            # 每个标签页和后台线程使用自己的只读连接，写操作经由唯一的写连接；
+            # 结构信息缓存由所有标签页共用
+            self.connections = ConnectionManager(db_path)
+            self.db_connection = self.connections.reader()
             self.db_path = db_path
+            self.catalog = SchemaCatalog(self.db_connection)
+            self.row_counts = RowCountService(self.connections)
+            self.row_counts.count_ready.connect(self.update_status_bar)
             
-            # 获取表格列表
-            cursor = self.db_connection.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            
-            # 更新表格下拉框
-            self.table_combo.clear()
-            self.table_combo.addItems([table[0] for table in tables])
+            # 获取表格列表并更新表格下拉框
+            tables = self.refresh_table_list()
             self.table_combo.setEnabled(True)
             
             # 关闭所有标签页
             self.tab_widget.clear()
             
             # 添加SQL查询标签页
-            self.sql_tab = SQLQueryTab(self.db_connection)
+            self.sql_tab = SQLQueryTab(self.connections, self.profiler)
             self.tab_widget.addTab(self.sql_tab, "SQL查询")
             
             # 更新窗口标题
@@ -1038,13 +2489,25 @@ class DatabaseManager(QMainWindow):
             self.setWindowTitle(f"SQLite数据库管理器 - {file_name}")
             
             # 更新状态栏
-            self.statusBar().showMessage(f"已连接到数据库: {file_name} | 共 {len(tables)} 个表格")
+            self.connection_status = f"已连接到数据库: {file_name} | 共 {len(tables)} 个表格"
+            self.update_status_bar()
             
             QMessageBox.information(self, "成功", f"成功连接到数据库: {db_path}\n发现 {len(tables)} 个表格")
         except Exception as e:
             self.statusBar().showMessage("连接失败")
             QMessageBox.critical(self, "错误", f"连接数据库失败: {str(e)}")
     
+    def refresh_table_list(self):
+        """重新填充表格下拉框，返回表名列表"""
+        tables = self.catalog.tables()
+        # 填充期间不触发open_table，避免打开一个随即被关闭的表格标签页
+        self.table_combo.blockSignals(True)
+        self.table_combo.clear()
+        self.table_combo.addItems(tables)
+        self.table_combo.setCurrentIndex(-1)
+        self.table_combo.blockSignals(False)
+        return tables
+    
     def open_table(self, index):
         if index < 0 or self.db_connection is None:
             return
@@ -1058,16 +2521,469 @@ class DatabaseManager(QMainWindow):
                 return
         
         # 创建新的表格标签页
-        table_tab = TableViewTab(self.db_connection, table_name)
+        table_tab = TableViewTab(self.connections, table_name, self.catalog, self.row_counts, self.profiler)
         self.tab_widget.addTab(table_tab, table_name)
         self.tab_widget.setCurrentWidget(table_tab)
     
+    def update_status_bar(self, *args):
+        """状态栏显示连接信息以及当前表格的行数"""
+        message = self.connection_status
+        tab = self.tab_widget.currentWidget()
+        if isinstance(tab, TableViewTab) and self.row_counts is not None:
+            latest = self.row_counts.latest(tab.table_name)
+            if latest is not None:
+                count, exact = latest
+                message += f" | 表 {tab.table_name}: {'共' if exact else '约'} {count} 行"
+        self.statusBar().showMessage(message)
+    
+    def show_global_search(self):
+        """在所有表的文本列中搜索，双击结果跳转到对应的表和行"""
+        if self.connections is None:
+            QMessageBox.warning(self, "警告", "请先连接数据库")
+            return
+        if self.search_dialog is not None:
+            self.search_dialog.show()
+            self.search_dialog.raise_()
+            self.search_dialog.activateWindow()
+            return
+        
+        from PyQt5.QtWidgets import QDialog
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("全局搜索")
+        dialog.resize(800, 500)
+        layout = QVBoxLayout()
+        
+        search_layout = QHBoxLayout()
+        search_edit = QLineEdit()
+        search_edit.setPlaceholderText("输入要查找的文本（三个字符以上可使用索引）")
+        search_layout.addWidget(search_edit)
+        search_btn = QPushButton("搜索")
+        search_layout.addWidget(search_btn)
+        rebuild_btn = QPushButton("重建索引")
+        rebuild_btn.setToolTip("索引只追加新行和清除删除的行，修改过已有的行后需要重建")
+        search_layout.addWidget(rebuild_btn)
+        layout.addLayout(search_layout)
+        
+        results_view = QTableView()
+        results_view.setSelectionBehavior(QTableView.SelectRows)
+        results_view.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(results_view)
+        status_label = QLabel("索引保存在数据库旁边的独立文件中，第一次搜索时建立")
+        layout.addWidget(status_label)
+        dialog.setLayout(layout)
+        
+        hits = []
+        limit = 500
+        
+        def update_index(rebuild=False):
+            """索引不存在或数据库已被修改时增量更新，返回索引是否可用"""
+            from db_search import SearchIndex
+            try:
+                if self.search_index is None:
+                    self.search_index = SearchIndex(self.db_path)
+                index = self.search_index
+                if rebuild or index.needs_refresh():
+                    task = index.rebuild if rebuild else index.refresh
+                    stats = run_task(dialog, "建立搜索索引", lambda report, cancel: task(report, cancel))
+                    status_label.setText(f"索引已更新：{stats.describe()}")
+                return True
+            except OperationCancelled:
+                status_label.setText("索引更新已取消，已完成的部分会保留，搜索结果可能不完整")
+                return True
+            except Exception as e:
+                QMessageBox.critical(dialog, "错误", f"建立搜索索引失败: {str(e)}")
+                return False
+        
+        def search():
+            text = search_edit.text().strip()
+            if not text or not update_index():
+                return
+            start = time.perf_counter()
+            hits[:] = self.search_index.search(text, limit)
+            elapsed = time.perf_counter() - start
+            rows = [(hit.table, ", ".join(map(str, hit.key)), hit.column, hit.text) for hit in hits]
+            results_view.setModel(QueryResultModel(["表", "行", "列", "内容"], rows))
+            more = f"（只显示前 {limit} 条）" if len(hits) >= limit else ""
+            status_label.setText(f"在 {len(self.search_index.tables)} 个表中找到 {len(hits)} 条结果{more}，"
+                                 f"用时 {elapsed * 1000:.1f} 毫秒，双击结果跳转到对应的行")
+        
+        def rebuild():
+            if update_index(rebuild=True) and search_edit.text().strip():
+                search()
+        
+        def open_hit(index):
+            hit = hits[index.row()]
+            self.jump_to_row(hit.table, hit.key)
+        
+        search_edit.returnPressed.connect(search)
+        search_btn.clicked.connect(search)
+        rebuild_btn.clicked.connect(rebuild)
+        results_view.doubleClicked.connect(open_hit)
+        
+        self.search_dialog = dialog
+        dialog.show()
+    
+    def show_storage_panel(self):
+        """显示每个表和索引的空间占用，并在后台执行ANALYZE、PRAGMA optimize和VACUUM"""
+        if self.connections is None:
+            QMessageBox.warning(self, "警告", "请先连接数据库")
+            return
+        
+        from PyQt5.QtWidgets import QDialog
+        from db_storage import (STORAGE_COLUMNS, analyze_storage, compare_summaries, incremental_vacuum,
+                                recommendations, run_analyze, run_optimize, storage_rows, storage_summary, vacuum)
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("存储分析")
+        dialog.resize(900, 600)
+        layout = QVBoxLayout()
+        
+        summary_label = QLabel()
+        summary_label.setWordWrap(True)
+        layout.addWidget(summary_label)
+        advice_label = QLabel()
+        advice_label.setWordWrap(True)
+        advice_label.setStyleSheet("color: #c0392b;")
+        layout.addWidget(advice_label)
+        
+        btn_layout = QHBoxLayout()
+        analyze_space_btn = QPushButton("分析空间")
+        analyze_space_btn.setToolTip("用dbstat逐页统计每个表和索引，需要读取整个数据库")
+        btn_layout.addWidget(analyze_space_btn)
+        analyze_btn = QPushButton("ANALYZE")
+        analyze_btn.setToolTip("收集全部表和索引的统计信息，帮助查询规划器选择索引")
+        btn_layout.addWidget(analyze_btn)
+        optimize_btn = QPushButton("PRAGMA optimize")
+        optimize_btn.setToolTip("只为统计信息可能已过时的表重新收集，通常很快，适合定期执行")
+        btn_layout.addWidget(optimize_btn)
+        incremental_btn = QPushButton("增量VACUUM")
+        incremental_btn.setToolTip("分批释放空闲页（需要auto_vacuum=INCREMENTAL）")
+        btn_layout.addWidget(incremental_btn)
+        vacuum_btn = QPushButton("完整VACUUM")
+        vacuum_btn.setToolTip("重写整个数据库，回收空闲页并消除碎片")
+        btn_layout.addWidget(vacuum_btn)
+        layout.addLayout(btn_layout)
+        
+        objects_view = QTableView()
+        objects_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(objects_view)
+        
+        comparison_label = QLabel()
+        layout.addWidget(comparison_label)
+        comparison_view = QTableView()
+        comparison_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        comparison_view.setMaximumHeight(220)
+        comparison_view.hide()
+        layout.addWidget(comparison_view)
+        dialog.setLayout(layout)
+        
+        state = {"objects": None}
+        
+        def show_summary(summary):
+            summary_label.setText(summary.describe())
+            advice = recommendations(summary, state["objects"] or ())
+            advice_label.setText("\n".join(f"建议：{text}" for text in advice))
+        
+        def analyze_space():
+            def task(report, cancel):
+                connection = self.connections.reader()
+                try:
+                    return (storage_summary(connection, self.db_path),
+                            analyze_storage(connection, progress=report, cancel=cancel))
+                finally:
+                    self.connections.release(connection)
+            try:
+                summary, state["objects"] = run_task(dialog, "分析空间", task)
+            except OperationCancelled:
+                return
+            except Exception as e:
+                QMessageBox.critical(dialog, "错误", f"分析空间失败: {str(e)}")
+                return
+            objects_view.setModel(QueryResultModel(STORAGE_COLUMNS, storage_rows(state["objects"])))
+            show_summary(summary)
+        
+        def maintain(title, action, rewrites=False):
+            """在写连接上执行维护操作，完成后显示前后对比"""
+            def task(report, cancel):
+                with self.connections.write() as writer:
+                    before = storage_summary(writer, self.db_path)
+                    start = time.perf_counter()
+                    result = action(writer, report, cancel)
+                    elapsed = time.perf_counter() - start
+                    return before, storage_summary(writer, self.db_path), elapsed, result
+            try:
+                before, after, elapsed, result = run_task(dialog, title, task)
+            except OperationCancelled:
+                comparison_label.setText(f"{title}已取消，数据库未被修改")
+                return
+            except Exception as e:
+                QMessageBox.critical(dialog, "错误", f"{title}失败: {str(e)}")
+                return
+            finally:
+                if rewrites:
+                    # VACUUM可能重新编号没有INTEGER PRIMARY KEY的表的rowid，已打开的表格按键重新读取
+                    self.reload_table_tabs()
+            
+            comparison_label.setText(f"{title}完成，用时 {elapsed:.2f} 秒" + (f"，{result}" if result else ""))
+            comparison_view.setModel(QueryResultModel(["指标", "之前", "之后", "变化"], compare_summaries(before, after)))
+            comparison_view.show()
+            show_summary(after)
+            if state["objects"] is not None and rewrites:
+                analyze_space()
+        
+        def full_vacuum(auto_vacuum=None):
+            reply = QMessageBox.question(dialog, "确认", "VACUUM会重写整个数据库，需要与数据库大小相当的临时空间，"
+                                         "期间其他写操作需要等待，已打开的表格会重新加载。是否继续?",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+            def action(writer, report, cancel):
+                vacuum(writer, auto_vacuum, report, cancel)
+                return "auto_vacuum已切换为INCREMENTAL" if auto_vacuum else None
+            maintain("VACUUM", action, rewrites=True)
+        
+        def incremental():
+            summary = storage_summary(self.db_connection)
+            if summary.auto_vacuum != 2:
+                reply = QMessageBox.question(dialog, "确认", "数据库的auto_vacuum不是INCREMENTAL，需要先切换模式并执行一次"
+                                             "完整VACUUM，之后才能增量回收空间。是否现在切换?",
+                                             QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+                if reply == QMessageBox.Yes:
+                    full_vacuum("INCREMENTAL")
+                return
+            maintain("增量VACUUM",
+                     lambda writer, report, cancel: f"释放 {incremental_vacuum(writer, progress=report, cancel=cancel)} 页",
+                     rewrites=True)
+        
+        analyze_space_btn.clicked.connect(analyze_space)
+        analyze_btn.clicked.connect(lambda: maintain("ANALYZE", lambda writer, report, cancel: run_analyze(writer, cancel)))
+        optimize_btn.clicked.connect(
+            lambda: maintain("PRAGMA optimize", lambda writer, report, cancel: run_optimize(writer, cancel)))
+        incremental_btn.clicked.connect(incremental)
+        vacuum_btn.clicked.connect(lambda: full_vacuum())
+        
+        show_summary(storage_summary(self.db_connection, self.db_path))
+        if not advice_label.text():
+            advice_label.setText("点击“分析空间”统计每个表和索引的大小、有效率和碎片率")
+        dialog.exec_()
+    
+    def show_database_diff(self):
+        """把当前数据库与另一个数据库文件（通常是旧的备份或快照）比较，显示每张表新增、修改和删除的行"""
+        if self.connections is None:
+            QMessageBox.warning(self, "警告", "请先连接数据库")
+            return
+        old_path, _ = QFileDialog.getOpenFileName(self, "选择要与当前数据库比较的旧版本", "",
+                                                  "SQLite数据库 (*.db *.sqlite *.sqlite3);;所有文件 (*)")
+        if not old_path:
+            return
+        
+        from PyQt5.QtWidgets import QDialog
+        from db_diff import DIFF_STATUS, change_rows, diff_databases
+        
+        try:
+            result = run_task(self, "比较数据库",
+                              lambda report, cancel: diff_databases(old_path, self.db_path, progress=report, cancel=cancel))
+        except OperationCancelled:
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"比较数据库失败: {str(e)}")
+            return
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("比较数据库")
+        dialog.resize(1000, 650)
+        layout = QVBoxLayout()
+        
+        paths_label = QLabel(f"旧（A）：{old_path}\n新（B）：{self.db_path}")
+        layout.addWidget(paths_label)
+        summary_label = QLabel(result.describe())
+        summary_label.setWordWrap(True)
+        layout.addWidget(summary_label)
+        
+        splitter = QSplitter(Qt.Vertical)
+        tables_view = QTableView()
+        tables_view.setSelectionBehavior(QTableView.SelectRows)
+        tables_view.setSelectionMode(QTableView.SingleSelection)
+        tables_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        tables_view.horizontalHeader().setStretchLastSection(True)
+        splitter.addWidget(tables_view)
+        changes_view = QTableView()
+        changes_view.horizontalHeader().setStretchLastSection(True)
+        splitter.addWidget(changes_view)
+        layout.addWidget(splitter)
+        detail_label = QLabel("选择一张表查看逐行的变化")
+        layout.addWidget(detail_label)
+        dialog.setLayout(layout)
+        
+        limit = 10000
+        tables = result.tables
+        rows = [(diff.table, DIFF_STATUS[diff.status], diff.rows_a, diff.rows_b, len(diff.inserted),
+                 len(diff.updated), len(diff.deleted), diff.note) for diff in tables]
+        tables_view.setModel(QueryResultModel(["表", "状态", "A行数", "B行数", "新增", "修改", "删除", "说明"], rows))
+        
+        def show_changes():
+            selected = tables_view.selectionModel().selectedRows()
+            if not selected:
+                return
+            diff = tables[selected[0].row()]
+            key_label = ", ".join(diff.key_columns) or "键"
+            changes = [(kind, key, *cells) for kind, key, cells in change_rows(diff, limit)]
+            changes_view.setModel(QueryResultModel(["变化", key_label] + diff.columns, changes))
+            if diff.status in ("added", "removed"):
+                detail_label.setText(f"{diff.table}：{diff.describe()}，不逐行列出")
+            else:
+                more = f"，只显示前 {limit} 处" if diff.changes > limit else ""
+                detail_label.setText(f"{diff.table}：{diff.describe()}{more}；"
+                                     f"修改的列显示为“旧值 → 新值”")
+        
+        tables_view.selectionModel().selectionChanged.connect(show_changes)
+        changed = ([i for i, diff in enumerate(tables) if diff.status == "changed"] or
+                   [i for i, diff in enumerate(tables) if diff.status != "same"])
+        if changed:
+            tables_view.selectRow(changed[0])
+        dialog.exec_()
+    
+    def show_export_database(self):
+        """选择若干张表（默认全部），用多个进程并行导出到一个目录，每张表一个文件"""
+        if self.connections is None:
+            QMessageBox.warning(self, "警告", "请先连接数据库")
+            return
+        
+        from PyQt5.QtWidgets import QDialog, QFormLayout, QDialogButtonBox, QListWidget, QListWidgetItem
+        from db_transfer import DUMP_FORMATS, export_database, export_file_name
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle("导出数据库")
+        dialog.resize(500, 550)
+        layout = QVBoxLayout()
+        
+        layout.addWidget(QLabel("要导出的表:"))
+        table_list = QListWidget()
+        for table in self.catalog.tables():
+            item = QListWidgetItem(table)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            table_list.addItem(item)
+        layout.addWidget(table_list)
+        
+        select_layout = QHBoxLayout()
+        select_all_btn = QPushButton("全选")
+        select_layout.addWidget(select_all_btn)
+        select_none_btn = QPushButton("全不选")
+        select_layout.addWidget(select_none_btn)
+        select_layout.addStretch()
+        layout.addLayout(select_layout)
+        
+        form_layout = QFormLayout()
+        format_combo = QComboBox()
+        format_combo.addItem("CSV", "csv")
+        format_combo.addItem("Excel (xlsx)", "xlsx")
+        form_layout.addRow("格式:", format_combo)
+        workers_spin = QSpinBox()
+        workers_spin.setRange(1, max(1, os.cpu_count() or 1) * 2)
+        workers_spin.setValue(os.cpu_count() or 1)
+        workers_spin.setToolTip("同时导出的表数，每个进程使用独立的只读连接")
+        form_layout.addRow("并行进程数:", workers_spin)
+        layout.addLayout(form_layout)
+        
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.button(QDialogButtonBox.Ok).setText("选择目录并导出")
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        dialog.setLayout(layout)
+        
+        def set_all(state):
+            for i in range(table_list.count()):
+                table_list.item(i).setCheckState(state)
+        
+        select_all_btn.clicked.connect(lambda: set_all(Qt.Checked))
+        select_none_btn.clicked.connect(lambda: set_all(Qt.Unchecked))
+        
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        tables = [table_list.item(i).text() for i in range(table_list.count())
+                  if table_list.item(i).checkState() == Qt.Checked]
+        if not tables:
+            QMessageBox.warning(self, "警告", "请至少选择一张表")
+            return
+        directory = QFileDialog.getExistingDirectory(self, "选择导出目录")
+        if not directory:
+            return
+        
+        format = format_combo.currentData()
+        used = set()
+        existing = [name for name in (export_file_name(table, DUMP_FORMATS[format], used) for table in tables)
+                    if os.path.exists(os.path.join(directory, name))]
+        if existing:
+            listed = "、".join(existing[:5]) + (" 等" if len(existing) > 5 else "")
+            reply = QMessageBox.question(self, "确认", f"目录中已有 {len(existing)} 个同名文件（{listed}），是否覆盖?",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+        
+        try:
+            total, exported = run_task(self, "导出数据库", lambda report, cancel: export_database(
+                self.db_path, directory, tables, format, workers_spin.value(), progress=report, cancel=cancel))
+        except OperationCancelled:
+            QMessageBox.information(self, "提示", "导出已取消，已完成的表保留在导出目录中")
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"导出数据库失败: {str(e)}")
+            return
+        QMessageBox.information(self, "成功", f"已将 {len(exported)} 张表导出到 {directory}\n{total.describe()}")
+    
+    def reload_table_tabs(self):
+        """重新加载所有已打开的表格标签页"""
+        for i in range(self.tab_widget.count()):
+            widget = self.tab_widget.widget(i)
+            if isinstance(widget, TableViewTab):
+                widget.load_data()
+    
+    def jump_to_row(self, table_name, key):
+        """打开表格（已打开时切换过去）并定位到键为key的行"""
+        index = self.table_combo.findText(table_name)
+        if index < 0:
+            QMessageBox.warning(self, "警告", f"表 {table_name} 已不存在")
+            return
+        if self.table_combo.currentIndex() == index:
+            self.open_table(index)
+        else:
+            self.table_combo.setCurrentIndex(index)
+        tab = self.tab_widget.currentWidget()
+        if isinstance(tab, TableViewTab) and tab.table_name == table_name:
+            tab.locate_row(key)
+    
+    def close_search(self):
+        if self.search_dialog is not None:
+            self.search_dialog.close()
+            self.search_dialog.deleteLater()
+            self.search_dialog = None
+        if self.search_index is not None:
+            self.search_index.close()
+            self.search_index = None
+    
+    def closeEvent(self, event):
+        if self.row_counts is not None:
+            self.row_counts.shutdown()
+        if self.sql_tab is not None:
+            self.sql_tab.shutdown()
+        self.close_search()
+        if self.connections is not None:
+            self.connections.close()
+        super().closeEvent(event)
+    
     def close_tab(self, index):
         # 不关闭SQL查询标签页
-        if self.tab_widget.widget(index) == self.sql_tab:
+        widget = self.tab_widget.widget(index)
+        if widget == self.sql_tab:
             return
         
         self.tab_widget.removeTab(index)
+        if isinstance(widget, TableViewTab):
+            widget.release_connection()
+            widget.deleteLater()
 
 def main():
     app = QApplication(sys.argv)
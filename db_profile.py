@@ -0,0 +1,136 @@
+"""记录界面操作对数据库的访问：耗时、返回行数、虚拟机步数和执行的SQL，不依赖图形界面"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class OperationProfile:
+    """一次界面操作（可能包含多条SQL语句）的性能记录
+
+    statements只保留前max_statements条语句（executemany每插入一行都会触发一次跟踪），
+    statement_count为实际执行的语句数。
+    """
+    max_statements = 200
+
+    def __init__(self, source, started):
+        self.source = source
+        self.started = started
+        self.seconds = 0.0
+        self.rows = 0
+        self.vm_steps = 0
+        self.statements = []
+        self.statement_count = 0
+        self.error = None
+
+    def trace(self, offset, sql):
+        self.statement_count += 1
+        if len(self.statements) < self.max_statements:
+            self.statements.append((offset, sql))
+
+    @property
+    def sql(self):
+        """第一条语句，用于列表显示"""
+        return self.statements[0][1] if self.statements else ""
+
+    def to_dict(self):
+        return {
+            "source": self.source,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "seconds": round(self.seconds, 6),
+            "rows": self.rows,
+            "vm_steps": self.vm_steps,
+            "error": self.error,
+            "statement_count": self.statement_count,
+            "statements": [{"offset": round(offset, 6), "sql": sql} for offset, sql in self.statements],
+        }
+
+
+class Profiler:
+    """保存最近的操作记录，可在多个线程中同时使用
+
+    VM步数通过进度回调统计，每step_interval条虚拟机指令回调一次，因此是近似值。
+    每次记录完成后调用listeners中的回调（在执行操作的线程中）。
+    记录本身有开销（跟踪回调和进度回调），默认关闭，在性能分析面板中勾选“记录”后才开启。
+    """
+    def __init__(self, max_records=5000, step_interval=1000, enabled=False):
+        self.step_interval = step_interval
+        self.enabled = enabled
+        self.listeners = []
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._active = set()
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    @contextmanager
+    def profile(self, conn, source, progress_handler=None, handler_interval=None, trace=True):
+        """在with块内记录conn上执行的语句，返回OperationProfile，调用者可设置rows
+
+        连接上只能有一个进度回调：需要自己的回调（例如用于取消）时通过progress_handler传入，
+        它会按handler_interval指定的间隔继续被调用，返回非零值仍会中断语句。
+        trace为False时不安装跟踪回调（executemany每插入一行都会触发一次），
+        语句数由调用者按操作结果设置。
+        """
+        with self._lock:
+            nested = id(conn) in self._active
+            if not nested and self.enabled:
+                self._active.add(id(conn))
+        if nested:
+            # 已在外层操作中记录，语句计入外层记录
+            yield OperationProfile(source, time.time())
+            return
+        if not self.enabled:
+            if progress_handler is not None:
+                conn.set_progress_handler(progress_handler, handler_interval or self.step_interval)
+            try:
+                yield OperationProfile(source, time.time())
+            finally:
+                if progress_handler is not None:
+                    conn.set_progress_handler(None, 0)
+            return
+
+        record = OperationProfile(source, time.time())
+        start = time.perf_counter()
+        interval = self.step_interval
+        calls_per_handler = max(1, (handler_interval or interval) // interval)
+        calls = 0
+
+        def count_steps():
+            nonlocal calls
+            calls += 1
+            if progress_handler is not None and calls % calls_per_handler == 0:
+                return progress_handler()
+            return 0
+
+        conn.set_progress_handler(count_steps, interval)
+        if trace:
+            conn.set_trace_callback(lambda sql: record.trace(time.perf_counter() - start, sql))
+        try:
+            yield record
+        except Exception as e:
+            record.error = str(e)
+            raise
+        finally:
+            if trace:
+                conn.set_trace_callback(None)
+            conn.set_progress_handler(None, 0)
+            record.seconds = time.perf_counter() - start
+            record.vm_steps = calls * interval
+            with self._lock:
+                self._active.discard(id(conn))
+                self._records.append(record)
+            for listener in list(self.listeners):
+                listener(record)
+
+    def export_json(self, file_path):
+        """把全部记录写入JSON文件"""
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump([record.to_dict() for record in self.records()], f, ensure_ascii=False, indent=2)
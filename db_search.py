@@ -0,0 +1,333 @@
+"""全局搜索：把所有表中的文本列建成FTS5索引，保存在数据库旁边的独立文件中，不修改用户的数据库
+
+每张表对应索引文件中的一张FTS5表（trigram分词，支持中文和任意子串；detail=none不保存词位置，
+索引约小一半，子串查找用按列的LIKE，同样走trigram索引）。rowid表记录已索引的
+最大rowid，之后只追加新行，删除的行按rowid清除；WITHOUT ROWID表的行数变化时整表重建。
+同一会话中用PRAGMA data_version、跨会话用数据库文件的大小和修改时间判断是否需要更新。
+原地修改（UPDATE）已索引的行不会被发现，需要时可重建索引。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from db_engine import quote_ident
+from db_transfer import OperationCancelled, TransferStats
+
+# 这些亲和性的列不会保存可搜索的文本
+_NON_TEXT_TYPES = ("INT", "REAL", "FLOA", "DOUB", "BLOB")
+
+
+def default_index_path(db_path):
+    """索引文件默认放在数据库旁边；所在目录不可写时放到用户缓存目录"""
+    db_path = os.path.abspath(db_path)
+    directory = os.path.dirname(db_path)
+    if os.access(directory, os.W_OK):
+        return db_path + "-search"
+    cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "sqlite-db-manager")
+    os.makedirs(cache_dir, exist_ok=True)
+    digest = hashlib.sha1(db_path.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(db_path)}-{digest}-search")
+
+
+def _file_stamp(db_path):
+    """数据库文件（以及WAL文件）的大小和修改时间，用于跨会话判断数据库是否被修改过"""
+    stamp = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            stat = os.stat(path)
+            stamp.extend([stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            stamp.extend([None, None])
+    return stamp
+
+
+class SearchHit:
+    """一条搜索结果：表名、行的键（rowid或主键值的元组）、匹配的列和该列的文本片段"""
+    def __init__(self, table, key, column, text):
+        self.table = table
+        self.key = key
+        self.column = column
+        self.text = text
+
+
+class _IndexedTable:
+    def __init__(self, name, fts, columns, sql, has_rowid, high_water, row_count):
+        self.name = name
+        self.fts = fts
+        self.columns = columns
+        self.sql = sql
+        self.has_rowid = has_rowid
+        self.high_water = high_water
+        self.row_count = row_count
+
+
+class SearchIndex:
+    """数据库db_path的全文索引，索引文件为index_path（默认见default_index_path）
+
+    连接可以在多个线程中使用，但同一时间只能有一个线程调用（界面在更新索引时显示模态进度框）。
+    """
+    def __init__(self, db_path, index_path=None, batch_size=50000):
+        self.db_path = os.path.abspath(db_path)
+        self.index_path = index_path or default_index_path(db_path)
+        self.batch_size = batch_size
+        self._data_version = None
+
+        self.conn = sqlite3.connect(Path(self.index_path).resolve().as_uri(), uri=True,
+                                    check_same_thread=False, isolation_level=None)
+        # 索引随时可以重建，不需要持久性保证
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("PRAGMA busy_timeout = 5000")
+        self.conn.execute("ATTACH DATABASE ? AS src", (f"{Path(self.db_path).as_uri()}?mode=ro",))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS search_tables (name TEXT PRIMARY KEY, fts TEXT, columns TEXT, "
+                          "sql TEXT, has_rowid INTEGER, high_water INTEGER, row_count INTEGER)")
+        self._tables = {}
+        for name, fts, columns, sql, has_rowid, high_water, row_count in self.conn.execute(
+                "SELECT * FROM main.search_tables"):
+            self._tables[name] = _IndexedTable(name, fts, json.loads(columns), sql, bool(has_rowid),
+                                               high_water, row_count)
+
+    def close(self):
+        self.conn.close()
+
+    @property
+    def tables(self):
+        """已建立索引的表名"""
+        return sorted(self._tables)
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM main.search_meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO main.search_meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _source_version(self):
+        return self.conn.execute("PRAGMA src.data_version").fetchone()[0]
+
+    def needs_refresh(self):
+        """数据库自上次更新索引以来是否可能被修改过"""
+        if self._data_version is not None:
+            return self._source_version() != self._data_version
+        if self._meta("stamp") == _file_stamp(self.db_path):
+            self._data_version = self._source_version()
+            return False
+        return True
+
+    def _source_tables(self):
+        """返回[(表名, 建表语句)]，跳过系统表、虚拟表及其影子表"""
+        rows = self.conn.execute("SELECT name, sql FROM src.sqlite_master WHERE type = 'table' "
+                                 "AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' ORDER BY name").fetchall()
+        virtual = [name for name, sql in rows if sql and sql.upper().startswith("CREATE VIRTUAL")]
+        return [(name, sql) for name, sql in rows
+                if name not in virtual and not any(name.startswith(f"{v}_") for v in virtual)]
+
+    def _table_info(self, name):
+        return self.conn.execute(f"PRAGMA src.table_info({quote_ident(name)})").fetchall()
+
+    def _has_rowid(self, name):
+        try:
+            self.conn.execute(f"SELECT rowid FROM src.{quote_ident(name)} LIMIT 0")
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def _drop(self, entry):
+        if entry is None:
+            return
+        self.conn.execute(f"DROP TABLE IF EXISTS main.{quote_ident(entry.fts)}")
+        self.conn.execute("DELETE FROM main.search_tables WHERE name = ?", (entry.name,))
+        del self._tables[entry.name]
+
+    def _save(self, entry):
+        self.conn.execute("INSERT OR REPLACE INTO main.search_tables VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (entry.name, entry.fts, json.dumps(entry.columns), entry.sql, int(entry.has_rowid),
+                           entry.high_water, entry.row_count))
+        self._tables[entry.name] = entry
+
+    def _create(self, name, sql, columns, has_rowid):
+        next_id = self._meta("next_id") or 1
+        self._set_meta("next_id", next_id + 1)
+        fts = f"fts_{next_id:05d}"
+        # 列名可能与FTS5的保留名冲突，索引中统一命名为c0、c1...；WITHOUT ROWID表另存主键
+        fts_columns = ([] if has_rowid else ["k UNINDEXED"]) + [f"c{i}" for i in range(len(columns))]
+        self.conn.execute(f"CREATE VIRTUAL TABLE main.{quote_ident(fts)} USING fts5("
+                          f"{', '.join(fts_columns)}, tokenize = 'trigram', detail = none)")
+        entry = _IndexedTable(name, fts, columns, sql, has_rowid, None, 0)
+        self._save(entry)
+        return entry
+
+    def _index_table(self, name, sql, report):
+        """增量更新一张表的索引，返回新索引的行数"""
+        info = self._table_info(name)
+        columns = [col[1] for col in info if not any(t in (col[2] or "").upper() for t in _NON_TEXT_TYPES)]
+        has_rowid = self._has_rowid(name)
+        entry = self._tables.get(name)
+        if not columns:
+            self._drop(entry)
+            return 0
+        if entry is None or entry.sql != sql or entry.columns != columns or entry.has_rowid != has_rowid:
+            self._drop(entry)
+            entry = self._create(name, sql, columns, has_rowid)
+
+        source = f"src.{quote_ident(name)}"
+        fts = f"main.{quote_ident(entry.fts)}"
+        values = [f"CASE WHEN typeof({quote_ident(col)}) = 'text' THEN {quote_ident(col)} END" for col in columns]
+        has_text = f"coalesce({', '.join(values)}) IS NOT NULL" if len(values) > 1 else f"{values[0]} IS NOT NULL"
+        fts_columns = ", ".join(f"c{i}" for i in range(len(columns)))
+
+        if not has_rowid:
+            # 没有单调递增的键，行数变化时整表重建
+            count = self.conn.execute(f"SELECT count(*) FROM {source}").fetchone()[0]
+            if entry.high_water is not None and count == entry.row_count:
+                return 0
+            keys = [col[1] for col in sorted((col for col in info if col[5] > 0), key=lambda col: col[5])]
+            key_sql = f"json_array({', '.join(quote_ident(col) for col in keys)})"
+            report(f"正在索引 {name}（{count} 行）...")
+            self.conn.execute("BEGIN")
+            self.conn.execute(f"DELETE FROM {fts}")
+            self.conn.execute(f"INSERT INTO {fts} (k, {fts_columns}) SELECT {key_sql}, {', '.join(values)} "
+                              f"FROM {source} WHERE {has_text}")
+            entry.high_water, entry.row_count = 0, count
+            self._save(entry)
+            self.conn.execute("COMMIT")
+            return count
+
+        if entry.high_water is not None:
+            remaining = self.conn.execute(f"SELECT count(*) FROM {source} WHERE rowid <= ?",
+                                          (entry.high_water,)).fetchone()[0]
+            if remaining != entry.row_count:
+                # 有行被删除：清除索引中已不存在的rowid
+                self.conn.execute("BEGIN")
+                self.conn.execute(f"DELETE FROM {fts} WHERE rowid NOT IN (SELECT rowid FROM {source})")
+                entry.row_count = remaining
+                self._save(entry)
+                self.conn.execute("COMMIT")
+
+        indexed = 0
+        while True:
+            # 每批按rowid顺序追加，提交后记录新的最大rowid，取消时已完成的批次保留
+            start = entry.high_water
+            after = "" if start is None else "WHERE rowid > ?"
+            params = () if start is None else (start,)
+            count, high_water = self.conn.execute(
+                f"SELECT count(*), max(rowid) FROM (SELECT rowid FROM {source} {after} ORDER BY rowid LIMIT ?)",
+                params + (self.batch_size,)).fetchone()
+            if not count:
+                break
+            self.conn.execute("BEGIN")
+            range_sql = "rowid <= ?" if start is None else "rowid > ? AND rowid <= ?"
+            self.conn.execute(f"INSERT INTO {fts} (rowid, {fts_columns}) SELECT rowid, {', '.join(values)} "
+                              f"FROM {source} WHERE {range_sql} AND {has_text}", params + (high_water,))
+            entry.high_water = high_water
+            entry.row_count += count
+            self._save(entry)
+            self.conn.execute("COMMIT")
+            indexed += count
+            report(f"正在索引 {name}：已索引 {entry.row_count} 行")
+        return indexed
+
+    def refresh(self, progress=None, cancel=None):
+        """增量更新全部表的索引，返回TransferStats（rows为新索引的行数）
+
+        progress(text)报告进度；cancel为threading.Event，置位后中止并抛出OperationCancelled，
+        已提交的批次保留，下次从中断处继续。
+        """
+        start = time.perf_counter()
+        report = progress or (lambda text: None)
+        # 在开始前记录版本：更新期间发生的修改留到下次
+        version = self._source_version()
+        stamp = _file_stamp(self.db_path)
+        if cancel is not None:
+            self.conn.set_progress_handler(lambda: 1 if cancel.is_set() else 0, 10000)
+        indexed = 0
+        try:
+            source_tables = self._source_tables()
+            names = {name for name, _ in source_tables}
+            for name in [name for name in self._tables if name not in names]:
+                self._drop(self._tables[name])
+            for name, sql in source_tables:
+                if cancel is not None and cancel.is_set():
+                    raise OperationCancelled()
+                indexed += self._index_table(name, sql, report)
+            self._set_meta("stamp", stamp)
+            self._data_version = version
+        except sqlite3.OperationalError as e:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            if cancel is not None and cancel.is_set():
+                raise OperationCancelled() from e
+            raise
+        except BaseException:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self.conn.set_progress_handler(None, 0)
+        return TransferStats(indexed, 0, time.perf_counter() - start)
+
+    def rebuild(self, progress=None, cancel=None):
+        """丢弃全部索引后重新建立（用于发现原地修改过的行）"""
+        for entry in list(self._tables.values()):
+            self._drop(entry)
+        self._set_meta("stamp", None)
+        self._data_version = None
+        return self.refresh(progress, cancel)
+
+    def search(self, text, limit=200):
+        """在所有表中搜索包含text的行，返回最多limit条SearchHit，按表名排列
+
+        三个字符以上的文本走trigram索引；更短的文本索引无法使用，需要扫描索引内容。
+        文本中的%和_按LIKE通配符处理，只匹配到通配符的行在结果中过滤掉。
+        """
+        text = text.strip()
+        if not text:
+            return []
+        folded = text.casefold()
+        pattern = f"%{text}%"
+        hits = []
+        for name in self.tables:
+            if len(hits) >= limit:
+                break
+            entry = self._tables[name]
+            fts = f"main.{quote_ident(entry.fts)}"
+            fts_columns = [f"c{i}" for i in range(len(entry.columns))]
+            key_sql = "rowid" if entry.has_rowid else "k"
+            select = f"SELECT rowid, {key_sql}, {', '.join(fts_columns)} FROM {fts} WHERE "
+            if len(text) >= 3:
+                # 每列单独的LIKE才能使用trigram索引，用OR连接会退化为全表扫描
+                queries = [(select + f"{col} LIKE ?", [pattern]) for col in fts_columns]
+            else:
+                # 不足三个字符时trigram索引无法使用（中文按字节计算长度还会漏掉结果），
+                # 用+col阻止把条件交给FTS5，由SQLite逐行比较
+                queries = [(select + " OR ".join(f"+{col} LIKE ?" for col in fts_columns),
+                            [pattern] * len(fts_columns))]
+            seen = set()
+            for sql, params in queries:
+                remaining = limit - len(hits)
+                if remaining <= 0:
+                    break
+                for row in self.conn.execute(sql + " LIMIT ?", params + [remaining]):
+                    if row[0] in seen:
+                        continue
+                    seen.add(row[0])
+                    match = next(((col, value) for col, value in zip(entry.columns, row[2:])
+                                  if value is not None and folded in value.casefold()), None)
+                    if match is None:
+                        continue
+                    key = (row[1],) if entry.has_rowid else tuple(json.loads(row[1]))
+                    hits.append(SearchHit(name, key, match[0], _excerpt(match[1], folded)))
+        return hits
+
+
+def _excerpt(value, folded, before=20, width=80):
+    """返回匹配位置附近的一段文本"""
+    value = " ".join(value.split())
+    position = value.casefold().find(folded)
+    start = max(0, position - before) if position >= 0 else 0
+    excerpt = value[start:start + width]
+    return ("..." if start > 0 else "") + excerpt + ("..." if start + width < len(value) else "")
@@ -0,0 +1,258 @@
+"""存储分析与维护：用dbstat虚拟表统计每个表和索引占用的空间，执行ANALYZE、PRAGMA optimize和VACUUM
+
+不依赖图形界面。耗时的操作接受cancel（threading.Event），置位后中断并抛出OperationCancelled；
+VACUUM和ANALYZE都是原子的，中断后数据库保持原样。
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from db_engine import format_size
+from db_transfer import OperationCancelled
+
+AUTO_VACUUM_MODES = {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}
+
+
+class ObjectStorage:
+    """一个表或索引（一棵B树）的空间使用情况"""
+    def __init__(self, name, table, kind):
+        self.name = name
+        self.table = table
+        self.kind = kind
+        self.pages = 0
+        self.leaf_pages = 0
+        self.overflow_pages = 0
+        # 叶子页上的单元数：表为行数，索引为条目数（不含内部页上的条目）
+        self.cells = 0
+        self.payload = 0
+        self.unused = 0
+        self.bytes = 0
+        # 按B树顺序相邻、但在文件中不相邻的页数
+        self.out_of_order = 0
+
+    @property
+    def efficiency(self):
+        """有效数据占已用页的比例"""
+        return self.payload / self.bytes if self.bytes else 0.0
+
+    @property
+    def fragmentation(self):
+        """按B树顺序遍历时，下一页不紧跟在上一页之后的比例；越高顺序扫描越慢"""
+        return self.out_of_order / (self.pages - 1) if self.pages > 1 else 0.0
+
+
+class StorageSummary:
+    """整个数据库文件的空间概况，开销很小，可在维护前后各取一次比较"""
+    def __init__(self, page_size, page_count, freelist_count, auto_vacuum, file_size, stat_rows):
+        self.page_size = page_size
+        self.page_count = page_count
+        self.freelist_count = freelist_count
+        self.auto_vacuum = auto_vacuum
+        self.file_size = file_size
+        # sqlite_stat1中的行数，为None表示从未执行过ANALYZE
+        self.stat_rows = stat_rows
+
+    @property
+    def total_bytes(self):
+        return self.page_size * self.page_count
+
+    @property
+    def free_bytes(self):
+        return self.page_size * self.freelist_count
+
+    @property
+    def free_ratio(self):
+        return self.freelist_count / self.page_count if self.page_count else 0.0
+
+    def describe(self):
+        analyzed = "未执行过ANALYZE" if self.stat_rows is None else f"统计信息 {self.stat_rows} 条"
+        return (f"页大小 {self.page_size} B，共 {self.page_count} 页（{format_size(self.total_bytes)}），"
+                f"空闲 {self.freelist_count} 页（{self.free_ratio:.1%}），"
+                f"auto_vacuum={AUTO_VACUUM_MODES.get(self.auto_vacuum, self.auto_vacuum)}，{analyzed}")
+
+
+def storage_summary(conn, db_path=None):
+    """读取页数、空闲页数等概况；db_path用于读取文件（含WAL）的实际大小"""
+    def pragma(name):
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+    file_size = None
+    if db_path is not None:
+        file_size = sum(os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path))
+    has_stat = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    stat_rows = conn.execute("SELECT count(*) FROM sqlite_stat1").fetchone()[0] if has_stat else None
+    return StorageSummary(pragma("page_size"), pragma("page_count"), pragma("freelist_count"),
+                          pragma("auto_vacuum"), file_size, stat_rows)
+
+
+def compare_summaries(before, after):
+    """维护前后的对比，返回[(指标, 之前, 之后, 变化)]"""
+    def change(old, new, size=False):
+        if old is None or new is None:
+            return ""
+        delta = new - old
+        text = format_size(abs(delta)) if size else str(abs(delta))
+        return "不变" if delta == 0 else ("+" if delta > 0 else "-") + text
+
+    rows = [
+        ("总页数", before.page_count, after.page_count, change(before.page_count, after.page_count)),
+        ("空闲页", before.freelist_count, after.freelist_count, change(before.freelist_count, after.freelist_count)),
+        ("数据库大小", format_size(before.total_bytes), format_size(after.total_bytes),
+         change(before.total_bytes, after.total_bytes, size=True)),
+    ]
+    if before.file_size is not None and after.file_size is not None:
+        rows.append(("文件大小（含WAL）", format_size(before.file_size), format_size(after.file_size),
+                     change(before.file_size, after.file_size, size=True)))
+    rows.append(("统计信息条数", "无" if before.stat_rows is None else before.stat_rows,
+                 "无" if after.stat_rows is None else after.stat_rows, change(before.stat_rows, after.stat_rows)))
+    rows.append(("auto_vacuum", AUTO_VACUUM_MODES.get(before.auto_vacuum), AUTO_VACUUM_MODES.get(after.auto_vacuum),
+                 "" if before.auto_vacuum == after.auto_vacuum else "已修改"))
+    return rows
+
+
+@contextmanager
+def _interruptible(conn, cancel):
+    """cancel置位时中断正在执行的语句，并把中断转换为OperationCancelled"""
+    if cancel is not None:
+        conn.set_progress_handler(lambda: 1 if cancel.is_set() else 0, 10000)
+    try:
+        yield
+    except Exception:
+        if cancel is not None and cancel.is_set():
+            raise OperationCancelled()
+        raise
+    finally:
+        if cancel is not None:
+            conn.set_progress_handler(None, 0)
+
+
+def analyze_storage(conn, names=None, progress=None, cancel=None, report_every=5000):
+    """逐页读取dbstat，返回按大小降序排列的ObjectStorage列表
+
+    names指定时只统计这些表或索引（dbstat按名称只遍历对应的B树），否则统计整个数据库。
+    需要读取数据库的每一页，大数据库上耗时与整库顺序读取相当。progress(text)报告进度。
+    """
+    owners = {name: (table, kind) for kind, name, table in
+              conn.execute("SELECT type, name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')")}
+    owners.setdefault("sqlite_schema", ("sqlite_schema", "table"))
+    owners.setdefault("sqlite_master", ("sqlite_master", "table"))
+    objects = {}
+    last_page = {}
+    pages_read = 0
+    if names is None:
+        queries = [("SELECT name, pageno, pagetype, ncell, payload, unused, pgsize FROM dbstat", ())]
+    else:
+        queries = [("SELECT name, pageno, pagetype, ncell, payload, unused, pgsize FROM dbstat WHERE name = ?",
+                    (name,)) for name in names]
+
+    with _interruptible(conn, cancel):
+        for sql, params in queries:
+            # dbstat按B树的遍历顺序（path）返回页，用相邻两页的页号判断是否连续
+            for name, pageno, pagetype, cells, payload, unused, pgsize in conn.execute(sql, params):
+                stats = objects.get(name)
+                if stats is None:
+                    table, kind = owners.get(name, (name, "table"))
+                    stats = objects[name] = ObjectStorage(name, table, kind)
+                stats.pages += 1
+                if pagetype == "leaf":
+                    stats.leaf_pages += 1
+                    stats.cells += cells
+                elif pagetype == "overflow":
+                    stats.overflow_pages += 1
+                stats.payload += payload
+                stats.unused += unused
+                stats.bytes += pgsize
+                previous = last_page.get(name)
+                if previous is not None and pageno != previous + 1:
+                    stats.out_of_order += 1
+                last_page[name] = pageno
+                pages_read += 1
+                if progress is not None and pages_read % report_every == 0:
+                    progress(f"已分析 {pages_read} 页...")
+    return sorted(objects.values(), key=lambda stats: stats.bytes, reverse=True)
+
+
+def recommendations(summary, objects=()):
+    """根据分析结果给出维护建议，返回文本列表"""
+    advice = []
+    if summary.stat_rows is None:
+        advice.append("从未执行过ANALYZE：查询规划器缺少统计信息，建议执行ANALYZE（之后定期执行PRAGMA optimize即可）")
+    if summary.page_count and summary.free_ratio >= 0.1:
+        action = "增量VACUUM" if summary.auto_vacuum == 2 else "VACUUM"
+        advice.append(f"空闲页占 {summary.free_ratio:.0%}（{format_size(summary.free_bytes)}），执行{action}可回收空间")
+    fragmented = [stats.name for stats in objects if stats.pages >= 100 and stats.fragmentation >= 0.3]
+    if fragmented:
+        listed = "、".join(fragmented[:5]) + (" 等" if len(fragmented) > 5 else "")
+        advice.append(f"{listed} 的页在文件中较分散，顺序扫描较慢，VACUUM会按顺序重写")
+    sparse = [stats.name for stats in objects if stats.pages >= 100 and stats.efficiency < 0.5]
+    if sparse:
+        listed = "、".join(sparse[:5]) + (" 等" if len(sparse) > 5 else "")
+        advice.append(f"{listed} 的页平均不到一半被有效数据占用（大量删除后常见），VACUUM可以压缩")
+    return advice
+
+
+def run_analyze(conn, cancel=None):
+    """执行ANALYZE，收集全部表和索引的统计信息"""
+    with _interruptible(conn, cancel):
+        conn.execute("ANALYZE")
+        conn.commit()
+
+
+def run_optimize(conn, cancel=None):
+    """执行PRAGMA optimize，只为统计信息可能已过时的表重新收集，通常很快"""
+    with _interruptible(conn, cancel):
+        conn.execute("PRAGMA optimize").fetchall()
+        conn.commit()
+
+
+def incremental_vacuum(conn, pages_per_step=1024, progress=None, cancel=None):
+    """auto_vacuum为INCREMENTAL时分批释放空闲页，每批提交一次，返回释放的页数
+
+    分批执行可以显示进度，也不会长时间占用写锁；取消时已释放的页保留。
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        raise ValueError("auto_vacuum不是INCREMENTAL，无法增量回收空间，请先执行完整VACUUM并切换模式")
+    total = remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while remaining > 0:
+        if cancel is not None and cancel.is_set():
+            raise OperationCancelled()
+        conn.execute(f"PRAGMA incremental_vacuum({min(pages_per_step, remaining)})").fetchall()
+        conn.commit()
+        left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if left >= remaining:
+            # 没有进展，避免死循环
+            break
+        remaining = left
+        if progress is not None:
+            progress(f"已释放 {total - remaining} / {total} 页")
+    return total - remaining
+
+
+def vacuum(conn, auto_vacuum=None, progress=None, cancel=None):
+    """执行完整VACUUM，重写整个数据库；auto_vacuum为NONE/FULL/INCREMENTAL时同时切换模式
+
+    VACUUM需要与数据库大小相当的临时空间，期间独占写锁。
+    """
+    start = time.perf_counter()
+    if progress is not None:
+        progress("正在执行VACUUM，数据库越大耗时越长...")
+    with _interruptible(conn, cancel):
+        if conn.in_transaction:
+            conn.commit()
+        if auto_vacuum is not None:
+            if auto_vacuum not in AUTO_VACUUM_MODES.values():
+                raise ValueError(f"不支持的auto_vacuum模式: {auto_vacuum}")
+            conn.execute(f"PRAGMA auto_vacuum = {auto_vacuum}")
+        conn.execute("VACUUM")
+    return time.perf_counter() - start
+
+
+def storage_rows(objects):
+    """把分析结果转换为表格的行"""
+    return [(stats.name, "索引" if stats.kind == "index" else "表", stats.table, stats.pages,
+             format_size(stats.bytes), format_size(stats.payload), format_size(stats.unused),
+             f"{stats.efficiency:.0%}", f"{stats.fragmentation:.0%}", stats.overflow_pages, stats.cells)
+            for stats in objects]
+
+
+STORAGE_COLUMNS = ["名称", "类型", "所属表", "页数", "大小", "有效数据", "未用空间", "有效率", "碎片率", "溢出页", "记录数"]
@@ -0,0 +1,507 @@
+"""表数据的流式导入导出，不依赖图形界面"""
+import csv
+import datetime
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from db_engine import quote_ident
+
+
+class OperationCancelled(Exception):
+    """用户取消了正在执行的导入或导出"""
+
+
+class TransferStats:
+    """一次导入或导出的统计信息"""
+    def __init__(self, rows=0, bytes=0, seconds=0.0):
+        self.rows = rows
+        self.bytes = bytes
+        self.seconds = seconds
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_second(self):
+        return self.bytes / 1048576 / self.seconds if self.seconds > 0 else 0.0
+
+    def describe(self):
+        text = f"共 {self.rows} 行，用时 {self.seconds:.2f} 秒，{self.rows_per_second:,.0f} 行/秒"
+        if self.bytes:
+            text += f"，{self.bytes / 1048576:.1f} MB，{self.mb_per_second:.1f} MB/s"
+        return text
+
+
+def _check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise OperationCancelled()
+
+
+def export_csv(conn, table_name, file_path, batch_size=5000, buffer_size=1 << 20,
+               progress=None, cancel=None):
+    """逐批从游标读取并写入CSV文件，内存占用与表大小无关
+
+    progress(rows, bytes)在每批写入后调用；cancel为threading.Event，置位后中止导出。
+    取消或出错（例如磁盘已满）时删除未完成的文件，不会留下看起来完整的截断文件。
+    """
+    start = time.perf_counter()
+    rows_written = 0
+    cursor = conn.execute(f"SELECT * FROM {quote_ident(table_name)}")
+    created = False
+    try:
+        with open(file_path, "w", newline="", encoding="utf-8", buffering=buffer_size) as f:
+            created = True
+            writer = csv.writer(f)
+            writer.writerow([desc[0] for desc in cursor.description])
+            while True:
+                _check_cancel(cancel)
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                rows_written += len(rows)
+                if progress is not None:
+                    progress(rows_written, f.tell())
+            bytes_written = f.tell()
+    except BaseException:
+        if created and os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    finally:
+        cursor.close()
+    return TransferStats(rows_written, bytes_written, time.perf_counter() - start)
+
+
+EXCEL_MAX_ROWS = 1048576
+_SHEET_NAME_INVALID = str.maketrans({ch: "_" for ch in '[]:*?/\\'})
+
+
+def _sheet_title(table_name, index):
+    """生成合法的工作表名（最多31个字符），第二个及之后的工作表加序号后缀"""
+    base = str(table_name).translate(_SHEET_NAME_INVALID) or "Sheet"
+    if index == 0:
+        return base[:31]
+    suffix = f"_{index + 1}"
+    return base[:31 - len(suffix)] + suffix
+
+
+def export_xlsx(conn, table_name, file_path, batch_size=5000, max_rows_per_sheet=EXCEL_MAX_ROWS,
+                progress=None, cancel=None):
+    """使用只写模式的工作簿逐行写出xlsx文件，内存占用与行数无关
+
+    单个工作表写满（含表头）后自动换到新的工作表。progress(rows, None)在每批写入后调用。
+    文件只在最后保存时写出，保存失败时删除写了一半的文件。
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def clean(value):
+        if isinstance(value, str):
+            return ILLEGAL_CHARACTERS_RE.sub("", value)
+        if isinstance(value, bytes):
+            return str(value)
+        return value
+
+    start = time.perf_counter()
+    rows_written = 0
+    cursor = conn.execute(f"SELECT * FROM {quote_ident(table_name)}")
+    try:
+        header = [desc[0] for desc in cursor.description]
+        workbook = Workbook(write_only=True)
+        sheet = None
+        sheet_count = 0
+        sheet_rows = 0
+        while True:
+            _check_cancel(cancel)
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                if sheet is None or sheet_rows >= max_rows_per_sheet:
+                    sheet = workbook.create_sheet(_sheet_title(table_name, sheet_count))
+                    sheet.append(header)
+                    sheet_count += 1
+                    sheet_rows = 1
+                sheet.append([clean(value) for value in row])
+                sheet_rows += 1
+            rows_written += len(rows)
+            if progress is not None:
+                progress(rows_written, None)
+        if sheet is None:
+            # 空表也写出表头
+            workbook.create_sheet(_sheet_title(table_name, 0)).append(header)
+        _check_cancel(cancel)
+        try:
+            workbook.save(file_path)
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+    finally:
+        cursor.close()
+    return TransferStats(rows_written, os.path.getsize(file_path), time.perf_counter() - start)
+
+
+DUMP_FORMATS = {"csv": ".csv", "xlsx": ".xlsx"}
+_FILE_NAME_INVALID = str.maketrans({ch: "_" for ch in '<>:"/\\|?*'})
+
+
+def export_file_name(table_name, extension, used):
+    """把表名转换为合法的文件名；不区分大小写地避开used中已有的名称，并把结果加入used"""
+    base = "".join(ch if ch.isprintable() else "_" for ch in str(table_name).translate(_FILE_NAME_INVALID))
+    base = base.strip(" .") or "table"
+    name = base + extension
+    index = 2
+    while name.lower() in used:
+        name = f"{base}_{index}{extension}"
+        index += 1
+    used.add(name.lower())
+    return name
+
+
+# 工作进程中的进度队列和取消事件，由_init_dump_worker设置
+_dump_progress = None
+_dump_cancel = None
+
+
+def _init_dump_worker(progress_queue, cancel):
+    global _dump_progress, _dump_cancel
+    _dump_progress = progress_queue
+    _dump_cancel = cancel
+
+
+def _dump_table(db_path, table_name, file_path, format, report_interval=0.2):
+    """在工作进程中用独立的只读连接导出一张表，定期把(表名, 行数, 字节数)放入进度队列"""
+    from db_engine import open_connection
+
+    last_report = [0.0]
+
+    def progress(rows, bytes_written):
+        now = time.perf_counter()
+        if _dump_progress is not None and now - last_report[0] >= report_interval:
+            last_report[0] = now
+            _dump_progress.put((table_name, rows, bytes_written or 0))
+
+    conn = open_connection(db_path, read_only=True)
+    try:
+        export = export_xlsx if format == "xlsx" else export_csv
+        return export(conn, table_name, file_path, progress=progress, cancel=_dump_cancel)
+    finally:
+        conn.close()
+
+
+class _DumpProgress:
+    """汇总各张表的导出进度，按固定间隔调用progress(text)；也可直接作为单进程导出时的进度队列"""
+    def __init__(self, tables, estimates, progress, interval=0.2):
+        self.tables = tables
+        self.estimates = estimates
+        self.progress = progress
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.current = {}
+        self.finished = 0
+        self._last_report = 0.0
+
+    def put(self, item):
+        table_name, rows, bytes_written = item
+        self.current[table_name] = (rows, bytes_written)
+        self.report()
+
+    def finish(self, table_name, stats):
+        self.current[table_name] = (stats.rows, stats.bytes)
+        self.finished += 1
+        self.report(force=True)
+
+    def report(self, force=False):
+        now = time.perf_counter()
+        if self.progress is None or (not force and now - self._last_report < self.interval):
+            return
+        self._last_report = now
+        rows = sum(rows for rows, _ in self.current.values())
+        bytes_written = sum(size for _, size in self.current.values())
+        elapsed = now - self.start
+        rate = bytes_written / 1048576 / elapsed if elapsed > 0 else 0.0
+        text = (f"已完成 {self.finished}/{len(self.tables)} 张表，导出 {rows:,} 行，"
+                f"{bytes_written / 1048576:.1f} MB，{rate:.1f} MB/s")
+        total = sum(self.estimates.values())
+        if total and None not in self.estimates.values():
+            text += f"，约 {min(rows / total, 1.0):.0%}"
+        self.progress(text)
+
+
+def export_database(db_path, directory, tables=None, format="csv", workers=None, progress=None, cancel=None):
+    """把多张表（默认全部表）并行导出到directory，每张表一个文件，返回(总的TransferStats, [(表名, 文件路径, TransferStats)])
+
+    每张表由进程池中的一个进程用各自的只读连接流式写出，大表先开始；workers为进程数，
+    默认取CPU核数和表数中较小的一个，为1时在当前进程中逐张导出。
+    progress(text)汇总报告全部表的进度和吞吐量；cancel（threading.Event）置位时中止，
+    未完成的文件会被删除，已完成的表保留。
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from queue import Empty
+    from db_engine import estimate_row_count, open_connection
+
+    if format not in DUMP_FORMATS:
+        raise ValueError(f"不支持的导出格式: {format}")
+    start = time.perf_counter()
+    conn = open_connection(db_path, read_only=True)
+    try:
+        existing = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+        if tables is None:
+            tables = existing
+        else:
+            missing = [name for name in tables if name not in existing]
+            if missing:
+                raise KeyError(f"数据库中没有表: {', '.join(missing)}")
+        estimates = {name: estimate_row_count(conn, name) for name in tables}
+    finally:
+        conn.close()
+
+    os.makedirs(directory, exist_ok=True)
+    used = set()
+    paths = {name: os.path.join(directory, export_file_name(name, DUMP_FORMATS[format], used)) for name in tables}
+    # 大表先开始，避免最后只剩一张大表在一个进程中导出
+    order = sorted(tables, key=lambda name: estimates[name] or 0, reverse=True)
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(tables))
+    tracker = _DumpProgress(tables, estimates, progress)
+    results = {}
+
+    if workers <= 1:
+        _init_dump_worker(tracker, cancel)
+        try:
+            for name in order:
+                _check_cancel(cancel)
+                results[name] = _dump_table(db_path, name, paths[name], format)
+                tracker.finish(name, results[name])
+        finally:
+            _init_dump_worker(None, None)
+    else:
+        import multiprocessing
+        # 图形界面在后台线程中调用，fork多线程的进程可能使子进程在其他线程持有的锁上死锁，因此用spawn
+        context = multiprocessing.get_context("spawn")
+        progress_queue = context.Queue()
+        stop = context.Event()
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                       initializer=_init_dump_worker, initargs=(progress_queue, stop))
+        try:
+            pending = {executor.submit(_dump_table, db_path, name, paths[name], format): name for name in order}
+            while pending:
+                if cancel is not None and cancel.is_set():
+                    stop.set()
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                while True:
+                    try:
+                        item = progress_queue.get_nowait()
+                    except Empty:
+                        break
+                    if item[0] not in results:
+                        tracker.current[item[0]] = item[1:]
+                for future in done:
+                    name = pending.pop(future)
+                    results[name] = future.result()
+                    tracker.finish(name, results[name])
+                tracker.report()
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            progress_queue.close()
+
+    exported = [(name, paths[name], results[name]) for name in tables]
+    total = TransferStats(sum(stats.rows for _, _, stats in exported), sum(stats.bytes for _, _, stats in exported),
+                          time.perf_counter() - start)
+    return total, exported
+
+
+@contextmanager
+def relaxed_durability(conn):
+    """批量导入期间关闭同步写入并使用内存日志，结束后恢复原设置
+
+    WAL模式会持久保存在数据库文件中，不做切换，只调整synchronous。
+    """
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.execute("PRAGMA synchronous = OFF")
+    if journal_mode.lower() != "wal":
+        conn.execute("PRAGMA journal_mode = MEMORY")
+    try:
+        yield
+    finally:
+        if journal_mode.lower() != "wal":
+            conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+
+
+def bulk_insert(conn, table_name, columns, rows, batch_size=10000, fast=False, defer_indexes=False,
+                progress=None, cancel=None):
+    """在一个显式事务中分批executemany插入rows，返回TransferStats
+
+    fast为True时导入期间放宽持久性设置；defer_indexes为True时先删除表上显式创建的索引，
+    插入完成后在同一事务中重建。任何错误或取消都会回滚整个导入。
+    progress(rows)在每批插入后调用。
+    """
+    start = time.perf_counter()
+    columns_str = ", ".join(quote_ident(col) for col in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    insert_sql = f"INSERT INTO {quote_ident(table_name)} ({columns_str}) VALUES ({placeholders})"
+    rows = iter(rows)
+    inserted = 0
+
+    def run():
+        nonlocal inserted
+        conn.execute("BEGIN")
+        try:
+            indexes = []
+            if defer_indexes:
+                indexes = conn.execute(
+                    "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                    (table_name,)).fetchall()
+                for name, _ in indexes:
+                    conn.execute(f"DROP INDEX {quote_ident(name)}")
+
+            while True:
+                _check_cancel(cancel)
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                conn.executemany(insert_sql, batch)
+                inserted += len(batch)
+                if progress is not None:
+                    progress(inserted)
+
+            for _, sql in indexes:
+                _check_cancel(cancel)
+                conn.execute(sql)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    if fast:
+        with relaxed_durability(conn):
+            run()
+    else:
+        run()
+    return TransferStats(inserted, 0, time.perf_counter() - start)
+
+
+def read_csv_header(file_path):
+    """读取CSV文件的表头"""
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+
+def iter_csv_rows(file_path, column_count, buffer_size=1 << 20):
+    """逐行读取CSV数据（跳过表头），空字段视为NULL，缺少的字段补NULL"""
+    with open(file_path, newline="", encoding="utf-8-sig", buffering=buffer_size) as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) > column_count:
+                raise ValueError(f"CSV第 {reader.line_num} 行的字段数({len(row)})多于表头({column_count})")
+            values = [value if value != "" else None for value in row]
+            if len(values) < column_count:
+                values.extend([None] * (column_count - len(values)))
+            yield values
+
+
+def import_csv(conn, table_name, file_path, batch_size=10000, fast=False, defer_indexes=False,
+               progress=None, cancel=None):
+    """将CSV文件按块批量导入到表中，返回TransferStats"""
+    columns = read_csv_header(file_path)
+    stats = bulk_insert(conn, table_name, columns, iter_csv_rows(file_path, len(columns)),
+                        batch_size=batch_size, fast=fast, defer_indexes=defer_indexes,
+                        progress=progress, cancel=cancel)
+    stats.bytes = os.path.getsize(file_path)
+    return stats
+
+
+def _is_legacy_excel(file_path):
+    return file_path.lower().endswith(".xls")
+
+
+def list_excel_sheets(file_path):
+    """返回工作簿中的工作表名称列表"""
+    if _is_legacy_excel(file_path):
+        import pandas as pd
+        return pd.ExcelFile(file_path).sheet_names
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def _excel_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return str(value)
+    return value
+
+
+def iter_excel_rows(file_path, sheet_name=None, start_row=1):
+    """逐行读取工作表，从start_row（从1开始）所在的表头行开始，第一项为表头
+
+    xlsx使用只读模式流式读取，内存占用与工作表大小无关；旧版xls格式只能整体读入。
+    完全为空的行会被跳过。
+    """
+    if _is_legacy_excel(file_path):
+        import pandas as pd
+        df = pd.read_excel(file_path, sheet_name=sheet_name or 0, header=None, skiprows=start_row - 1)
+        df = df.astype(object).where(df.notna(), None)
+        for row in df.itertuples(index=False, name=None):
+            if any(value is not None for value in row):
+                yield [_excel_value(value) for value in row]
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        for row in sheet.iter_rows(min_row=start_row, values_only=True):
+            if any(value is not None for value in row):
+                yield [_excel_value(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def read_excel_header(file_path, sheet_name=None, start_row=1):
+    """读取工作表的表头（start_row所在行），去掉末尾的空列"""
+    rows = iter_excel_rows(file_path, sheet_name, start_row)
+    try:
+        header = next(rows, [])
+    finally:
+        rows.close()
+    while header and header[-1] is None:
+        header.pop()
+    return [str(col) for col in header]
+
+
+def import_excel(conn, table_name, file_path, sheet_name=None, start_row=1, batch_size=10000,
+                 fast=False, defer_indexes=False, progress=None, cancel=None):
+    """将工作表逐行读取并批量导入到表中，返回TransferStats"""
+    columns = read_excel_header(file_path, sheet_name, start_row)
+    column_count = len(columns)
+
+    def data_rows():
+        rows = iter_excel_rows(file_path, sheet_name, start_row)
+        try:
+            next(rows, None)
+            for row in rows:
+                if len(row) < column_count:
+                    row.extend([None] * (column_count - len(row)))
+                yield row[:column_count]
+        finally:
+            rows.close()
+
+    stats = bulk_insert(conn, table_name, columns, data_rows(), batch_size=batch_size, fast=fast,
+                        defer_indexes=defer_indexes, progress=progress, cancel=cancel)
+    stats.bytes = os.path.getsize(file_path)
+    return stats